@@ -0,0 +1,136 @@
+"""
+分析请求延迟基准：每个请求启动一次 process_video.py 子进程（冷启动，导入 torch/ultralytics 并加载全部模型）
+与常驻分析进程（模型已预加载）的单次请求耗时对比。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_analysis_pool.py [--video public/uploads/videos/xxx.mp4] [--hand right] [--repeat 2]
+        [--seconds 4] [--pose-tier x] [--imgsz 640]
+
+--seconds 大于 0 时先把视频开头若干秒写成临时文件，缩短分析本身的耗时，使启动开销在对比中更明显；0 表示使用完整视频。
+两种方式使用同一个临时关键点缓存目录并在每次请求前清空，重复请求不会因命中关键点缓存而变快。
+pool startup 为进程池从启动到预加载完成的时间，只在服务启动时支付一次。
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+
+def trim_video(src, dst, seconds):
+    """截取视频开头 seconds 秒"""
+    import cv2
+    from video_writer import open_video_writer
+    cap = cv2.VideoCapture(src)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    writer = open_video_writer(dst, fps, size)
+    for _ in range(int(round(seconds * fps))):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        writer.write(frame)
+    writer.release()
+    cap.release()
+
+
+def clear_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def cold_request(video, hand, pose_config, keypoint_dir):
+    """与 ANALYSIS_WORKERS=0 时的 /analyze 相同：启动 process_video.py 子进程，从结果文件读取结果"""
+    clear_dir(keypoint_dir)
+    result_file = os.path.join(os.path.dirname(keypoint_dir), 'result.json')
+    start_time = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'src', 'utils', 'process_video.py'), video, hand,
+         pose_config['tier'], str(pose_config['imgsz']), pose_config['backend'], '--result-file', result_file],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"process_video.py 分析失败:\n{proc.stderr[-2000:]}")
+    elapsed = time.perf_counter() - start_time
+    with open(result_file) as f:
+        return elapsed, json.load(f)
+
+
+def warm_request(pool, video, hand, pose_config, keypoint_dir):
+    clear_dir(keypoint_dir)
+    start_time = time.perf_counter()
+    result = asyncio.run(pool.run(video, hand, pose_config))
+    return time.perf_counter() - start_time, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--hand', default='right', choices=['left', 'right'])
+    parser.add_argument('--repeat', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=4, help='截取视频开头的秒数，0 为完整视频')
+    parser.add_argument('--pose-tier', default=None)
+    parser.add_argument('--imgsz', type=int, default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_analysis_pool_')
+    keypoint_dir = os.path.join(work_dir, 'keypoints')
+    # 子进程与常驻进程都从环境变量读取缓存目录，需在导入相关模块和启动进程之前设置
+    os.environ['KEYPOINT_STORE_DIR'] = keypoint_dir
+    from analysis_pool import AnalysisPool
+    from pose_tiers import resolve_pose_config
+
+    video = args.video or sorted(glob.glob(os.path.join(ROOT, 'public', 'uploads', 'videos', '*.mp4')))[0]
+    if args.seconds > 0:
+        clip = os.path.join(work_dir, 'bench_analysis_pool.mp4')
+        trim_video(video, clip, args.seconds)
+        video = clip
+    pose_config = resolve_pose_config(args.pose_tier, args.imgsz)
+    print(f"视频 {video}，档位 {pose_config['tier']}，imgsz {pose_config['imgsz']}，CPU 核数 {os.cpu_count()}")
+
+    rows = []
+    cold_results, warm_results = [], []
+    try:
+        for i in range(args.repeat):
+            seconds, result = cold_request(video, args.hand, pose_config, keypoint_dir)
+            rows.append(('cold', i + 1, seconds))
+            cold_results.append(result)
+
+        pool = AnalysisPool(workers=1)
+        start_time = time.perf_counter()
+        pool.start(pose_config)
+        pool.wait_ready()
+        startup = time.perf_counter() - start_time
+        for i in range(args.repeat):
+            seconds, result = warm_request(pool, video, args.hand, pose_config, keypoint_dir)
+            rows.append(('warm', i + 1, seconds))
+            warm_results.append(result)
+        pool.shutdown()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for timeline in {r['timeline'] for r in cold_results + warm_results if r.get('timeline')}:
+            if os.path.exists(timeline):
+                os.remove(timeline)
+
+    same = all(r['score_arr'] == cold_results[0]['score_arr'] and r['case_arr'] == cold_results[0]['case_arr']
+               for r in cold_results + warm_results)
+    print(f"{'mode':<8}{'run':>5}{'latency(s)':>12}")
+    for mode, i, seconds in rows:
+        print(f"{mode:<8}{i:>5}{seconds:>12.2f}")
+    cold = [s for mode, _, s in rows if mode == 'cold']
+    warm = [s for mode, _, s in rows if mode == 'warm']
+    cold_mean, warm_mean = sum(cold) / len(cold), sum(warm) / len(warm)
+    print(f"cold mean {cold_mean:.2f}s，warm mean {warm_mean:.2f}s，每个请求节省 {cold_mean - warm_mean:.2f}s "
+          f"({cold_mean / warm_mean:.2f}x)，pool startup {startup:.2f}s，结果一致: {same}")
+
+
+if __name__ == '__main__':
+    main()
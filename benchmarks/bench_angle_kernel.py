@@ -0,0 +1,77 @@
+"""
+关节角度计算微基准：逐帧逐角度调用 estimate_pose_angle 与向量化的 joint_angles。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_angle_kernel.py [--frames 100000] [--triplets 2]
+
+用随机关键点轨迹（含未检测帧和低置信度关节）比较两种方式的耗时，
+并报告有效角度上的最大偏差。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+from pose_engine import KEYPOINT_CONF, NUM_KEYPOINTS, estimate_pose_angle, joint_angles
+
+TRIPLETS = [[6, 8, 10], [8, 6, 12], [5, 7, 9], [7, 5, 11], [12, 14, 16], [11, 13, 15]]
+
+
+def random_track(frames, seed=0):
+    rng = np.random.default_rng(seed)
+    keypoints = np.empty((frames, NUM_KEYPOINTS, 3), dtype=np.float32)
+    keypoints[..., :2] = rng.uniform(0, 720, (frames, NUM_KEYPOINTS, 2))
+    keypoints[..., 2] = rng.uniform(0, 1, (frames, NUM_KEYPOINTS))
+    # 与 ultralytics 一致：不可见关键点坐标置 0；另有约 2% 的帧未检测到人体
+    keypoints[keypoints[..., 2] < KEYPOINT_CONF, :2] = 0
+    keypoints[rng.uniform(0, 1, frames) < 0.02] = np.nan
+    return keypoints
+
+
+def loop_angles(keypoints, triplets):
+    """原来的做法：逐帧、逐三元组调用 estimate_pose_angle，低置信度记为 NaN"""
+    angles = np.full((len(keypoints), len(triplets)), np.nan)
+    for i, frame in enumerate(keypoints):
+        if np.isnan(frame).all():
+            continue
+        for j, t in enumerate(triplets):
+            if (frame[t, 2] >= KEYPOINT_CONF).all():
+                angles[i, j] = estimate_pose_angle(*(frame[k] for k in t))
+    return angles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=100000)
+    parser.add_argument('--triplets', type=int, default=2, help=f'三元组数量（最多 {len(TRIPLETS)}）')
+    args = parser.parse_args()
+
+    triplets = TRIPLETS[:args.triplets]
+    keypoints = random_track(args.frames)
+
+    start_time = time.perf_counter()
+    reference = loop_angles(keypoints, triplets)
+    loop_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    angles = joint_angles(keypoints, triplets)
+    kernel_seconds = time.perf_counter() - start_time
+
+    same_mask = bool((np.isnan(angles) == np.isnan(reference)).all())
+    valid = ~np.isnan(reference)
+    diff = np.max(np.abs(angles[valid] - reference[valid])) if valid.any() else 0.0
+
+    print(f"{'method':<16}{'frames':>10}{'triplets':>10}{'seconds':>10}{'Mangles/s':>12}")
+    for name, seconds in (('loop', loop_seconds), ('joint_angles', kernel_seconds)):
+        print(f"{name:<16}{args.frames:>10}{len(triplets):>10}{seconds:>10.4f}"
+              f"{args.frames * len(triplets) / seconds / 1e6:>12.2f}")
+    print(f"speedup: {loop_seconds / kernel_seconds:.1f}x, NaN mask identical: {same_mask}, max diff: {diff:.2e} deg")
+
+
+if __name__ == '__main__':
+    main()
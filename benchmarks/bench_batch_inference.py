@@ -0,0 +1,55 @@
+"""
+离线姿态推理基准：对比逐帧推理（batch=1，即原来的循环）与分批推理的帧率。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_batch_inference.py [--videos public/uploads/videos] [--batch-sizes 1 4 8 16]
+
+对目录下每个 mp4 调用 process_data.extract_keypoints，并报告各批大小的 frames/sec
+以及与逐帧结果的关键点最大偏差。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+from model_registry import registry
+from pose_engine import PoseEstimator
+from process_data import extract_keypoints
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', default=os.path.join(ROOT, 'public', 'uploads', 'videos'))
+    parser.add_argument('--model', default=os.path.join(ROOT, 'public', 'yolo11x-pose.pt'))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    registry.warmup(args.model)
+    pose = PoseEstimator(args.model, [[6, 8, 10]])
+
+    print(f"{'video':<40}{'batch':>6}{'frames':>8}{'seconds':>10}{'fps':>8}{'max diff(px)':>14}")
+    for video_path in sorted(glob.glob(os.path.join(args.videos, '*.mp4'))):
+        reference = None
+        for batch_size in args.batch_sizes:
+            start_time = time.time()
+            result = extract_keypoints(video_path, pose, batch_size=batch_size)
+            elapsed = time.time() - start_time
+            if result is None:
+                print(f"{os.path.basename(video_path):<40}  跳过（无法读取或未检测到人体）")
+                break
+            keypoints = result[0]
+            if reference is None:
+                reference = keypoints
+            diff = np.nanmax(np.abs(keypoints[..., :2] - reference[..., :2])) if len(keypoints) else 0.0
+            print(f"{os.path.basename(video_path):<40}{batch_size:>6}{len(keypoints):>8}"
+                  f"{elapsed:>10.2f}{len(keypoints) / elapsed:>8.2f}{diff:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+低分片段截取基准：逐段截取（每个片段从第 0 帧重新解码）与单次解码同时写出所有片段的对比。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_clip_extraction.py [--runs-dir runs] [--min-clips 1]
+
+从 runs/ 中的 <name>_segment_<start>_<end>.mp4 文件名还原每个成品视频的片段列表，
+两种方式都写到临时目录，报告耗时、加速比，并核对两者输出的片段帧数一致。
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+SEGMENT_RE = re.compile(r'^(?P<name>.+)_segment_(?P<start>\d+)_(?P<end>\d+)\.mp4$')
+
+
+def find_jobs(runs_dir):
+    """返回 {成品视频路径: [(start, end), ...]}"""
+    jobs = {}
+    for path in sorted(glob.glob(os.path.join(runs_dir, '*_segment_*.mp4'))):
+        m = SEGMENT_RE.match(os.path.basename(path))
+        if not m:
+            continue
+        video = os.path.join(runs_dir, m.group('name') + '.mp4')
+        if os.path.exists(video):
+            jobs.setdefault(video, []).append((int(m.group('start')), int(m.group('end'))))
+    return jobs
+
+
+def legacy_extract_segment(input_path, output_path, start_frame, end_frame, fps, size):
+    """旧实现：每个片段单独打开视频，从第 0 帧解码到片段结束"""
+    import cv2
+    from video_writer import open_video_writer
+    cap = cv2.VideoCapture(input_path)
+    out = open_video_writer(output_path, fps, size)
+    current_frame = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if start_frame <= current_frame <= end_frame:
+            out.write(frame)
+        if current_frame > end_frame:
+            break
+        current_frame += 1
+    cap.release()
+    out.release()
+
+
+def count_frames(path):
+    import cv2
+    cap = cv2.VideoCapture(path)
+    n = 0
+    while cap.grab():
+        n += 1
+    cap.release()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs-dir', default=os.path.join(ROOT, 'runs'))
+    parser.add_argument('--min-clips', type=int, default=1, help='只测试片段数不少于该值的视频')
+    args = parser.parse_args()
+
+    import cv2
+    from count_display import extract_segments
+
+    jobs = {v: s for v, s in find_jobs(args.runs_dir).items() if len(s) >= args.min_clips}
+    if not jobs:
+        print(f"{args.runs_dir} 中没有找到成品视频及其片段")
+        return
+
+    print(f"{'video':<36}{'frames':>8}{'clips':>7}{'legacy s':>10}{'single s':>10}{'speedup':>9}{'match':>7}")
+    total_legacy = total_single = 0.0
+    for video, segments in jobs.items():
+        cap = cv2.VideoCapture(video)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_paths = [os.path.join(tmp, f'legacy_{s}_{e}.mp4') for s, e in segments]
+            start_time = time.perf_counter()
+            for (s, e), path in zip(segments, legacy_paths):
+                legacy_extract_segment(video, path, s, e, fps, size)
+            legacy_s = time.perf_counter() - start_time
+
+            single_paths = [os.path.join(tmp, f'single_{s}_{e}.mp4') for s, e in segments]
+            start_time = time.perf_counter()
+            extract_segments(video, [(s, e, p) for (s, e), p in zip(segments, single_paths)], fps, size)
+            single_s = time.perf_counter() - start_time
+
+            match = all(count_frames(a) == count_frames(b) for a, b in zip(legacy_paths, single_paths))
+
+        total_legacy += legacy_s
+        total_single += single_s
+        name = os.path.basename(video)
+        print(f"{name[:35]:<36}{count_frames(video):>8}{len(segments):>7}{legacy_s:>10.2f}{single_s:>10.2f}"
+              f"{legacy_s / single_s:>8.1f}x{'yes' if match else 'NO':>7}")
+    print(f"{'total':<36}{'':>8}{sum(len(s) for s in jobs.values()):>7}{total_legacy:>10.2f}{total_single:>10.2f}"
+          f"{total_legacy / total_single:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
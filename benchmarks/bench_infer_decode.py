@@ -0,0 +1,126 @@
+"""
+推理输入解码基准：cv2.VideoCapture 整帧解码 + 裁剪 + letterbox 与 ffmpeg 按推理分辨率解码（裁剪缩放在 ffmpeg 内完成）+ letterbox
+的每帧耗时对比。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_infer_decode.py [--video public/uploads/videos/xxx.mp4 ...] [--frames 300]
+        [--imgsz 640] [--crop x1,y1,x2,y2] [--ffmpeg /path/to/ffmpeg]
+
+默认测试上传目录中的全部视频；--crop 默认取画面中央 40% 宽、90% 高的区域（与单人 ROI 外扩后的大小相近），
+--crop full 表示整帧（移动 ROI 重新检测时的情形）。
+计时覆盖解码、裁剪与 ultralytics 的 letterbox 预处理，不含模型推理；
+同时核对两种方式的帧数一致，并报告 letterbox 后图像的平均像素差。
+py cpu 为 Python 进程自身的 CPU 时间：ffmpeg 方式的解码与缩放在子进程中完成，多核时与推理并行，
+单核时子进程与 Python 争抢同一个核，墙钟时间反而可能更长（INFER_DECODER=auto 因此只在多核时启用）。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+
+def default_crop(width, height):
+    w, h = int(width * 0.4), int(height * 0.9)
+    x1, y1 = (width - w) // 2, (height - h) // 2
+    return x1, y1, x1 + w, y1 + h
+
+
+def opencv_frames(path, crop, limit):
+    import cv2
+    import numpy as np
+    x1, y1, x2, y2 = crop
+    cap = cv2.VideoCapture(path)
+    n = 0
+    while n < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield np.ascontiguousarray(frame[y1:y2, x1:x2])
+        n += 1
+    cap.release()
+
+
+def ffmpeg_frames(path, crop, imgsz, limit):
+    from video_reader import ScaledFrameReader
+    reader = ScaledFrameReader(path, crop, imgsz)
+    try:
+        for frame_idx, frame in reader:
+            if frame_idx >= limit:
+                break
+            yield frame
+    finally:
+        reader.close()
+
+
+def run(frames, letterbox, keep_every):
+    """遍历帧并做 letterbox，返回 (帧数, 墙钟秒数, Python 进程 CPU 秒数, 抽样保存的预处理结果)"""
+    kept = []
+    n = 0
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    for frame in frames:
+        image = letterbox(image=frame)
+        if n % keep_every == 0:
+            kept.append(image)
+        n += 1
+    return n, time.perf_counter() - start_time, time.process_time() - start_cpu, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', nargs='+', default=None)
+    parser.add_argument('--frames', type=int, default=300, help='每个视频最多测试的帧数，0 为全部')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--crop', default=None, help='x1,y1,x2,y2 或 full')
+    parser.add_argument('--ffmpeg', default=None, help='ffmpeg 可执行文件，默认使用 FFMPEG_BIN')
+    args = parser.parse_args()
+
+    if args.ffmpeg:
+        os.environ['FFMPEG_BIN'] = args.ffmpeg
+    import cv2
+    import numpy as np
+    from ultralytics.data.augment import LetterBox
+    from video_reader import inference_size, open_scaled_frames
+
+    videos = args.video or sorted(glob.glob(os.path.join(ROOT, 'public', 'uploads', 'videos', '*.mp4')))
+    limit = args.frames or float('inf')
+    # 与 ultralytics 对 .pt 模型推理时的预处理一致
+    letterbox = LetterBox((args.imgsz, args.imgsz), auto=True, stride=32)
+    print(f"imgsz {args.imgsz}，CPU 核数 {os.cpu_count()}")
+    print(f"{'video':<36}{'crop':>11}{'input':>10}{'frames':>8}{'opencv ms':>11}{'ffmpeg ms':>11}{'speedup':>9}"
+          f"{'py cpu ms':>11}{'diff':>7}")
+    total_cv = total_ff = total_ff_cpu = 0.0
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if args.crop == 'full':
+            crop = (0, 0, width, height)
+        elif args.crop:
+            crop = tuple(int(v) for v in args.crop.split(','))
+        else:
+            crop = default_crop(width, height)
+        if open_scaled_frames(path, crop, args.imgsz, decoder='ffmpeg') is None:
+            raise SystemExit("没有可用的 ffmpeg，请用 --ffmpeg 指定可执行文件")
+
+        n_cv, cv_s, _, cv_kept = run(opencv_frames(path, crop, limit), letterbox, 25)
+        n_ff, ff_s, ff_cpu, ff_kept = run(ffmpeg_frames(path, crop, args.imgsz, limit), letterbox, 25)
+        diff = np.mean([np.abs(a.astype(np.int16) - b).mean() for a, b in zip(cv_kept, ff_kept)
+                        if a.shape == b.shape]) if n_cv == n_ff else float('nan')
+        total_cv += cv_s / n_cv
+        total_ff += ff_s / n_ff
+        total_ff_cpu += ff_cpu / n_ff
+        w, h = inference_size(crop, args.imgsz)
+        name = os.path.basename(path)
+        print(f"{name[:35]:<36}{f'{crop[2] - crop[0]}x{crop[3] - crop[1]}':>11}{f'{w}x{h}':>10}"
+              f"{n_cv if n_cv == n_ff else f'{n_cv}/{n_ff}':>8}{cv_s / n_cv * 1000:>11.2f}{ff_s / n_ff * 1000:>11.2f}"
+              f"{cv_s / n_cv / (ff_s / n_ff):>8.2f}x{ff_cpu / n_ff * 1000:>11.2f}{diff:>7.2f}")
+    print(f"{'mean':<36}{'':>11}{'':>10}{'':>8}{total_cv / len(videos) * 1000:>11.2f}"
+          f"{total_ff / len(videos) * 1000:>11.2f}{total_cv / total_ff:>8.2f}x{total_ff_cpu / len(videos) * 1000:>11.2f}")
+
+if __name__ == '__main__':
+    main()
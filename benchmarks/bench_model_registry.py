@@ -0,0 +1,72 @@
+"""
+启动基准：对比旧实现（每个调用方各自加载一份 YOLO）与进程级模型注册表的加载耗时和 RSS。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_model_registry.py [--model ./public/yolo11x-pose.pt] [--copies 4]
+
+每种模式在独立子进程中运行，保证 RSS 互不影响。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+
+def run_mode(mode, model_path, copies):
+    from model_registry import current_rss, registry
+
+    rss_before = current_rss()
+    start_time = time.time()
+    models = []
+    for _ in range(copies):
+        if mode == 'legacy':
+            # 旧实现：VideoProcessor._preload_models 中四个 AIGym 各自加载一份权重
+            from ultralytics import YOLO
+            models.append(YOLO(model_path))
+        else:
+            models.append(registry.get(model_path))
+    load_seconds = time.time() - start_time
+    rss_after = current_rss()
+    return {
+        'mode': mode,
+        'copies': copies,
+        'distinct_instances': len({id(m) for m in models}),
+        'load_seconds': round(load_seconds, 3),
+        'rss_before_mb': round(rss_before / 1024 ** 2, 1),
+        'rss_after_mb': round(rss_after / 1024 ** 2, 1),
+        'rss_delta_mb': round((rss_after - rss_before) / 1024 ** 2, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=os.path.join(ROOT, 'public', 'yolo11x-pose.pt'))
+    parser.add_argument('--copies', type=int, default=4)
+    parser.add_argument('--mode', choices=['legacy', 'registry'])
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.model, args.copies)))
+        return
+
+    results = []
+    for mode in ('legacy', 'registry'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--model', args.model, '--copies', str(args.copies)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<10}{'instances':>10}{'load(s)':>10}{'rss before(MB)':>16}{'rss after(MB)':>15}{'delta(MB)':>11}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['distinct_instances']:>10}{r['load_seconds']:>10}"
+              f"{r['rss_before_mb']:>16}{r['rss_after_mb']:>15}{r['rss_delta_mb']:>11}")
+
+
+if __name__ == '__main__':
+    main()
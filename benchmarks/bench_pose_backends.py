@@ -0,0 +1,98 @@
+"""
+姿态推理后端对比：各后端的单帧延迟，以及相对 torch yolo11x 参考结果的关节角度误差。
+同时按 --batch 帧一批（离线分析使用的 infer_batch）推理，检查批量结果与逐帧结果一致。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_pose_backends.py [--tier x] [--imgsz 640] [--frames 200] [--batch 8]
+        [--backends torch onnx onnx-int8 openvino openvino-int8]
+
+评估帧取自 public/uploads/videos。角度误差按左右手肘部/肩部四组三元组计算，
+只统计参考模型与被测后端都检测到人体的帧。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+os.chdir(ROOT)
+
+from pose_backends import POSE_BACKENDS, resolve_backend_model, sample_frames
+from pose_engine import PoseEstimator
+from process_data import POSE_BATCH_SIZE
+from pose_tiers import tier_model_path
+
+TRIPLETS = [[5, 7, 9], [7, 5, 11], [6, 8, 10], [8, 6, 12]]
+
+
+def run_backend(model_path, imgsz, frames, batch_size=1):
+    """
+    返回 (每帧延迟毫秒数组, 每帧角度列表或 None)。
+    batch_size > 1 时按批调用 infer_batch，延迟为每批耗时均摊到每帧。
+    """
+    pose = PoseEstimator(model_path, TRIPLETS, imgsz=imgsz)
+    pose.infer_batch(frames[:batch_size])  # 预热
+    latencies = []
+    angles = []
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        start_time = time.perf_counter()
+        batch_keypoints = pose.infer_batch(batch)
+        latencies.extend([(time.perf_counter() - start_time) * 1000 / len(batch)] * len(batch))
+        angles.extend(None if keypoints is None else pose.angles_from_keypoints(keypoints)
+                      for keypoints in batch_keypoints)
+    return np.array(latencies), angles
+
+
+def angle_errors(angles, reference):
+    """两组逐帧角度都检测到人体的帧上的绝对误差"""
+    errors = [
+        np.abs(np.array(a) - np.array(r))
+        for a, r in zip(angles, reference) if a is not None and r is not None
+    ]
+    return np.concatenate(errors) if errors else np.array([np.nan])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tier', default='x')
+    parser.add_argument('--reference-tier', default='x')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=POSE_BATCH_SIZE)
+    parser.add_argument('--backends', nargs='+', default=POSE_BACKENDS)
+    args = parser.parse_args()
+
+    frames = sample_frames(count=args.frames)
+    _, reference = run_backend(tier_model_path(args.reference_tier), args.imgsz, frames)
+
+    print(f"参考: torch yolo11{args.reference_tier}-pose, {len(frames)} 帧, imgsz={args.imgsz}")
+    print(f"{'backend':<16}{'mean(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'detect':>8}{'angle MAE':>11}{'angle p95':>11}{'angle max':>11}"
+          f"{f'batch{args.batch}(ms)':>14}{'batch diff':>12}")
+    for backend in args.backends:
+        try:
+            model_path = resolve_backend_model(tier_model_path(args.tier), backend, args.imgsz)
+        except Exception as e:
+            print(f"{backend:<16}跳过: {e}")
+            continue
+        latencies, angles = run_backend(model_path, args.imgsz, frames)
+        errors = angle_errors(angles, reference)
+        detected = sum(a is not None for a in angles) / len(angles)
+        # 批量推理：导出模型的输入批大小固定为 1 时这里会报错；diff 为批量与逐帧角度的最大差异
+        try:
+            batch_latencies, batch_angles = run_backend(model_path, args.imgsz, frames, args.batch)
+            batch_diff = np.nanmax(angle_errors(batch_angles, angles))
+            batch_column = f"{batch_latencies.mean():>14.1f}{batch_diff:>12.2f}"
+        except Exception as e:
+            batch_column = f"  批量推理失败: {e}"
+        print(f"{backend:<16}{latencies.mean():>10.1f}{np.percentile(latencies, 50):>10.1f}"
+              f"{np.percentile(latencies, 95):>10.1f}{detected:>8.0%}{np.nanmean(errors):>11.2f}"
+              f"{np.nanpercentile(errors, 95):>11.2f}{np.nanmax(errors):>11.2f}{batch_column}")
+
+
+if __name__ == '__main__':
+    main()
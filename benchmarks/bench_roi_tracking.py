@@ -0,0 +1,69 @@
+"""
+移动 ROI 基准：对比第60帧选出的固定 ROI 与跟随人体移动的 ROI。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_roi_tracking.py [--videos public/uploads/videos] [--intervals 0 15 30] [--imgsz 640 320]
+
+对目录下每个 mp4 报告每帧裁剪区域面积（均值/最大值，占整帧比例）、
+未检测到人体的帧数以及端到端帧率（含解码、裁剪与推理）。interval=0 表示固定 ROI；
+移动 ROI 每隔 interval 帧的整帧重新检测不计入裁剪面积。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+from model_registry import registry
+from pose_engine import PoseEstimator, crop_box
+from process_data import extract_keypoints, ROI_MARGIN
+
+
+def crop_areas(meta, total_frames):
+    """每帧推理裁剪区域的面积（像素）"""
+    w, h = meta['width'], meta['height']
+    boxes = meta['roi'].get('boxes') or [meta['roi']['bbox']] * total_frames
+    areas = []
+    for box in boxes:
+        x1, y1, x2, y2 = crop_box(box, w, h, ROI_MARGIN)
+        areas.append((x2 - x1) * (y2 - y1))
+    return np.array(areas, dtype=np.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', default=os.path.join(ROOT, 'public', 'uploads', 'videos'))
+    parser.add_argument('--model', default=os.path.join(ROOT, 'public', 'yolo11x-pose.pt'))
+    parser.add_argument('--intervals', type=int, nargs='+', default=[0, 15, 30])
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640, 320])
+    args = parser.parse_args()
+
+    print(f"{'video':<40}{'interval':>9}{'imgsz':>7}{'frames':>8}{'crop mean%':>12}{'crop max%':>11}"
+          f"{'missed':>8}{'fps':>8}")
+    for video_path in sorted(glob.glob(os.path.join(args.videos, '*.mp4'))):
+        name = os.path.basename(video_path)
+        for imgsz in args.imgsz:
+            registry.warmup(args.model, imgsz)
+            pose = PoseEstimator(args.model, [[6, 8, 10]], imgsz=imgsz)
+            for interval in args.intervals:
+                start_time = time.time()
+                result = extract_keypoints(video_path, pose, track_interval=interval)
+                elapsed = time.time() - start_time
+                if result is None:
+                    print(f"{name:<40}  跳过（无法读取或未检测到人体）")
+                    break
+                keypoints, meta = result
+                total_frames = len(keypoints)
+                areas = crop_areas(meta, total_frames) / (meta['width'] * meta['height']) * 100
+                missed = int(np.isnan(keypoints[:, 0, 0]).sum())
+                print(f"{name:<40}{interval:>9}{imgsz:>7}{total_frames:>8}{areas.mean():>12.1f}{areas.max():>11.1f}"
+                      f"{missed:>8}{total_frames / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+稀疏推理基准：对比逐帧推理与面向评分的由粗到细稀疏推理。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_sparse_inference.py [--videos public/uploads/videos] [--strides 2 4 8]
+
+对目录下每个 mp4 报告实际推理的帧数、耗时、找到的分段数，
+以及评分重采样帧上的角度与逐帧推理结果的最大偏差。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+from model_registry import registry
+from pose_engine import PoseEstimator
+from process_data import (extract_keypoints, extract_keypoints_sparse, find_segments, keypoint_angles,
+                          scoring_frame_indices)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', default=os.path.join(ROOT, 'public', 'uploads', 'videos'))
+    parser.add_argument('--model', default=os.path.join(ROOT, 'public', 'yolo11x-pose.pt'))
+    parser.add_argument('--strides', type=int, nargs='+', default=[2, 4, 8])
+    args = parser.parse_args()
+
+    registry.warmup(args.model)
+    pose = PoseEstimator(args.model, [[6, 8, 10], [8, 6, 12]])
+
+    print(f"{'video':<40}{'mode':>10}{'inferred':>10}{'frames':>8}{'seconds':>10}{'segments':>10}{'max diff(deg)':>15}")
+    for video_path in sorted(glob.glob(os.path.join(args.videos, '*.mp4'))):
+        name = os.path.basename(video_path)
+        start_time = time.time()
+        result = extract_keypoints(video_path, pose)
+        elapsed = time.time() - start_time
+        if result is None:
+            print(f"{name:<40}  跳过（无法读取或未检测到人体）")
+            continue
+        pose.reset()
+        dense_angles = np.array(keypoint_angles(pose, result[0]))
+        total_frames = dense_angles.shape[1]
+        dense_segments, _, _ = find_segments(dense_angles[0].tolist(), total_frames)
+        print(f"{name:<40}{'dense':>10}{total_frames:>10}{total_frames:>8}{elapsed:>10.2f}"
+              f"{len(dense_segments):>10}{0.0:>15.2f}")
+
+        # 只在逐帧结果的评分帧上比较角度，这些帧才会进入模型
+        scoring = sorted(scoring_frame_indices(dense_segments, total_frames, window=0))
+        for stride in args.strides:
+            pose.reset()
+            start_time = time.time()
+            keypoints, inferred, _ = extract_keypoints_sparse(video_path, pose, stride=stride)
+            elapsed = time.time() - start_time
+            pose.reset()
+            angles = np.array(keypoint_angles(pose, keypoints, inferred))
+            segments, _, _ = find_segments(angles[0].tolist(), total_frames)
+            diff = np.max(np.abs(angles[:, scoring] - dense_angles[:, scoring])) if scoring else 0.0
+            print(f"{name:<40}{f'sparse/{stride}':>10}{int(inferred.sum()):>10}{total_frames:>8}"
+                  f"{elapsed:>10.2f}{len(segments):>10}{diff:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
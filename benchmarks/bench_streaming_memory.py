@@ -0,0 +1,113 @@
+"""
+离线分析内存基准：报告不同视频时长下分析进程的峰值常驻内存（peak RSS）。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_streaming_memory.py [--source public/uploads/videos/xxx.mp4] [--seconds 10 60 300 600]
+
+把源视频循环拼接成指定时长的测试视频，每个时长在独立子进程中分别运行：
+    streaming  当前的流式分析路径（extract_keypoints + 角度 + 分段），内存中只保留一批裁剪帧
+    buffered   旧实现的做法：把每一帧 BGR 图像追加进列表（只解码、不推理）
+报告峰值 RSS 以及相对加载模型后基线的增量。
+"""
+import argparse
+import glob
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB，Linux 下 ru_maxrss 单位为 KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_video(source, seconds, out_path):
+    """循环源视频直到达到指定时长"""
+    import cv2
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    target = int(seconds * fps)
+    written = 0
+    while written < target:
+        ret, frame = cap.read()
+        if not ret:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        writer.write(frame)
+        written += 1
+    cap.release()
+    writer.release()
+    return written
+
+
+def child(mode, video_path, model_path):
+    import cv2
+    if mode == 'buffered':
+        baseline = peak_rss_mb()
+        cap = cv2.VideoCapture(video_path)
+        frames = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        total_frames = len(frames)
+    else:
+        from model_registry import registry
+        from pose_engine import PoseEstimator
+        from process_data import extract_keypoints, find_segments, keypoint_angles
+        registry.warmup(model_path)
+        baseline = peak_rss_mb()
+        pose = PoseEstimator(model_path, [[6, 8, 10], [8, 6, 12]])
+        keypoints, _ = extract_keypoints(video_path, pose)
+        angles_group1, _ = keypoint_angles(pose, keypoints)
+        find_segments(angles_group1, len(keypoints))
+        total_frames = len(keypoints)
+    print(f"{total_frames} {baseline:.1f} {peak_rss_mb():.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default=None, help='源视频，默认取 public/uploads/videos 下第一个 mp4')
+    parser.add_argument('--model', default=os.path.join(ROOT, 'public', 'yolo11x-pose.pt'))
+    parser.add_argument('--seconds', type=float, nargs='+', default=[10, 60, 300, 600])
+    parser.add_argument('--modes', nargs='+', default=['streaming', 'buffered'])
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'VIDEO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.model)
+        return
+
+    source = args.source or sorted(glob.glob(os.path.join(ROOT, 'public', 'uploads', 'videos', '*.mp4')))[0]
+    print(f"{'seconds':>8}{'frames':>8}{'mode':>11}{'baseline MB':>13}{'peak MB':>10}{'delta MB':>10}{'wall s':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for seconds in args.seconds:
+            video_path = os.path.join(tmp_dir, f'loop_{int(seconds)}s.mp4')
+            make_video(source, seconds, video_path)
+            for mode in args.modes:
+                start_time = time.time()
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--model', args.model, '--child', mode, video_path],
+                    capture_output=True, text=True)
+                elapsed = time.time() - start_time
+                if proc.returncode != 0:
+                    # 缓冲模式在长视频上可能被 OOM 终止，这本身就是要展示的结果
+                    print(f"{seconds:>8.0f}{'-':>8}{mode:>11}  失败 (returncode={proc.returncode})")
+                    continue
+                frames, baseline, peak = proc.stdout.strip().splitlines()[-1].split()
+                print(f"{seconds:>8.0f}{frames:>8}{mode:>11}{float(baseline):>13.1f}{float(peak):>10.1f}"
+                      f"{float(peak) - float(baseline):>10.1f}{elapsed:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
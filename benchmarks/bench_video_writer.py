@@ -0,0 +1,113 @@
+"""
+视频编码基准：cv2.VideoWriter 与 ffmpeg 管道写入器（不同线程数/预设）的编码帧率对比。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_video_writer.py [--video public/uploads/videos/xxx.mp4] [--frames 300]
+        [--threads 1 0] [--presets veryfast ultrafast] [--ffmpeg /path/to/ffmpeg]
+
+先把视频的前 --frames 帧解码到内存，只计编码耗时（写入 + 关闭文件）。
+报告编码帧率、输出大小，以及输出是否为浏览器可直接播放的 H264/yuv420p。
+"""
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+
+def default_video():
+    """默认取上传目录中第一个 720p 视频"""
+    import cv2
+    for path in sorted(glob.glob(os.path.join(ROOT, 'public', 'uploads', 'videos', '*.mp4'))):
+        cap = cv2.VideoCapture(path)
+        height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        cap.release()
+        if height == 720:
+            return path
+    raise SystemExit("上传目录中没有 720p 视频，请用 --video 指定")
+
+
+def load_frames(path, count):
+    import cv2
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames, fps
+
+
+def codec_name(path, ffmpeg):
+    """用 ffmpeg 读取输出文件的视频编码与像素格式"""
+    if ffmpeg is None:
+        return '-'
+    result = subprocess.run([ffmpeg, '-hide_banner', '-i', path], capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        if 'Video:' in line:
+            parts = line.split('Video:')[1].split(',')
+            return f"{parts[0].split()[0]}/{parts[1].strip().split('(')[0]}"
+    return '?'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 0], help='ffmpeg 线程数，0 为自动')
+    parser.add_argument('--presets', nargs='+', default=['veryfast', 'ultrafast'])
+    parser.add_argument('--ffmpeg', default=None, help='ffmpeg 可执行文件，默认使用 FFMPEG_BIN')
+    args = parser.parse_args()
+
+    if args.ffmpeg:
+        os.environ['FFMPEG_BIN'] = args.ffmpeg
+    import cv2
+    import video_writer
+    from video_writer import FfmpegWriter, probe_encoders
+
+    video = args.video or default_video()
+    frames, fps = load_frames(video, args.frames)
+    size = (frames[0].shape[1], frames[0].shape[0])
+    caps = probe_encoders()
+    ffmpeg = caps['ffmpeg']
+    print(f"视频: {os.path.basename(video)} {size[0]}x{size[1]}，{len(frames)} 帧，CPU 核数 {os.cpu_count()}")
+
+    configs = []
+    if caps['opencv_fourcc']:
+        configs.append((f"opencv {caps['opencv_fourcc']}",
+                        lambda p: cv2.VideoWriter(p, cv2.VideoWriter_fourcc(*caps['opencv_fourcc']), fps, size)))
+    if caps['ffmpeg_codec']:
+        codec = caps['ffmpeg_codec']
+        for preset in args.presets if codec == 'libx264' else [None]:
+            for threads in args.threads:
+                label = f"ffmpeg {codec}" + (f" {preset}" if preset else '') + f" t={threads or 'auto'}"
+                configs.append((label, lambda p, preset=preset, threads=threads: FfmpegWriter(
+                    p, fps, size, codec=codec, preset=preset or video_writer.VIDEO_PRESET, threads=threads,
+                    ffmpeg=ffmpeg)))
+    else:
+        print("未找到可用的 ffmpeg 编码器，只测试 cv2.VideoWriter（可用 --ffmpeg 指定可执行文件）")
+
+    print(f"{'writer':<34}{'fps':>9}{'seconds':>9}{'MB':>8}  codec")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, make) in enumerate(configs):
+            path = os.path.join(tmp, f'{i}.mp4')
+            start_time = time.perf_counter()
+            writer = make(path)
+            for frame in frames:
+                writer.write(frame)
+            writer.release()
+            seconds = time.perf_counter() - start_time
+            size_mb = os.path.getsize(path) / 1024 ** 2 if os.path.exists(path) else 0
+            print(f"{label:<34}{len(frames) / seconds:>9.1f}{seconds:>9.2f}{size_mb:>8.2f}  {codec_name(path, ffmpeg)}")
+
+
+if __name__ == '__main__':
+    main()
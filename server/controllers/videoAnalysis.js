@@ -8,9 +8,74 @@ import axios from 'axios';
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+// 进行中的分析任务进度（分析记录 ID -> processor 上报的进度），随分析结果查询一起返回
+const analysisProgress = new Map();
+// 查询 processor 任务状态的间隔（毫秒）
+const JOB_POLL_INTERVAL = 2000;
+// 连续多少次无法连接 processor 后判定任务失败
+const JOB_POLL_MAX_FAILURES = 30;
+
+// 跟踪 processor 上的异步分析任务，结束后写入分析记录
+const trackAnalysisJob = async (processorUrl, jobId, analysis, video) => {
+    let failures = 0;
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+        let job;
+        try {
+            job = (await axios.get(`${processorUrl}/jobs/${jobId}`, { timeout: 10000 })).data;
+            failures = 0;
+        } catch (error) {
+            const lost = error.response?.status === 404;
+            if (!lost && ++failures < JOB_POLL_MAX_FAILURES) {
+                continue;
+            }
+            job = {
+                status: 'failed',
+                // processor 重启后任务会丢失
+                error: lost ? '分析任务不存在，processor 可能已重启' : error.message
+            };
+        }
+
+        if (job.status === 'done') {
+            analysisProgress.delete(analysis.id);
+            const { case_arr, score_arr, output_arr, average_score, suggestions } = job.result;
+
+            // 更新分析记录
+            await analysis.update({
+                case_arr,
+                score_arr,
+                output_arr,
+                average_score,
+                suggestions,
+                status: 'completed'
+            });
+
+            // 更新视频状态为 processed
+            await video.update({ status: 'processed' });
+            console.log('分析完成:', { videoId: video.id, jobId });
+            return;
+        }
+        if (job.status === 'failed') {
+            analysisProgress.delete(analysis.id);
+            console.error('分析任务失败:', { videoId: video.id, jobId, error: job.error });
+
+            // 更新错误状态
+            await Promise.all([
+                video.update({ status: 'error' }),
+                analysis.update({
+                    status: 'error',
+                    error_message: job.error
+                })
+            ]);
+            return;
+        }
+        analysisProgress.set(analysis.id, { status: job.status, ...job.progress });
+    }
+};
+
 export const startAnalysis = async (req, res) => {
     try {
-        const { videoId, hand, reAnalyze } = req.body;
+        const { videoId, hand, reAnalyze, poseTier, imgsz, poseBackend } = req.body;
 
         // 检查视频是否存在
         const video = await Video.findByPk(videoId);
@@ -83,34 +148,31 @@ export const startAnalysis = async (req, res) => {
         // 构建完整的视频路径
         const videoPath = join(process.cwd(), video.file_path);
         
-        // 通过 HTTP 请求调用 processor 服务进行分析
+        // 向 processor 提交异步分析任务，立即返回；任务结束后由 trackAnalysisJob 写入结果，前端轮询分析记录
         try {
             const processorUrl = process.env.PROCESSOR_URL || 'http://localhost:8766';
-            const processorResponse = await axios.post(`${processorUrl}/analyze`, {
+            const processorResponse = await axios.post(`${processorUrl}/jobs`, {
                 video_path: videoPath,
-                hand: hand
+                hand: hand,
+                pose_tier: poseTier,
+                imgsz: imgsz,
+                pose_backend: poseBackend
             }, {
-                timeout: 300000 // 设置超时时间为 5 分钟
+                timeout: 30000
             });
 
-            const { case_arr, score_arr, output_arr, average_score, suggestions } = processorResponse.data;
-
-            // 更新分析记录
-            await analysis.update({
-                case_arr,
-                score_arr,
-                output_arr,
-                average_score,
-                suggestions,
-                status: 'completed'
+            const jobId = processorResponse.data.job_id;
+            analysisProgress.set(analysis.id, { status: processorResponse.data.status, ...processorResponse.data.progress });
+            trackAnalysisJob(processorUrl, jobId, analysis, video).catch(async error => {
+                analysisProgress.delete(analysis.id);
+                console.error('跟踪分析任务失败:', error);
+                await analysis.update({ status: 'error', error_message: `分析失败: ${error.message}` }).catch(() => {});
             });
 
-            // 更新视频状态为 processed
-            await video.update({ status: 'processed' });
-
-            return res.json({
-                message: '分析完成',
-                analysis
+            return res.status(202).json({
+                message: '分析已开始',
+                analysis,
+                jobId
             });
         } catch (error) {
             console.error('调用 processor 服务失败:', error);
@@ -153,7 +215,7 @@ export const getAnalysisResult = async (req, res) => {
         if (!analysis) {
             return res.status(404).json({ message: '分析结果不存在' });
         }
-        res.json(analysis);
+        res.json({ ...analysis.toJSON(), progress: analysisProgress.get(analysis.id) || null });
     } catch (error) {
         console.error('获取分析结果时出错:', error);
         res.status(500).json({ 
@@ -10,6 +10,7 @@ import { fileURLToPath } from 'url';
 import { dirname } from 'path';
 import { Op } from 'sequelize';
 import { spawn } from 'child_process';
+import axios from 'axios';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -118,6 +119,11 @@ async function handleVideoProcessing(videoId, videoPath) {
             thumbnailPath,
             status: 'unprocessed'
         });
+
+        // 通知 processor 预先构建视频索引（元数据与关键帧位置），之后的分析与预览直接复用；失败不影响上传
+        const processorUrl = process.env.PROCESSOR_URL || 'http://localhost:8766';
+        axios.post(`${processorUrl}/index`, { video_path: videoPath }, { timeout: 120000 })
+            .catch(error => console.warn('构建视频索引失败:', error.message));
     } catch (error) {
         console.error('视频处理失败:', {
             videoId,
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+# 已结束的任务保留多久（秒），之后 GET /jobs/<id> 返回 404
+ANALYSIS_JOB_TTL = float(os.environ.get('ANALYSIS_JOB_TTL', 3600))
+
+FINISHED = ('done', 'failed')
+
+
+class AnalysisJob:
+    """
+    一次异步分析任务。
+
+    status: queued（等待空闲的分析进程）→ running → done / failed。
+    progress 中 frames/total_frames 为已处理帧数与总帧数，reps 为已评分的动作数，
+    eta_seconds 按第一次上报已处理帧以来的平均速度估算（不计入 ROI 检测等开始处理帧之前的耗时）；
+    stage 为 analysis（姿态分析与评分）或 suggestions（生成运动建议）。
+    所有状态只在事件循环线程中修改。
+    """
+
+    def __init__(self, video_path, hand):
+        self.id = uuid.uuid4().hex
+        self.video_path = video_path
+        self.hand = hand
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {'stage': None, 'frames': 0, 'total_frames': None, 'reps': 0,
+                         'percent': None, 'eta_seconds': None}
+        self.result = None
+        self.error = None
+        self._rate_start = None
+        self._listeners = set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def mark_running(self, stage='analysis'):
+        if self.status == 'queued':
+            self.status = 'running'
+            self.started_at = time.time()
+        self.progress['stage'] = stage
+        self._notify()
+
+    def update(self, frames, total_frames, reps):
+        """分析进程上报的进度"""
+        if self.finished:
+            return
+        if self.status == 'queued':
+            self.mark_running()
+        progress = self.progress
+        progress.update(frames=frames, total_frames=total_frames, reps=reps)
+        now = time.time()
+        if frames > 0 and self._rate_start is None:
+            self._rate_start = (now, frames)
+        if total_frames:
+            progress['percent'] = round(min(100.0, frames * 100 / total_frames), 1)
+            if self._rate_start is not None and frames > self._rate_start[1]:
+                rate = (frames - self._rate_start[1]) / max(now - self._rate_start[0], 1e-6)
+                progress['eta_seconds'] = round(max(0, total_frames - frames) / rate, 1)
+        self._notify()
+
+    def finish(self, result):
+        self.status = 'done'
+        self.finished_at = time.time()
+        self.result = result
+        self.progress.update(stage=None, percent=100.0, eta_seconds=0)
+        self._notify()
+
+    def fail(self, error):
+        self.status = 'failed'
+        self.finished_at = time.time()
+        self.error = error
+        self.progress.update(stage=None, eta_seconds=None)
+        self._notify()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'video_path': self.video_path,
+            'hand': self.hand,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+        }
+
+    def subscribe(self):
+        """订阅状态变化，返回收取状态快照的队列"""
+        queue = asyncio.Queue()
+        self._listeners.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._listeners.discard(queue)
+
+    def _notify(self):
+        snapshot = self.to_dict()
+        for queue in self._listeners:
+            queue.put_nowait(snapshot)
+
+
+class AnalysisJobs:
+    """进程内的异步分析任务表，已结束的任务保留 ANALYSIS_JOB_TTL 秒"""
+
+    def __init__(self, ttl=ANALYSIS_JOB_TTL):
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._loop = None
+
+    def _evict(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.ttl]:
+            del self._jobs[job_id]
+
+    def submit(self, video_path, hand, run):
+        """
+        创建任务并在事件循环中开始执行。
+
+        Args:
+            run: 接收任务对象、返回结果的协程函数。
+        """
+        self._loop = asyncio.get_event_loop()
+        self._evict()
+        job = AnalysisJob(video_path, hand)
+        self._jobs[job.id] = job
+        asyncio.ensure_future(self._run(job, run))
+        return job
+
+    async def _run(self, job, run):
+        try:
+            result = await run(job)
+        except Exception as e:
+            job.fail(str(e))
+        else:
+            job.finish(result)
+
+    def get(self, job_id):
+        self._evict()
+        return self._jobs.get(job_id)
+
+    def report_progress(self, job_id, frames, total_frames, reps):
+        """供分析进程池的读取线程调用，把进度转交给事件循环线程"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._update, job_id, frames, total_frames, reps)
+
+    def _update(self, job_id, frames, total_frames, reps):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(frames, total_frames, reps)
+
+    def stats(self):
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+
+# 服务进程内的单例
+analysis_jobs = AnalysisJobs()
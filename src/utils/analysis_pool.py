@@ -0,0 +1,283 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# 常驻分析进程数；0 表示沿用每个请求启动一次 process_video.py 子进程
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 1))
+# 分析进程启动时互相等待预加载完成的最长时间（秒）
+ANALYSIS_WORKER_START_TIMEOUT = 600
+# 分析进程上报任务进度的最小间隔（秒）
+ANALYSIS_PROGRESS_INTERVAL = float(os.environ.get('ANALYSIS_PROGRESS_INTERVAL', 0.5))
+
+# 每个分析任务的日志输出上限（行）：常驻进程每个任务最多转发这么多行到服务日志，
+# 子进程方式只在内存中保留最后这么多行，用于失败时的错误信息
+ANALYSIS_LOG_LINES = int(os.environ.get('ANALYSIS_LOG_LINES', 200))
+
+# 分析进程内：向服务进程上报进度的队列
+_progress_queue = None
+# 分析进程内：替换 sys.stdout/sys.stderr 的有界输出
+_outputs = ()
+
+
+class LogTail:
+    """只保留最后 max_lines 行的输出缓冲，内存占用与输出总量无关"""
+
+    def __init__(self, max_lines=ANALYSIS_LOG_LINES, max_line_bytes=4096):
+        self.lines = deque(maxlen=max_lines)
+        self.max_line_bytes = max_line_bytes
+        self.total = 0
+        self._partial = b''
+
+    def feed(self, data):
+        """追加一段原始输出（bytes），按行切分"""
+        data = self._partial + data
+        *lines, self._partial = data.split(b'\n')
+        # 没有换行的超长输出只保留开头
+        self._partial = self._partial[:self.max_line_bytes]
+        for line in lines:
+            self.lines.append(line[:self.max_line_bytes].decode(errors='replace'))
+        self.total += len(lines)
+
+    def text(self):
+        lines = list(self.lines)
+        if self._partial:
+            lines.append(self._partial.decode(errors='replace'))
+        omitted = self.total - len(self.lines)
+        if omitted > 0:
+            lines.insert(0, f"...（省略前 {omitted} 行）")
+        return '\n'.join(lines)
+
+
+class _BoundedOutput(io.TextIOBase):
+    """分析进程的标准输出/错误：每个任务最多转发 max_lines 行，其余只计数"""
+
+    def __init__(self, stream, max_lines):
+        self.stream = stream
+        self.max_lines = max_lines
+        self.lines = 0
+        self.dropped = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        newlines = text.count('\n')
+        if self.lines < self.max_lines:
+            self.stream.write(text)
+        else:
+            self.dropped += newlines
+        self.lines += newlines
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def start_job(self):
+        self.lines = self.dropped = 0
+
+    def end_job(self):
+        if self.dropped:
+            self.stream.write(f"分析进程 {os.getpid()}: 本次任务省略了 {self.dropped} 行输出\n")
+            self.stream.flush()
+
+
+def _init_worker(model_path, imgsz, threads, barrier, progress_queue):
+    """分析进程启动时执行：导入分析依赖，预加载并预热姿态模型，加载评分模型"""
+    global _progress_queue, _outputs
+    _progress_queue = progress_queue
+    sys.stdout = _BoundedOutput(sys.__stdout__, ANALYSIS_LOG_LINES)
+    sys.stderr = _BoundedOutput(sys.__stderr__, ANALYSIS_LOG_LINES)
+    _outputs = (sys.stdout, sys.stderr)
+    start_time = time.time()
+    import torch
+    # 多个分析进程平分 CPU 核，避免每个进程的 torch 线程池都占满所有核
+    torch.set_num_threads(threads)
+    import process_video
+    from model_registry import registry
+    try:
+        registry.warmup(model_path, imgsz)
+        process_video.load_scoring_models()
+    except Exception as e:
+        # 预加载失败不影响进程可用，第一次任务时再加载
+        print(f"分析进程 {os.getpid()} 预加载模型失败: {e}")
+    print(f"分析进程 {os.getpid()} 就绪，耗时: {time.time() - start_time:.2f}秒")
+    # 等所有进程都预加载完再开始接任务，否则先就绪的进程会把启动时的空任务全部取走，无法据此判断全部就绪
+    try:
+        barrier.wait(ANALYSIS_WORKER_START_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass
+
+
+def _ping():
+    return os.getpid()
+
+
+def _progress_reporter(job_id):
+    """返回 progress(帧数, 总帧数, 动作数) 回调，按 ANALYSIS_PROGRESS_INTERVAL 节流后放入进度队列"""
+    last = [0.0]
+
+    def report(frames, total_frames, reps):
+        now = time.time()
+        if now - last[0] < ANALYSIS_PROGRESS_INTERVAL and frames != total_frames:
+            return
+        last[0] = now
+        _progress_queue.put((job_id, frames, total_frames, reps))
+
+    return report
+
+
+def _analyze(job_id, video_path, hand, pose_tier, imgsz, pose_backend, output_name=None):
+    import process_video
+    progress = None
+    if job_id is not None and _progress_queue is not None:
+        progress = _progress_reporter(job_id)
+        # 任务开始执行（此前在进程池中排队）
+        progress(0, None, 0)
+    for output in _outputs:
+        output.start_job()
+    try:
+        # 结果作为返回值经进程池的结果管道传回，与日志输出分开
+        return process_video.analysis_result(video_path, hand, pose_tier, imgsz, pose_backend, progress, output_name)
+    finally:
+        for output in _outputs:
+            output.end_job()
+
+
+class AnalysisPool:
+    """
+    常驻分析进程池：进程启动时预加载姿态模型与评分模型，之后每个分析请求直接在已就绪的进程中执行
+    run_program，不再为每个请求重新导入 torch/ultralytics 并加载模型。
+
+    使用 spawn 启动进程（服务进程中已有推理线程和事件循环，fork 不安全）。
+    请求数超过进程数时在进程池内排队；某个进程异常退出（如内存不足被杀）时整个池会失效，
+    此时正在执行和排队的任务失败，进程池自动重建。
+
+    带 job_id 的任务在分析进程中通过进度队列上报 (job_id, 帧数, 总帧数, 动作数)，
+    服务进程中的读取线程把它交给 on_progress 回调。
+    """
+
+    def __init__(self, workers=ANALYSIS_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pose_config = None
+        self._warmups = []
+        self._progress_queue = None
+        self.on_progress = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _create(self):
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(
+            self.workers, mp_context=context, initializer=_init_worker,
+            initargs=(self._pose_config['model_path'], self._pose_config['imgsz'], threads,
+                      context.Barrier(self.workers), self._progress_queue))
+        # 提交空任务让进程立即启动并在后台预加载，第一个请求不必等待
+        self._warmups = [executor.submit(_ping) for _ in range(self.workers)]
+        return executor
+
+    def start(self, pose_config):
+        """
+        启动分析进程。
+
+        Args:
+            pose_config (dict): 默认姿态模型配置（resolve_pose_config 的结果），进程启动时预热该模型。
+        """
+        if not self.enabled:
+            return
+        self._pose_config = pose_config
+        with self._lock:
+            if self._executor is None:
+                self._progress_queue = multiprocessing.get_context('spawn').Queue()
+                threading.Thread(target=self._read_progress, daemon=True).start()
+                self._executor = self._create()
+        print(f"分析进程池启动，进程数: {self.workers}")
+
+    def _read_progress(self):
+        while True:
+            job_id, frames, total_frames, reps = self._progress_queue.get()
+            if self.on_progress is not None:
+                try:
+                    self.on_progress(job_id, frames, total_frames, reps)
+                except Exception as e:
+                    print(f"处理任务进度失败: {e}")
+
+    def wait_ready(self, timeout=None):
+        """等待所有分析进程完成预加载"""
+        for future in list(self._warmups):
+            future.result(timeout)
+
+    def _restart(self, broken):
+        with self._lock:
+            # 多个任务同时失败时只重建一次
+            if self._executor is broken:
+                broken.shutdown(wait=False)
+                self._executor = self._create()
+                self.restarts += 1
+
+    def shutdown(self):
+        """停止所有分析进程（等待正在执行的任务结束）"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    async def run(self, video_path, hand, pose_config, job_id=None, output_name=None):
+        """
+        在常驻进程中执行一次分析。
+
+        Args:
+            job_id (str): 异步任务 ID，给出时分析进程上报该任务的进度。
+            output_name (str): 输出名（见 overlay_timeline.analysis_output_name），None 时由分析进程计算。
+
+        Returns:
+            dict: 与 process_video.py 输出相同的结果字典。
+        """
+        executor = self._executor
+        loop = asyncio.get_event_loop()
+        self.running += 1
+        try:
+            result = await loop.run_in_executor(
+                executor, _analyze, job_id, video_path, hand,
+                pose_config['tier'], pose_config['imgsz'], pose_config['backend'], output_name)
+        except BrokenProcessPool:
+            self.failed += 1
+            self._restart(executor)
+            raise RuntimeError("分析进程异常退出，进程池已重建")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+        self.completed += 1
+        return result
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'ready': sum(1 for f in self._warmups if f.done() and f.exception() is None),
+            'running': min(self.running, self.workers),
+            'queued': max(0, self.running - self.workers),
+            'completed': self.completed,
+            'failed': self.failed,
+            'restarts': self.restarts,
+        }
+
+
+# 服务进程内的单例
+analysis_pool = AnalysisPool()
@@ -1,6 +1,5 @@
 import os
 import cv2
-from ultralytics import solutions
 from ultralytics.utils.plotting import Annotator
 import pandas as pd 
 import numpy as np
@@ -17,7 +16,18 @@ import threading
 import atexit
 import warnings
 import json
-from ultralytics import YOLO
+from model_registry import registry
+from pose_engine import PoseEstimator, crop_box
+from keypoint_store import keypoint_store
+from process_data import (keypoint_variant, ROI_MARGIN, POSE_BATCH_SIZE, roi_tracker, open_video_roi, pose_stages,
+                          decode_frames, OnlineSegmenter)
+from pose_engine import joint_angles, interpolate_boxes, EMPTY_KEYPOINTS
+from pipeline import Pipeline
+from video_writer import open_video_writer
+from overlay_timeline import OverlayTimeline, RENDER_OVERLAY, timeline_path, project_path
+from render_cache import LAZY_RENDER, render_url
+from video_index import build_index, load_index, read_frame, seek
+from video_reader import open_scaled_frames
 
 warnings.filterwarnings('ignore')
 # 获取标准平均角度
@@ -42,175 +52,431 @@ t_point = None
 case_arr = []
 score_arr = []
 
-def extract_segment(input_path, output_path, start_frame, end_frame, fps, size):
-    """从处理后的视频中截取指定帧范围的片段"""
-    cap = cv2.VideoCapture(input_path)
+def extract_segments(input_path, segments, fps, size):
+    """
+    一次解码处理后的视频，同时写出多个片段（片段可以重叠）。
+
+    Args:
+        segments (list): [(start_frame, end_frame, output_path)]，帧范围为闭区间。
+    """
     # 修改输出路径扩展名为.mp4
-    output_path = output_path.replace('.avi', '.mp4')
-    
-    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-        
-    out = cv2.VideoWriter(output_path, fourcc, fps, size)
-    if not out.isOpened():
-        # 如果H264/avc1不可用，尝试其他编码器
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, size)
-    
+    pending = sorted((start, end, path.replace('.avi', '.mp4')) for start, end, path in segments)
+    if not pending:
+        return
+    cap = cv2.VideoCapture(input_path)
+    # 片段之间隔着关键帧时直接定位到下一个片段；处理后的视频是临时文件，没有 ffprobe 时不为此先完整解码一遍
+    index = build_index(input_path, fallback=False)
+    last_frame = max(end for _, end, _ in pending)
+    active = []  # [(end_frame, writer)]
+
     current_frame = 0
-    while True:
-        ret, frame = cap.read()
+    while current_frame <= last_frame:
+        # 没有片段需要这一帧时只 grab，不做颜色转换
+        if not active and pending[0][0] > current_frame:
+            if index is None or not index.worth_seeking(current_frame, pending[0][0]):
+                if not cap.grab():
+                    break
+                current_frame += 1
+                continue
+            if not seek(cap, index, pending[0][0]):
+                break
+            current_frame = pending[0][0]
+            ret, frame = cap.retrieve()
+        else:
+            ret, frame = cap.read()
         if not ret:
             break
-        if start_frame <= current_frame <= end_frame:
-            out.write(frame)
-        if current_frame > end_frame:
-            break
+        while pending and pending[0][0] <= current_frame:
+            _, end, path = pending.pop(0)
+            active.append((end, open_video_writer(path, fps, size)))
+        for _, writer in active:
+            writer.write(frame)
+        for end, writer in [a for a in active if a[0] <= current_frame]:
+            writer.release()
+        active = [a for a in active if a[0] > current_frame]
         current_frame += 1
     cap.release()
-    out.release()
+    for _, writer in active:
+        writer.release()
+    # 视频提前结束时，未开始的片段仍输出空文件，与逐段截取的行为一致
+    for _, _, path in pending:
+        open_video_writer(path, fps, size).release()
+
+def extract_segment(input_path, output_path, start_frame, end_frame, fps, size):
+    """从处理后的视频中截取指定帧范围的片段"""
+    extract_segments(input_path, [(start_frame, end_frame, output_path)], fps, size)
 
 stop_event = threading.Event()
 segments_info = []  # 存储每个片段的信息
 
-def workouts(model_path, video_path, point_list, up_angle=130.0, down_angle=70, show=False):
+def workouts(model_path, video_path, point_list, up_angle=130.0, down_angle=70, show=False, imgsz=None, output_name=None):
+    """output_name 为输出视频与片段的文件名前缀（见 overlay_timeline.analysis_output_name），None 时为视频名"""
     Annotator.draw_specific_points = new
+    name = output_name or os.path.splitext(os.path.basename(video_path))[0]
     cap = cv2.VideoCapture(video_path)
 
     assert cap.isOpened(), "Error reading video file"
     w, h, fps = (int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS))
     # 修改输出路径扩展名为.mp4
-    out_path = "./runs/" + os.path.splitext(os.path.basename(video_path))[0] + ".mp4"
+    out_path = "./runs/" + name + ".mp4"
     
-    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-    video_writer = cv2.VideoWriter(out_path, fourcc, fps, (w, h))
-    if not video_writer.isOpened():
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        video_writer = cv2.VideoWriter(out_path, fourcc, fps, (w, h))
-
-    # 初始化YOLO模型用于人物检测
-    yolo_model = YOLO(model_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 59)
-    # 读取第一帧进行人物检测
-    success, first_frame = cap.read()
-    if not success:
-        print("无法读取视频第60帧")
-        return
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-    # 检测人物并获取ROI
-    results = yolo_model.predict(first_frame, verbose=False)
-    boxes = results[0].boxes.xyxy.cpu().numpy()
-    classes = results[0].boxes.cls.cpu().numpy()
-    person_boxes = boxes[classes == 0]
-
-    if len(person_boxes) == 0:
-        print("未检测到人体")
-        return
+    video_writer = open_video_writer(out_path, fps, (w, h))
 
-    # 找到面积最大的检测框
-    areas = (person_boxes[:, 2] - person_boxes[:, 0]) * (person_boxes[:, 3] - person_boxes[:, 1])
-    max_idx = np.argmax(areas)
-    x1, y1, x2, y2 = person_boxes[max_idx].astype(int)
+    # 关键点轨迹缓存（通常已由 process_video 写入），命中时复用 ROI 和关键点，不再重复推理
+    cached = keypoint_store.load(video_path, model_path, keypoint_variant(imgsz))
+    tracker = None
+    if cached is not None:
+        track, meta = cached
+        x1, y1, x2, y2 = meta['roi']['bbox']
+        # 开启移动 ROI 时缓存中带有逐帧人体框
+        track_boxes = meta['roi'].get('boxes')
+    else:
+        track = None
+        track_boxes = None
+        # 从进程级注册表获取模型用于人物检测
+        yolo_model = registry.get(model_path)
+        index = load_index(video_path)
+        # 读取第60帧进行人物检测
+        first_frame = read_frame(cap, index, min(59, index.frames - 1))
+        if first_frame is None:
+            print("无法读取视频第60帧")
+            return
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        # 检测人物并获取ROI
+        with registry.lock(model_path):
+            results = yolo_model.predict(first_frame, verbose=False)
+        boxes = results[0].boxes.xyxy.cpu().numpy()
+        classes = results[0].boxes.cls.cpu().numpy()
+        person_boxes = boxes[classes == 0]
+
+        if len(person_boxes) == 0:
+            print("未检测到人体")
+            return
+
+        # 找到面积最大的检测框
+        areas = (person_boxes[:, 2] - person_boxes[:, 0]) * (person_boxes[:, 3] - person_boxes[:, 1])
+        max_idx = np.argmax(areas)
+        x1, y1, x2, y2 = person_boxes[max_idx].astype(int)
+        tracker = roi_tracker({'roi': {'bbox': (x1, y1, x2, y2)}, 'width': w, 'height': h})
     
-    # 创建ROI掩码
+    # ROI矩形（含边界像素）与推理用的裁剪区域
     roi_points = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32)
-    mask = np.zeros((h, w), dtype=np.uint8)
-    cv2.fillPoly(mask, [roi_points], 255)
+    rx1, ry1, rx2, ry2 = crop_box((x1, y1, x2, y2), w, h, 0)
+    cx1, cy1, cx2, cy2 = crop_box((x1, y1, x2, y2), w, h, ROI_MARGIN)
 
     # 将ROI信息保存为全局变量，供new函数使用
     global roi_info_global
     roi_info_global = {
         'points': roi_points.tolist(),
-        'bbox': (x1, y1, x2, y2),
-        'mask': mask
+        'bbox': (x1, y1, x2, y2)
     }
 
-    gym = solutions.AIGym(
-        model=model_path,
-        show=show,
-        line_width=2,
-        up_angle=up_angle,
-        down_angle=down_angle,
-        kpts=point_list,
-        verbose=False
-    )
-
-    while cap.isOpened():
-        success, im0 = cap.read()
-        if not success:
-            break
-            
-        # 创建原始帧的副本
-        original_frame = im0.copy()
-        
-        # 应用掩码到副本
-        masked_im = im0.copy()
-        masked_im[mask == 0] = 0  # 将非ROI区域设为黑色
+    # 与 AIGym(line_width=2) 相同的绘制参数，但模型来自共享注册表
+    pose = PoseEstimator(model_path, [point_list], imgsz=imgsz)
+    line_width = 2
+    count = 0
+    stage = None
+
+    # 解码 → 姿态 → 绘制与评分 → 编码，各阶段在独立线程中运行
+    def decode():
+        frame_idx = 0
+        while cap.isOpened():
+            success, im0 = cap.read()
+            if not success:
+                break
+            yield frame_idx, im0
+            frame_idx += 1
+
+    def infer(item, emit):
+        frame_idx, im0 = item
+        if track is not None and frame_idx < len(track):
+            keypoints = None if np.isnan(track[frame_idx]).all() else np.asarray(track[frame_idx])
+        elif tracker is not None:
+            keypoints = tracker.track(pose, frame_idx, im0)
+        else:
+            keypoints = pose.infer(np.ascontiguousarray(im0[cy1:cy2, cx1:cx2]), offset=(cx1, cy1))
+        # 移动 ROI：本帧的人体框
+        box = None
+        if track_boxes is not None and frame_idx < len(track_boxes):
+            box = track_boxes[frame_idx]
+        elif tracker is not None:
+            box = tracker.boxes.pop(frame_idx, None)
+        emit((im0, keypoints, box))
+
+    def render(item, emit):
+        nonlocal count, stage, x1, y1, x2, y2, rx1, ry1, rx2, ry2
+        original_frame, keypoints, box = item
+        if box is not None:
+            x1, y1, x2, y2 = box
+            rx1, ry1, rx2, ry2 = crop_box(box, w, h, 0)
+            roi_info_global['bbox'] = (x1, y1, x2, y2)
         
-        # 处理帧
-        processed_frame = gym.monitor(masked_im)
+        # 在副本上绘制，之后只把ROI矩形区域写回原始帧
+        processed_frame = original_frame.copy()
+        if keypoints is not None:
+            angle = pose.angles_from_keypoints(keypoints)[0]
+            annotator = Annotator(processed_frame, line_width=line_width)
+            annotator.draw_specific_points(keypoints, point_list, radius=line_width * 3)
+            if angle < down_angle:
+                if stage == "up":
+                    count += 1
+                stage = "down"
+            elif angle > up_angle:
+                stage = "up"
+            annotator.plot_angle_and_count_and_stage(
+                angle_text=angle,
+                count_text=count,
+                stage_text=stage,
+                center_kpt=keypoints[int(point_list[1])],
+            )
+            processed_frame = annotator.result()
         
         # 将处理后的ROI区域复制回原始帧
-        original_frame[mask != 0] = processed_frame[mask != 0]
+        original_frame[ry1:ry2, rx1:rx2] = processed_frame[ry1:ry2, rx1:rx2]
         
         # 绘制ROI边界框
         cv2.rectangle(original_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
         
         # 在左上角添加文本信息
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        text_x = 20  # 距离左边20像素
-        text_y = 40  # 距离顶部40像素
-        
-        # 添加半透明背景
-        overlay = original_frame.copy()
-        # 计算文本大小
-        (text_w1, text_h1), _ = cv2.getTextSize(predicted_label, font, 1, 2)
-        (text_w2, text_h2), _ = cv2.getTextSize(prediction_text, font, 1, 2)
-        # 创建背景矩形
-        padding = 10
-        cv2.rectangle(overlay, 
-                     (text_x - padding, text_y - text_h1 - padding),
-                     (text_x + max(text_w1, text_w2) + padding, text_y + text_h2 + padding),
-                     (0, 0, 0), -1)
-        # 应用半透明效果
-        cv2.addWeighted(overlay, 0.5, original_frame, 0.5, 0, original_frame)
-        
-        # 显示文本
-        cv2.putText(original_frame, predicted_label, (text_x, text_y), font, 1, (0, 0, 255), 2, cv2.LINE_AA)
-        cv2.putText(original_frame, prediction_text, (text_x, text_y + text_h1 + 20), font, 1, (0, 0, 255), 2, cv2.LINE_AA)
-        
-        video_writer.write(original_frame)
+        draw_result_text(original_frame, predicted_label, prediction_text)
+        emit(original_frame)
+
+    pipe = Pipeline('render')
+    pipe.add('pose', infer).add('render', render).add('encode', lambda frame, emit: video_writer.write(frame))
+    try:
+        pipe.run(decode(), source_name='decode')
+    finally:
+        cap.release()
+    pipe.report()
 
     cv2.destroyAllWindows()
     video_writer.release()
     
     # 修改处理后视频路径扩展名为.mp4
-    processed_video_path = "./runs/" + os.path.splitext(os.path.basename(video_path))[0] + ".mp4"
+    processed_video_path = "./runs/" + name + ".mp4"
     output_arr = []
-    # 获取原视频文件名（不含扩展名）
-    original_video_name = os.path.splitext(os.path.basename(processed_video_path))[0]
     
+    clips = []
     for segment in segments_info:
         # 检查条件：分数低于阈值或标签不在预期列表中
         if (segment['score'] < 80):
             # 生成输出路径，使用.mp4扩展名
-            output_path = f"./runs/{original_video_name}_segment_{segment['start_frame']}_{segment['end_frame']}.mp4"
-        
-            # 调用截取函数
-            extract_segment(
-                processed_video_path,
-                output_path,
-                segment['start_frame'],
-                segment['end_frame'],
-                fps, 
-                (w, h)
-            )
+            output_path = f"./runs/{name}_segment_{segment['start_frame']}_{segment['end_frame']}.mp4"
+            clips.append((segment['start_frame'], segment['end_frame'], output_path))
             output_arr.append(output_path)
+    # 所有低分片段在一次解码中截取
+    extract_segments(processed_video_path, clips, fps, (w, h))
 
     # 清空全局变量以备下次使用
     segments_info.clear()
     output_arr.append(processed_video_path)
     return output_arr
 
+def torso_indices(indices):
+    """手臂三元组对应的躯干三元组（髋-肩-肘）"""
+    if indices == [6, 8, 10]:
+        return [12, 6, 8]
+    elif indices == [5, 7, 9]:
+        return [11, 5, 7]
+    return []
+
+def arm_points(keypoints, indices=None, conf_thres=0.25):
+    """取出手臂三元组及其对应躯干三元组中置信度足够的关键点坐标"""
+    indices = indices or [2, 5, 7]
+    indices2 = torso_indices(indices)
+
+    points = [(int(keypoints[i][0]), int(keypoints[i][1])) for i in indices if keypoints[i][2] >= conf_thres]
+    points2 = [(int(keypoints[i][0]), int(keypoints[i][1])) for i in indices2 if keypoints[i][2] >= conf_thres]
+    return points, points2
+
+def draw_points(im, points, points2, radius=2):
+    """绘制两组关键点的连线和圆点"""
+    # Draw lines between consecutive points
+    for start, end in zip(points[:-1], points[1:]):
+        cv2.line(im, start, end, (0, 255, 0), 2, lineType=cv2.LINE_AA)
+
+    # Draw circles for keypoints
+    for pt in points:
+        cv2.circle(im, pt, radius, (0, 0, 255), -1, lineType=cv2.LINE_AA)
+    
+    for start, end in zip(points2[:-1], points2[1:]):
+        cv2.line(im, start, end, (0, 255, 0), 2, lineType=cv2.LINE_AA)
+
+    # Draw circles for keypoints2
+    for pt in points2:
+        cv2.circle(im, pt, radius, (0, 0, 255), -1, lineType=cv2.LINE_AA)
+    return im
+
+def draw_result_text(frame, label_text, score_text):
+    """在画面左上角的半透明背景上显示动作类别与评分"""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    text_x = 20  # 距离左边20像素
+    text_y = 40  # 距离顶部40像素
+    
+    # 添加半透明背景
+    overlay = frame.copy()
+    # 计算文本大小
+    (text_w1, text_h1), _ = cv2.getTextSize(label_text, font, 1, 2)
+    (text_w2, text_h2), _ = cv2.getTextSize(score_text, font, 1, 2)
+    # 创建背景矩形
+    padding = 10
+    cv2.rectangle(overlay, 
+                 (text_x - padding, text_y - text_h1 - padding),
+                 (text_x + max(text_w1, text_w2) + padding, text_y + text_h2 + padding),
+                 (0, 0, 0), -1)
+    # 应用半透明效果
+    cv2.addWeighted(overlay, 0.5, frame, 0.5, 0, frame)
+    
+    # 显示文本
+    cv2.putText(frame, label_text, (text_x, text_y), font, 1, (0, 0, 255), 2, cv2.LINE_AA)
+    cv2.putText(frame, score_text, (text_x, text_y + text_h1 + 20), font, 1, (0, 0, 255), 2, cv2.LINE_AA)
+    return frame
+
+def draw_overlay(frame, keypoints, angle, count, stage, point1, roi_box, label, text, line_width=2):
+    """
+    在帧上绘制手臂关键点、角度/计数/状态、ROI 框和评分文本，与 workouts 的画面相同。
+    关键点只在 ROI 区域内可见。
+    """
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in roi_box)
+    rx1, ry1, rx2, ry2 = crop_box((x1, y1, x2, y2), w, h, 0)
+    processed_frame = frame.copy()
+    if keypoints is not None:
+        annotator = Annotator(processed_frame, line_width=line_width)
+        points, points2 = arm_points(keypoints, list(point1))
+        draw_points(annotator.im, points, points2, radius=line_width * 3)
+        annotator.plot_angle_and_count_and_stage(
+            angle_text=angle,
+            count_text=count,
+            stage_text=stage,
+            center_kpt=keypoints[int(point1[1])],
+        )
+        processed_frame = annotator.result()
+    frame[ry1:ry2, rx1:rx2] = processed_frame[ry1:ry2, rx1:rx2]
+    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    draw_result_text(frame, label, text)
+    return frame
+
+def score_text(score):
+    """
+    画面上的评分文本，格式与 ultralytics 设置的 numpy 打印格式（{:11.5g}）下的 str(评分数组) 相同。
+    显式格式化，避免结果随线程（numpy 2 的打印设置按上下文生效）变化。
+    """
+    return "score: [" + "{:11.5g}".format(float(np.ravel(score)[0])) + "]"
+
+def render_timeline(video_path, timeline, out_path, start=None, end=None):
+    """
+    按叠加时间轴在原视频上绘制并编码，不需要姿态推理。
+
+    Args:
+        timeline (dict): OverlayTimeline.to_dict() 的结果。
+        start/end (int): 只渲染闭区间 [start, end] 内的帧（低分片段），None 时渲染整段视频。
+    """
+    point1 = timeline['lines'][0]
+    indices = timeline['keypoint_indices']
+    boxes = timeline['boxes']
+    start = 0 if start is None else int(start)
+    end = timeline['frames'] - 1 if end is None else int(end)
+
+    stage_events = timeline['stages']
+    # 片段评分从其最后一帧开始显示
+    shown = {s['end']: (s['label'], score_text(s['score'])) for s in timeline['segments']}
+    state = {'count': 0, 'stage': None, 'label': predicted_label, 'text': prediction_text,
+             'box': timeline['roi'], 'event': 0}
+
+    def advance(frame_idx):
+        """把计数状态、显示的评分和 ROI 框推进到 frame_idx"""
+        while state['event'] < len(stage_events) and stage_events[state['event']][0] <= frame_idx:
+            _, state['stage'], state['count'] = stage_events[state['event']]
+            state['event'] += 1
+        if frame_idx in shown:
+            state['label'], state['text'] = shown[frame_idx]
+        if boxes is not None and frame_idx < len(boxes) and boxes[frame_idx] is not None:
+            state['box'] = boxes[frame_idx]
+
+    for frame_idx in range(start):
+        advance(frame_idx)
+
+    cap = cv2.VideoCapture(video_path)
+    assert cap.isOpened(), "Error reading video file"
+    # 片段从其前一个关键帧开始解码，用索引核对落点，保证与整段渲染的帧号一致
+    index = load_index(video_path) if start > 0 else None
+
+    def decode():
+        if start > 0:
+            ret = seek(cap, index, start)
+            ret, frame = cap.retrieve() if ret else (False, None)
+        else:
+            ret, frame = cap.read()
+        frame_idx = start
+        while ret and frame_idx <= end:
+            yield frame_idx, frame
+            frame_idx += 1
+            if frame_idx <= end:
+                ret, frame = cap.read()
+
+    def render(item, emit):
+        frame_idx, frame = item
+        advance(frame_idx)
+        keypoints = None
+        points = timeline['keypoints'][frame_idx] if frame_idx < len(timeline['keypoints']) else None
+        if points is not None:
+            keypoints = np.zeros((17, 3), dtype=np.float32)
+            for j, i in enumerate(indices):
+                if points[2 * j] is not None:
+                    keypoints[i] = (points[2 * j], points[2 * j + 1], 1.0)
+        angles = timeline['angles'][frame_idx] if frame_idx < len(timeline['angles']) else None
+        angle = angles[0] if angles is not None and angles[0] is not None else float('nan')
+        emit(draw_overlay(frame, keypoints, angle, state['count'], state['stage'], point1, state['box'],
+                          state['label'], state['text']))
+
+    writer = open_video_writer(out_path, timeline['fps'], (timeline['width'], timeline['height']))
+    pipe = Pipeline('render-timeline')
+    pipe.add('render', render).add('encode', lambda frame, emit: writer.write(frame))
+    try:
+        pipe.run(decode(), source_name='decode')
+    finally:
+        cap.release()
+        writer.release()
+    return out_path
+
+def predict_segment(combined_features):
+    """
+    用评分模型和分类模型预测一个动作片段。
+
+    Args:
+        combined_features (ndarray): 重采样后的 group1 与 group2 角度拼接而成的特征。
+
+    Returns:
+        tuple: (predicted_score, predicted_label)，评分为截断到 [0, 100] 的 float，标签形如 "category:xxx"。
+    """
+    ff = []
+    ff.append(combined_features)
+    ff = np.array(ff)
+    ff1 = ff
+    ff = weight_features(ff, num_weights=5, weight_factor=5)
+    
+    # 预测新数据
+    features_tensor = torch.tensor(ff, dtype=torch.float32).to(device)
+    with torch.no_grad():
+        prediction = model(features_tensor)
+    # 输出预测结果
+    # 始终返回标量：截断前为形如 [x] 的数组，直接赋值 100/0 截断后却是 int，调用方无法统一处理
+    predicted_score = float(np.clip(prediction.cpu().numpy().ravel()[0], 0, 100))
+
+    ff1_tensor = torch.tensor(ff1, dtype=torch.float32).to(device)
+
+    if len(ff1_tensor.shape) == 1:
+        ff1_tensor = ff1_tensor.unsqueeze(0)  # 添加批次维度
+
+    model2.eval()  
+    with torch.no_grad():  
+        output = model2(ff1_tensor)
+        _, predicted = torch.max(output, 1)
+        predicted_label = label_encoder.inverse_transform([predicted.item()])[0]
+        predicted_label = "category:" + str(predicted_label)
+    return predicted_score, predicted_label
+
 def new(self, keypoints, indices=None, radius=2, conf_thres=0.25):
     """
     Draw specific keypoints for gym steps counting.
@@ -232,9 +498,7 @@ def new(self, keypoints, indices=None, radius=2, conf_thres=0.25):
     global roi_info_global
     try:
         roi_info = roi_info_global
-        roi_points = roi_info['points']
         x1, y1, x2, y2 = roi_info['bbox']
-        mask = roi_info['mask']
         
         # 计算ROI区域的边界框
         roi_x = x1
@@ -242,31 +506,16 @@ def new(self, keypoints, indices=None, radius=2, conf_thres=0.25):
         roi_w = x2 - x1
         roi_h = y2 - y1
         
-        # 创建掩码后的图像
-        masked_im = self.im.copy()
-        masked_im[mask == 0] = 0  # 将非ROI区域设为黑色
-        
         # 绘制ROI边界框
         cv2.rectangle(self.im, 
                      (roi_x, roi_y), 
                      (roi_x + roi_w, roi_y + roi_h),
                      (0, 255, 0), 2)  # 绿色边框，2像素宽度
-        
-        # 将掩码后的图像复制回原图
-        self.im[mask != 0] = masked_im[mask != 0]
     except:
         roi_x = 50
         roi_y = 50
 
-    indices = indices or [2, 5, 7]
-    indices2 = []
-    if indices == [6, 8, 10]:
-        indices2 = [12, 6, 8]
-    elif indices == [5, 7, 9]:
-        indices2 = [11, 5, 7]
-
-    points = [(int(keypoints[i][0]), int(keypoints[i][1])) for i in indices if keypoints[i][2] >= conf_thres]
-    points2 = [(int(keypoints[i][0]), int(keypoints[i][1])) for i in indices2 if keypoints[i][2] >= conf_thres]
+    points, points2 = arm_points(keypoints, indices, conf_thres)
     global idx, tmp, cur, prediction_text, ndx, predicted_label, t_point
     # if len(points2) >= 3:
     #     t_point = points[1]
@@ -300,10 +549,6 @@ def new(self, keypoints, indices=None, radius=2, conf_thres=0.25):
             group1_data = predict_data[predict_data['angle_group'] == 'group1']
             group2_data = predict_data[predict_data['angle_group'] == 'group2']
             font = cv2.FONT_HERSHEY_SIMPLEX
-            print("cur:", cur)
-            print("idx:", idx)
-            print("ndx:", ndx)
-            print("predict_data['segment_total_frames'][ndx]:", predict_data['segment_total_frames'][ndx])
             if cur == predict_data['segment_total_frames'][ndx]:
 
                 video_name = predict_data['segment_label'][ndx]
@@ -313,36 +558,9 @@ def new(self, keypoints, indices=None, radius=2, conf_thres=0.25):
                 group2_features = group2_data['angle_value'].values
                 # 拼接特征
                 combined_features = np.concatenate([group1_features, group2_features])
-                ff = []
-                ff.append(combined_features)
-                ff = np.array(ff)
-                ff1 = ff
-                ff = weight_features(ff, num_weights=5, weight_factor=5)
-                
-                # 预测新数据
-                features_tensor = torch.tensor(ff, dtype=torch.float32).to(device)
-                with torch.no_grad():
-                    prediction = model(features_tensor)
-                # 输出预测结果
-                predicted_score = prediction.cpu().numpy()[0]
-                if predicted_score > 100:
-                    predicted_score = 100
-                if predicted_score < 0:
-                    predicted_score = 0
-                prediction_text = "score: " + str(predicted_score)
+                predicted_score, predicted_label = predict_segment(combined_features)
+                prediction_text = score_text(predicted_score)
                 cur = 1
-
-                ff1_tensor = torch.tensor(ff1, dtype=torch.float32).to(device)
-
-                if len(ff1_tensor.shape) == 1:
-                    ff1_tensor = ff1_tensor.unsqueeze(0)  # 添加批次维度
-
-                model2.eval()  
-                with torch.no_grad():  
-                    output = model2(ff1_tensor)
-                    _, predicted = torch.max(output, 1)
-                    predicted_label = label_encoder.inverse_transform([predicted.item()])[0]
-                    predicted_label = "category:" + str(predicted_label)
                 
                 case_arr.append(predicted_label)
                 score_arr.append(predicted_score)
@@ -403,26 +621,24 @@ def new(self, keypoints, indices=None, radius=2, conf_thres=0.25):
     #     points[1] = t_point
 
     idx = idx + 1
-    # Draw lines between consecutive points
-    for start, end in zip(points[:-1], points[1:]):
-        cv2.line(self.im, start, end, (0, 255, 0), 2, lineType=cv2.LINE_AA)
-
-    # Draw circles for keypoints
-    for pt in points:
-        cv2.circle(self.im, pt, radius, (0, 0, 255), -1, lineType=cv2.LINE_AA)
-    
-    for start, end in zip(points2[:-1], points2[1:]):
-        cv2.line(self.im, start, end, (0, 255, 0), 2, lineType=cv2.LINE_AA)
-
-    # Draw circles for keypoints2
-    for pt in points2:
-        cv2.circle(self.im, pt, radius, (0, 0, 255), -1, lineType=cv2.LINE_AA)
-
+    draw_points(self.im, points, points2, radius)
     return self.im
 
-def run_display_program(model_data, model2_data, device_data, first_peak_data, last_peak_data, model_path_data, video_path_data, point_list_data, aligned_df, std_csv, output_p, label_encoder_data):
+def reset_run_state():
+    """重置上一次分析留下的模块级状态（计数、当前预测与评分结果），常驻分析进程中每个任务开始前调用"""
+    global idx, tmp, cur, ndx, prediction_text, predicted_label, t_point, case_arr, score_arr
+    idx = tmp = cur = ndx = 0
+    prediction_text = predicted_label = "nothing"
+    t_point = None
+    case_arr = []
+    score_arr = []
+    segments_info.clear()
+
+def run_display_program(model_data, model2_data, device_data, first_peak_data, last_peak_data, model_path_data, video_path_data, point_list_data, aligned_df, standard_angles_data, predict_data_df, label_encoder_data, imgsz=None, output_name=None):
+    """standard_angles_data 为标准角度，predict_data_df 为按片段重采样后的角度（均为 data_run_program 返回的 DataFrame）"""
     try:
         global model, device, first_peak, last_peak, std1, predict_data, standard_angles, standard_group1, standard_group2, model2, label_encoder
+        reset_run_state()
         std1 = aligned_df
         model = model_data
         device = device_data
@@ -432,15 +648,266 @@ def run_display_program(model_data, model2_data, device_data, first_peak_data, l
         model_path = model_path_data
         video_path = video_path_data
         point_list = point_list_data 
-        predict_data = pd.read_csv(output_p)
-        standard_angles = pd.read_csv(std_csv)
+        predict_data = predict_data_df
+        standard_angles = standard_angles_data
         standard_group1 = standard_angles['group1'].values
         standard_group2 = standard_angles['group2'].values
         label_encoder = label_encoder_data
-        output_arr = workouts(model_path, video_path, point_list)
+        output_arr = workouts(model_path, video_path, point_list, imgsz=imgsz, output_name=output_name)
         print(case_arr, score_arr)
         return case_arr, score_arr, output_arr
     finally:
         plt.close("all")
 
-    
\ No newline at end of file
+    
+# 融合引擎：等待分段确定时最多暂存的帧数（720p 约 2.7MB/帧），超过后不等评分直接输出最早的帧
+FUSED_MAX_HOLD = int(os.environ.get('FUSED_MAX_HOLD', 240))
+# 低于该分数的动作片段单独导出
+CLIP_SCORE_THRESHOLD = 80
+
+def fused_workouts(model_path, video_path, point1, point2, up_angle=130.0, down_angle=70, imgsz=None,
+                   batch_size=POSE_BATCH_SIZE, render_overlay=RENDER_OVERLAY, lazy_render=LAZY_RENDER, progress=None,
+                   output_name=None):
+    """
+    单次解码的分析+渲染引擎，代替 process_video → workouts → extract_segment 三次遍历视频。
+
+    解码 → ROI → 姿态 → 评分 → 绘制 → 编码 各为流水线的一个阶段：
+        - 评分阶段边接收关键点边用 OnlineSegmenter 分段，分段一旦确定就立即评分；
+        - 帧在评分阶段最多暂存到所属动作片段评分完成（上限 FUSED_MAX_HOLD 帧），再交给绘制阶段，
+          因此画面上的类别/评分与整段分析后再渲染的结果一致；
+        - 编码阶段同时写出完整视频和低分片段，不再从头解码输出视频截取片段。
+    关键点缓存命中时跳过推理，只解码用于绘制；不绘制时不解码整帧，由 ffmpeg 直接输出推理分辨率的 ROI 帧（见 video_reader）。
+
+    同时输出叠加时间轴 runs/<输出名>.timeline.json（见 OverlayTimeline）；output_name 为 None 时输出名为视频名。render_overlay 为 False 时
+    不绘制、不编码，也不导出片段，由前端按时间轴在原视频上绘制；此时缓存命中的任务完全不需要解码。
+    lazy_render 为 True 时同样不绘制，但返回 ./render/... 地址，首次请求时由 render_cache 按时间轴渲染。
+    progress(已处理帧数, 总帧数, 已评分的动作数) 在最后一个阶段每处理完一帧时调用，用于上报任务进度。
+
+    Returns:
+        tuple: (output_arr, summary)。output_arr 与 workouts 相同（低分片段路径 + 完整视频路径），
+        按需渲染时为对应的 ./render/ 地址，不绘制时只有原视频路径；
+        summary 包含 first_peak、last_peak、分段列表与时间轴路径。
+        无法读取视频或未检测到人体时返回 None。
+    """
+    pose = PoseEstimator(model_path, [point1, point2], imgsz=imgsz)
+    # 绘制时需要整帧，推理输入同样由整帧裁剪得到
+    variant = keypoint_variant(imgsz, scaled=not render_overlay)
+    cached = keypoint_store.load(video_path, model_path, variant)
+    tracker = None
+    if cached is not None:
+        track, meta = cached
+        cap = cv2.VideoCapture(video_path)
+        assert cap.isOpened(), "Error reading video file"
+        track_boxes = meta['roi'].get('boxes')
+    else:
+        opened = open_video_roi(video_path, model_path, ROI_MARGIN)
+        if opened is None:
+            return None
+        cap, meta = opened
+        track = None
+        tracker = roi_tracker(meta)
+        track_boxes = None
+    w, h, fps = meta['width'], meta['height'], meta['fps']
+    x1, y1, x2, y2 = meta['roi']['bbox']
+    total_frames = len(track) if track is not None else meta.get('frames')
+
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    name = output_name or video_name
+    out_path = "./runs/" + name + ".mp4"
+    if lazy_render:
+        render_overlay = False
+    video_writer = open_video_writer(out_path, fps, (w, h)) if render_overlay else None
+
+    def clip_path(start, end):
+        if lazy_render:
+            return render_url(f"{name}_segment_{start}_{end}.mp4")
+        return f"./runs/{name}_segment_{start}_{end}.mp4"
+
+    timeline = OverlayTimeline(meta, [list(point1), torso_indices(list(point1))],
+                               moving_roi=track_boxes is not None or tracker is not None,
+                               source=project_path(video_path))
+
+    def from_track(item, emit):
+        frame_idx, frame = item
+        keypoints = None
+        if frame_idx < len(track) and not np.isnan(track[frame_idx]).all():
+            keypoints = np.asarray(track[frame_idx])
+        emit([(frame_idx, keypoints, frame)])
+
+    # 评分阶段：分段、评分并暂存帧
+    segmenter = OnlineSegmenter(groups=2)
+    new_track = []
+    hold = deque()
+    results = {}       # 分段结束帧 -> (score, label)
+    segments = []      # [(start, end, score, label)]
+    clips = []         # 低分片段 (start, end)
+    forced = [0]       # 因超过暂存上限提前输出的帧数
+    shown = {'label': predicted_label, 'text': prediction_text}
+
+    def score(new_segments):
+        for start, end, features in new_segments:
+            predicted_score, label = predict_segment(features)
+            results[end] = (predicted_score, label)
+            segments.append((start, end, predicted_score, label))
+            case_arr.append(label)
+            score_arr.append(predicted_score)
+            clip = None
+            if predicted_score < CLIP_SCORE_THRESHOLD and (render_overlay or lazy_render):
+                clips.append((start, end))
+                clip = clip_path(start, end)
+            timeline.add_segment(start, end, predicted_score, label, clip)
+
+    def release(emit, until):
+        while hold and (hold[0][0] < until or len(hold) > FUSED_MAX_HOLD):
+            frame_idx, frame, keypoints, box = hold.popleft()
+            if frame_idx >= until:
+                forced[0] += 1
+            if frame_idx in results:
+                # 片段最后一帧开始显示该片段的评分
+                predicted_score, label = results[frame_idx]
+                shown['label'], shown['text'] = label, score_text(predicted_score)
+            in_clips = [c for c in clips if c[0] <= frame_idx <= c[1]]
+            emit((frame_idx, frame, keypoints, box, shown['label'], shown['text'], in_clips))
+
+    def score_stage(batch, emit):
+        chunk = np.stack([EMPTY_KEYPOINTS if k is None else k for _, k, _ in batch]).astype(np.float32)
+        if track is None:
+            new_track.append(chunk)
+        for frame_idx, keypoints, frame in batch:
+            box = None
+            if track_boxes is not None and frame_idx < len(track_boxes):
+                box = track_boxes[frame_idx]
+            elif tracker is not None:
+                box = tracker.boxes.get(frame_idx)
+            hold.append((frame_idx, frame, keypoints, box))
+        score(segmenter.extend(joint_angles(chunk, pose.triplets)))
+        release(emit, segmenter.settled_until)
+
+    def score_done(emit):
+        score(segmenter.finish())
+        release(emit, float('inf'))
+
+    # 绘制阶段：与 workouts 相同的画面，同时记录时间轴
+    line_width = 2
+    count = 0
+    stage = None
+
+    def render(item, emit):
+        nonlocal count, stage, x1, y1, x2, y2
+        frame_idx, original_frame, keypoints, box, label, text, in_clips = item
+        if box is not None:
+            x1, y1, x2, y2 = box
+        angles = pose.angles_from_keypoints(keypoints) if keypoints is not None else None
+        timeline.add_frame(frame_idx, keypoints, angles, box)
+        if progress is not None:
+            progress(frame_idx + 1, total_frames, len(segments))
+        if keypoints is not None:
+            angle = angles[0]
+            previous = stage
+            if angle < down_angle:
+                if stage == "up":
+                    count += 1
+                stage = "down"
+            elif angle > up_angle:
+                stage = "up"
+            if stage != previous:
+                timeline.add_stage(frame_idx, stage, count)
+        if not render_overlay:
+            return
+        draw_overlay(original_frame, keypoints, angles[0] if angles is not None else None, count, stage, point1,
+                     (x1, y1, x2, y2), label, text, line_width)
+        emit((frame_idx, original_frame, in_clips))
+
+    # 编码阶段：完整视频与低分片段在同一次遍历中写出
+    clip_writers = {}
+
+    def encode(item, emit):
+        frame_idx, frame, in_clips = item
+        video_writer.write(frame)
+        for start, end in in_clips:
+            if (start, end) not in clip_writers:
+                if frame_idx != start:
+                    # 片段开头已经提前输出，改为结束后从完整视频截取
+                    continue
+                clip_writers[(start, end)] = open_video_writer(clip_path(start, end), fps, (w, h))
+            clip_writers[(start, end)].write(frame)
+            if frame_idx == end:
+                clip_writers[(start, end)].release()
+
+    pipe = Pipeline('fused')
+    scaled = None
+    if track is None:
+        # 不绘制时不需要整帧：ROI 固定则由 ffmpeg 直接解码出推理分辨率的裁剪帧
+        if not render_overlay and tracker is None:
+            scaled = open_scaled_frames(video_path, meta['roi']['crop'], imgsz)
+        roi, infer, flush = pose_stages(pose, meta, tracker, batch_size, keep_frames=render_overlay, scaled=scaled)
+        pipe.add('roi', roi).add('pose', infer, flush=flush)
+        source = scaled if scaled is not None else decode_frames(cap)
+    else:
+        pipe.add('pose', from_track)
+        # 不绘制时缓存命中的任务只需遍历关键点轨迹
+        source = decode_frames(cap) if render_overlay else ((i, None) for i in range(len(track)))
+    pipe.add('score', score_stage, flush=score_done).add('render' if render_overlay else 'timeline', render)
+    if render_overlay:
+        pipe.add('encode', encode)
+    try:
+        pipe.run(source, source_name='decode' if render_overlay or track is None else 'track')
+    finally:
+        cap.release()
+        if scaled is not None:
+            scaled.close()
+        if video_writer is not None:
+            video_writer.release()
+        for writer in clip_writers.values():
+            writer.release()
+    pipe.report()
+    if forced[0]:
+        print(f"融合引擎: {forced[0]} 帧超过暂存上限，未等评分提前输出")
+
+    if track is None and new_track:
+        keypoints = np.concatenate(new_track)
+        if tracker is not None and tracker.boxes:
+            meta['roi']['boxes'] = interpolate_boxes(tracker.boxes, len(keypoints)).tolist()
+        keypoint_store.save(video_path, model_path, keypoints, meta, variant=variant)
+
+    timeline_file = timeline.save(timeline_path(name))
+    if render_overlay:
+        output_arr = [clip_path(start, end) for start, end in clips]
+        # 起始帧已提前输出的片段，从成品视频中一次性补截
+        extract_segments(out_path, [(start, end, clip_path(start, end)) for start, end in clips
+                                    if (start, end) not in clip_writers], fps, (w, h))
+        output_arr.append(out_path)
+    elif lazy_render:
+        output_arr = [clip_path(start, end) for start, end in clips] + [render_url(name + ".mp4")]
+    else:
+        # 前端直接播放原视频（相对项目根目录，如 ./public/uploads/videos/xxx.mp4）
+        output_arr = [project_path(video_path)]
+    adjusted_peaks = segmenter.adjusted_peaks
+    summary = {
+        'first_peak': int(adjusted_peaks[0]) if len(adjusted_peaks) > 0 else 0,
+        'last_peak': segmenter.last_peak_frame,
+        'segments': segments,
+        'timeline': timeline_file,
+    }
+    return output_arr, summary
+
+def run_fused_program(model_data, model2_data, device_data, label_encoder_data, model_path_data, video_path_data,
+                      point1, point2, imgsz=None, progress=None, output_name=None):
+    """融合引擎入口：前三项返回值与 run_display_program 相同，另外返回叠加时间轴路径"""
+    try:
+        global model, device, model2, label_encoder
+        reset_run_state()
+        model = model_data
+        device = device_data
+        model2 = model2_data
+        label_encoder = label_encoder_data
+        result = fused_workouts(model_path_data, video_path_data, point1, point2, imgsz=imgsz, progress=progress,
+                                output_name=output_name)
+        if result is None:
+            raise ValueError("无法读取视频或未检测到人体")
+        output_arr, summary = result
+        print(f"分段: {[(start, end) for start, end, _, _ in summary['segments']]}")
+        print(case_arr, score_arr)
+        return case_arr, score_arr, output_arr, summary['timeline']
+    finally:
+        plt.close("all")
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+# 关键点缓存目录与磁盘预算，可通过环境变量覆盖
+KEYPOINT_STORE_DIR = os.environ.get('KEYPOINT_STORE_DIR', './cache/keypoints')
+KEYPOINT_STORE_BUDGET_MB = float(os.environ.get('KEYPOINT_STORE_BUDGET_MB', 2048))
+
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    计算文件内容的 sha256。
+
+    结果按 (路径, 大小, 修改时间) 缓存在进程内，同一文件在一次请求中多次调用不会重复读盘。
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    cache_key = (path, st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if cache_key in _hash_cache:
+            return _hash_cache[cache_key]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hash_lock:
+        _hash_cache[cache_key] = value
+    return value
+
+
+def model_sha256(path):
+    """模型版本哈希：单个权重文件直接取内容哈希，导出目录（如 OpenVINO）合并目录内所有文件的哈希"""
+    if not os.path.isdir(path):
+        return file_sha256(path)
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        digest.update(name.encode())
+        digest.update(file_sha256(os.path.join(path, name)).encode())
+    return digest.hexdigest()
+
+
+class KeypointStore:
+    """
+    按 (视频内容哈希, 姿态模型哈希, 推理方式) 持久化整段视频的关键点轨迹。
+
+    每个条目是一个目录，包含:
+        keypoints.npy  (frames, 17, 3) float32，未检测到人体的帧为 NaN，可 mmap 读取
+        meta.json      ROI 与视频元数据（fps、宽高、帧数）
+
+    命中时直接跳过姿态推理；总占用超过磁盘预算时按最近访问时间淘汰。
+    """
+
+    def __init__(self, root=KEYPOINT_STORE_DIR, budget_mb=KEYPOINT_STORE_BUDGET_MB):
+        self.root = root
+        self.budget_bytes = int(budget_mb * 1024 ** 2)
+        self._lock = threading.Lock()
+
+    def key(self, video_path, model_path, variant='roi-mask'):
+        """条目键：视频哈希 + 模型哈希 + 推理方式（ROI/裁剪等会改变关键点的配置）"""
+        return f"{file_sha256(video_path)[:32]}_{model_sha256(model_path)[:16]}_{variant}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def load(self, video_path, model_path, variant='roi-mask'):
+        """
+        读取缓存的关键点轨迹。
+
+        Returns:
+            tuple: (keypoints, meta)，keypoints 为只读 memmap；未命中时返回 None。
+        """
+        entry_dir = self._entry_dir(self.key(video_path, model_path, variant))
+        kpt_path = os.path.join(entry_dir, 'keypoints.npy')
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not (os.path.exists(kpt_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            keypoints = np.load(kpt_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"关键点缓存损坏，忽略: {entry_dir} ({e})")
+            return None
+        # 更新访问时间，供 LRU 淘汰使用
+        os.utime(entry_dir, None)
+        return keypoints, meta
+
+    def save(self, video_path, model_path, keypoints, meta, variant='roi-mask'):
+        """写入关键点轨迹（先写临时目录再原子替换），并按磁盘预算淘汰旧条目"""
+        key = self.key(video_path, model_path, variant)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            np.save(os.path.join(tmp_dir, 'keypoints.npy'), np.asarray(keypoints, dtype=np.float32))
+            meta = dict(meta, key=key, variant=variant, frames=int(len(keypoints)), created=time.time())
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            with self._lock:
+                if os.path.exists(entry_dir):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+        return entry_dir
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path) or '.tmp-' in name:
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+        return entries
+
+    def disk_usage(self):
+        """返回当前缓存占用的字节数"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """超过磁盘预算时，按最近访问时间从旧到新删除条目"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.budget_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                print(f"关键点缓存超出预算，已淘汰: {path}")
+
+
+# 进程级默认实例
+keypoint_store = KeypointStore()
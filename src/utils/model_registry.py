@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+import numpy as np
+from ultralytics import YOLO
+
+
+def current_rss():
+    """返回当前进程常驻内存（字节）"""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        # 没有 psutil 时退化为读取 /proc（仅 Linux）
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def model_bytes(model, model_path):
+    """torch 模型按参数大小统计，导出模型按文件（目录）大小统计"""
+    if hasattr(model.model, 'parameters'):
+        return sum(p.numel() * p.element_size() for p in model.model.parameters())
+    if os.path.isdir(model_path):
+        return sum(os.path.getsize(os.path.join(model_path, f)) for f in os.listdir(model_path))
+    return os.path.getsize(model_path)
+
+
+def load_model(model_path):
+    """从磁盘加载模型；导出的 ONNX/OpenVINO 模型需要显式指定任务类型"""
+    return YOLO(model_path) if model_path.endswith('.pt') else YOLO(model_path, task='pose')
+
+
+class ModelRegistry:
+    """
+    进程级模型注册表：每个权重文件在一个进程中只加载一次，所有调用方共享同一个实例。
+
+    同一模型的推理通过 lock(model_path) 串行化，避免多个线程同时使用同一个 predictor。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_path):
+        return os.path.abspath(model_path)
+
+    def _entry(self, model_path, hit=False):
+        """查找（必要时加载）模型条目；hit=True 时在同一把锁内计入一次使用"""
+        key = self._key(model_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                rss_before = current_rss()
+                start_time = time.time()
+                model = load_model(key)
+                param_bytes = model_bytes(model, key)
+                entry = {
+                    'model': model,
+                    'lock': threading.Lock(),
+                    'load_seconds': time.time() - start_time,
+                    'param_bytes': param_bytes,
+                    'rss_delta': current_rss() - rss_before,
+                    'hits': 0,
+                }
+                self._entries[key] = entry
+            if hit:
+                entry['hits'] += 1
+            return entry
+
+    def get(self, model_path):
+        """获取共享的模型实例，首次调用时从磁盘加载"""
+        return self._entry(model_path, hit=True)['model']
+
+    def lock(self, model_path):
+        """获取该模型的推理锁"""
+        return self._entry(model_path)['lock']
+
+    def warmup(self, model_path, imgsz=640):
+        """加载模型并用空白帧推理一次，使其进入 warm 状态"""
+        entry = self._entry(model_path)
+        with entry['lock']:
+            entry['model'].predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+
+    def is_loaded(self, model_path):
+        return self._key(model_path) in self._entries
+
+    def stats(self):
+        """
+        返回每个已加载模型的状态。
+
+        warm 表示模型已经完成过推理（predictor 已初始化），cold 表示只加载了权重。
+        """
+        with self._lock:
+            return [
+                {
+                    'model_path': key,
+                    'state': 'warm' if entry['model'].predictor is not None else 'cold',
+                    'load_seconds': round(entry['load_seconds'], 3),
+                    'param_mb': round(entry['param_bytes'] / 1024 ** 2, 2),
+                    'rss_delta_mb': round(entry['rss_delta'] / 1024 ** 2, 2),
+                    'hits': entry['hits'],
+                }
+                for key, entry in self._entries.items()
+            ]
+
+
+# 进程级单例
+registry = ModelRegistry()
+
+
+def get_model(model_path):
+    """从进程级注册表获取模型"""
+    return registry.get(model_path)
@@ -0,0 +1,120 @@
+import json
+import os
+import uuid
+import numpy as np
+
+# 1 时把关键点/角度/评分画进视频并重新编码；0 时只输出叠加时间轴，由前端在原视频上绘制
+RENDER_OVERLAY = os.environ.get('RENDER_OVERLAY', '1') == '1'
+# 时间轴中关键点坐标与角度保留的小数位（角度与画面显示一致保留两位）
+KEYPOINT_DECIMALS = 1
+ANGLE_DECIMALS = 2
+TIMELINE_VERSION = 1
+
+
+def project_path(path):
+    """相对项目根目录（工作目录）的路径，如 ./public/uploads/videos/xxx.mp4"""
+    return "./" + os.path.relpath(os.path.abspath(path)).replace(os.sep, '/')
+
+
+def analysis_output_name(video_path, hand, analysis_key=None):
+    """
+    一次分析的输出名 <视频名>_<手臂>_<分析键前 10 位>，时间轴与按需渲染地址都以它命名，
+    同一视频换手臂或换模型/评分配置分析时互不覆盖。
+
+    Args:
+        analysis_key (str): result_cache.analysis_key 的结果；为 None（缺少模型或数据文件）时用随机值，
+            每次分析各自输出。
+    """
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    hand = 'left' if hand == 'left' else 'right'
+    return f"{video_name}_{hand}_{(analysis_key or uuid.uuid4().hex)[:10]}"
+
+
+def timeline_path(name, runs_dir='./runs'):
+    """时间轴与成品视频放在一起：runs/<输出名>.timeline.json"""
+    return os.path.join(runs_dir, f"{name}.timeline.json")
+
+
+class OverlayTimeline:
+    """
+    逐帧叠加时间轴：记录绘制所需的全部信息，前端据此在原始上传视频上绘制，无需服务端重新编码。
+
+    source 为原视频路径（相对项目根目录），按需渲染时据此解码。
+    按列存储以保持紧凑，数组下标即帧号:
+        lines      需要连线绘制的关键点链（手臂、躯干），元素为 COCO 关键点编号
+        keypoints  每帧 [x0, y0, x1, y1, ...]，顺序同 keypoint_indices，置信度不足的点为 null；未检测到人体为 null
+        angles     每帧 [group1, group2]，未检测到人体为 null
+        boxes      每帧 ROI 框 [x1, y1, x2, y2]；ROI 固定时为 null，使用 roi
+        stages     计数状态变化事件 [[帧号, 'up'/'down', 计数], ...]
+        segments   动作片段 [{start, end, score, label, clip}, ...]，score 从 end 帧开始显示
+    """
+
+    def __init__(self, meta, lines, conf_thres=0.25, moving_roi=False, source=None):
+        self.meta = meta
+        self.source = source
+        self.lines = [[int(i) for i in line] for line in lines]
+        self.keypoint_indices = list(dict.fromkeys(i for line in self.lines for i in line))
+        self.conf_thres = conf_thres
+        self.moving_roi = moving_roi
+        self.keypoints = []
+        self.angles = []
+        self.boxes = []
+        self.stages = []
+        self.segments = []
+
+    def _pad(self, frame_idx):
+        # 帧按顺序到达；缺失的帧号补空
+        while len(self.keypoints) < frame_idx:
+            self.keypoints.append(None)
+            self.angles.append(None)
+            self.boxes.append(None)
+
+    def add_frame(self, frame_idx, keypoints=None, angles=None, box=None):
+        self._pad(frame_idx)
+        points = None
+        if keypoints is not None:
+            points = []
+            for i in self.keypoint_indices:
+                x, y, conf = keypoints[i]
+                if conf < self.conf_thres:
+                    points += [None, None]
+                else:
+                    points += [round(float(x), KEYPOINT_DECIMALS), round(float(y), KEYPOINT_DECIMALS)]
+        self.keypoints.append(points)
+        self.angles.append(None if angles is None else
+                           [None if np.isnan(a) else round(float(a), ANGLE_DECIMALS) for a in angles])
+        self.boxes.append(None if box is None or not self.moving_roi else [int(v) for v in box])
+
+    def add_stage(self, frame_idx, stage, count):
+        self.stages.append([int(frame_idx), stage, int(count)])
+
+    def add_segment(self, start, end, score, label, clip=None):
+        self.segments.append({'start': int(start), 'end': int(end), 'score': float(score),
+                              'label': label, 'clip': clip})
+
+    def to_dict(self):
+        return {
+            'version': TIMELINE_VERSION,
+            'source': self.source,
+            'fps': self.meta['fps'],
+            'width': self.meta['width'],
+            'height': self.meta['height'],
+            'frames': len(self.keypoints),
+            'roi': [int(v) for v in self.meta['roi']['bbox']],
+            'lines': self.lines,
+            'keypoint_indices': self.keypoint_indices,
+            'keypoints': self.keypoints,
+            'angles': self.angles,
+            'boxes': self.boxes if self.moving_roi else None,
+            'stages': self.stages,
+            'segments': sorted(self.segments, key=lambda s: s['start']),
+        }
+
+    def save(self, path):
+        """写入 JSON（先写临时文件再原子替换）"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        return path
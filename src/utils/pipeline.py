@@ -0,0 +1,243 @@
+import os
+import queue
+import threading
+import time
+
+# 阶段之间有界队列的容量（条目数），限制在途帧数与内存占用
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 16))
+
+_END = object()
+
+# 当前进程内各任务最近一次运行的阶段统计，{任务名: Pipeline.summary()}
+pipeline_stats = {}
+
+
+class PipelineAborted(Exception):
+    """其他阶段出错，本阶段提前退出"""
+
+
+class Pipeline:
+    """
+    分阶段流式执行器：源迭代器和每个阶段各占一个线程，相邻阶段之间用有界队列连接。
+
+    下游处理不过来时上游会阻塞在 put 上（背压），在途条目数不超过 队列容量 × 阶段数。
+    解码、推理（torch/onnxruntime/OpenVINO）与编码在执行时都会释放 GIL，因此用线程即可并行。
+
+    每个阶段记录输入/输出条目数、处理耗时、等待上游/下游的耗时以及输入队列的占用，
+    stats() 中忙碌时间最长的阶段就是该任务的瓶颈。
+
+    用法:
+        pipe = Pipeline('analysis')
+        pipe.add('pose', lambda item, emit: emit(infer(item)))
+        pipe.add('angles', collect, flush=finish)
+        outputs = pipe.run(frames, source_name='decode')
+    """
+
+    def __init__(self, name, maxsize=PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.stages = []
+        self.source_name = 'source'
+        self.wall_seconds = 0.0
+        self._abort = threading.Event()
+        self._errors = []
+
+    def add(self, name, fn, flush=None):
+        """
+        添加一个阶段。
+
+        Args:
+            name (str): 阶段名称。
+            fn (callable): fn(item, emit)，处理一个输入条目，调用 emit(x) 向下游输出任意个条目。
+            flush (callable): flush(emit)，上游结束后调用一次，用于输出攒批或聚合的结果。
+        """
+        self.stages.append({'name': name, 'fn': fn, 'flush': flush})
+        return self
+
+    @staticmethod
+    def _new_stats(name):
+        return {'stage': name, 'items_in': 0, 'items_out': 0, 'busy': 0.0, 'wait_in': 0.0, 'wait_out': 0.0,
+                'queue_sum': 0, 'queue_samples': 0, 'queue_max': 0}
+
+    def _put(self, q, item, stats):
+        start_time = time.perf_counter()
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats['wait_out'] += time.perf_counter() - start_time
+
+    def _get(self, q, stats):
+        start_time = time.perf_counter()
+        # 取之前采样输入队列的占用
+        size = q.qsize()
+        stats['queue_sum'] += size
+        stats['queue_samples'] += 1
+        stats['queue_max'] = max(stats['queue_max'], size)
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted()
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        stats['wait_in'] += time.perf_counter() - start_time
+        return item
+
+    def _fail(self, name, e):
+        if not isinstance(e, PipelineAborted):
+            self._errors.append((name, e))
+        self._abort.set()
+
+    def _source_worker(self, source, out_q, stats):
+        try:
+            iterator = iter(source)
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    stats['busy'] += time.perf_counter() - start_time
+                    break
+                stats['busy'] += time.perf_counter() - start_time
+                stats['items_out'] += 1
+                self._put(out_q, item, stats)
+            self._put(out_q, _END, stats)
+        except BaseException as e:
+            self._fail(stats['stage'], e)
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+
+    def _stage_worker(self, stage, in_q, out_q, stats, outputs):
+        def emit(item):
+            stats['items_out'] += 1
+            if out_q is None:
+                outputs.append(item)
+            else:
+                # 等待下游的时间不计入本阶段的处理耗时
+                start_time = time.perf_counter()
+                self._put(out_q, item, stats)
+                stats['busy'] -= time.perf_counter() - start_time
+
+        try:
+            while True:
+                item = self._get(in_q, stats)
+                start_time = time.perf_counter()
+                if item is _END:
+                    if stage['flush'] is not None:
+                        stage['flush'](emit)
+                    stats['busy'] += time.perf_counter() - start_time
+                    break
+                stats['items_in'] += 1
+                stage['fn'](item, emit)
+                stats['busy'] += time.perf_counter() - start_time
+            if out_q is not None:
+                self._put(out_q, _END, stats)
+        except BaseException as e:
+            self._fail(stats['stage'], e)
+
+    def run(self, source, source_name='source'):
+        """
+        在独立线程中迭代 source，依次流经所有阶段，阻塞直到全部完成。
+
+        Returns:
+            list: 最后一个阶段输出的全部条目。任一阶段出错时中止所有阶段并重新抛出该异常。
+        """
+        self.source_name = source_name
+        self._abort.clear()
+        self._errors = []
+        self._stats = [self._new_stats(source_name)] + [self._new_stats(s['name']) for s in self.stages]
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in self.stages]
+        outputs = []
+        threads = [threading.Thread(target=self._source_worker, args=(source, queues[0], self._stats[0]),
+                                    name=f"{self.name}-{source_name}", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(
+                target=self._stage_worker, args=(stage, queues[i], out_q, self._stats[i + 1], outputs),
+                name=f"{self.name}-{stage['name']}", daemon=True))
+
+        start_time = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.wall_seconds = time.perf_counter() - start_time
+        pipeline_stats[self.name] = self.summary()
+
+        if self._errors:
+            name, error = self._errors[0]
+            print(f"流水线 {self.name} 的阶段 {name} 出错: {error}")
+            raise error
+        return outputs
+
+    def stats(self):
+        """
+        返回每个阶段的统计:
+            items_in/items_out  输入/输出条目数
+            busy_s              处理耗时（不含等待上下游）
+            throughput          每秒处理条目数（按处理耗时计算）
+            utilization         处理耗时占整个任务耗时的比例，接近 1 的阶段即瓶颈
+            wait_in_s/wait_out_s 等待上游（饥饿）/等待下游（背压）的耗时
+            queue_mean/queue_max 输入队列的平均/最大占用
+        """
+        result = []
+        for s in getattr(self, '_stats', []):
+            count = s['items_in'] or s['items_out']
+            result.append({
+                'stage': s['stage'],
+                'items_in': s['items_in'],
+                'items_out': s['items_out'],
+                'busy_s': round(s['busy'], 3),
+                'throughput': round(count / s['busy'], 2) if s['busy'] > 0 else None,
+                'utilization': round(s['busy'] / self.wall_seconds, 3) if self.wall_seconds > 0 else None,
+                'wait_in_s': round(s['wait_in'], 3),
+                'wait_out_s': round(s['wait_out'], 3),
+                'queue_mean': round(s['queue_sum'] / s['queue_samples'], 2) if s['queue_samples'] else 0,
+                'queue_max': s['queue_max'],
+            })
+        return result
+
+    def bottleneck(self):
+        """返回处理耗时最长的阶段名称"""
+        stats = self.stats()
+        return max(stats, key=lambda s: s['busy_s'])['stage'] if stats else None
+
+    def summary(self):
+        """任务级摘要：总耗时、瓶颈阶段与各阶段统计"""
+        return {'wall_s': round(self.wall_seconds, 3), 'queue_size': self.maxsize,
+                'bottleneck': self.bottleneck(), 'stages': self.stats()}
+
+    def report(self):
+        """打印各阶段统计表"""
+        print(f"流水线 {self.name}: 总耗时 {self.wall_seconds:.2f}s，瓶颈阶段 {self.bottleneck()}")
+        print(f"{'stage':<12}{'in':>8}{'out':>8}{'busy s':>9}{'items/s':>9}{'util':>7}"
+              f"{'wait in':>9}{'wait out':>9}{'q mean':>8}{'q max':>7}")
+        for s in self.stats():
+            throughput = f"{s['throughput']:.1f}" if s['throughput'] is not None else '-'
+            utilization = f"{s['utilization']:.2f}" if s['utilization'] is not None else '-'
+            print(f"{s['stage']:<12}{s['items_in']:>8}{s['items_out']:>8}{s['busy_s']:>9.2f}{throughput:>9}"
+                  f"{utilization:>7}{s['wait_in_s']:>9.2f}{s['wait_out_s']:>9.2f}{s['queue_mean']:>8.1f}"
+                  f"{s['queue_max']:>7}")
+
+
+def flat_stats():
+    """
+    把各任务的统计压平成一层字典（如 'analysis.pose.throughput'），
+    便于放进分析子进程最终输出的 JSON 中。
+    """
+    flat = {}
+    for job, summary in pipeline_stats.items():
+        flat[f"{job}.wall_s"] = summary['wall_s']
+        flat[f"{job}.bottleneck"] = summary['bottleneck']
+        for s in summary['stages']:
+            for key in ('throughput', 'utilization', 'queue_mean', 'queue_max'):
+                flat[f"{job}.{s['stage']}.{key}"] = s[key]
+    return flat
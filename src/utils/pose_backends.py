@@ -0,0 +1,145 @@
+import glob
+import os
+import shutil
+import cv2
+import numpy as np
+
+# 姿态推理后端：torch 为原始 .pt 权重，其余为导出后的 CPU 推理模型
+POSE_BACKENDS = ['torch', 'onnx', 'onnx-int8', 'openvino', 'openvino-int8']
+DEFAULT_POSE_BACKEND = os.environ.get('POSE_BACKEND', 'torch')
+# 导出模型的存放目录，以及 INT8 校准帧的来源
+POSE_EXPORT_DIR = os.environ.get('POSE_EXPORT_DIR', './public/exported')
+CALIBRATION_VIDEO_DIR = './public/uploads/videos'
+CALIBRATION_FRAMES = int(os.environ.get('POSE_CALIBRATION_FRAMES', 200))
+
+
+def sample_frames(video_dir=CALIBRATION_VIDEO_DIR, count=CALIBRATION_FRAMES, step=15):
+    """从目录下的视频中每隔 step 帧取一帧，最多 count 帧（用于 INT8 校准和精度评估）"""
+    frames = []
+    for video_path in sorted(glob.glob(os.path.join(video_dir, '*.mp4'))):
+        cap = cv2.VideoCapture(video_path)
+        idx = 0
+        while len(frames) < count:
+            if not cap.grab():
+                break
+            if idx % step == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.append(frame)
+            idx += 1
+        cap.release()
+        if len(frames) >= count:
+            break
+    if not frames:
+        raise ValueError(f"未能从 {video_dir} 读取校准帧")
+    return frames
+
+
+def _export_name(model_path, backend, imgsz):
+    base = os.path.splitext(os.path.basename(model_path))[0]
+    fmt, _, quant = backend.partition('-')
+    # _dyn: 动态批大小导出；早先导出的静态 batch=1 模型不再复用
+    suffix = f"{base}_{imgsz}_dyn" + (f"_{quant}" if quant else '')
+    if fmt == 'onnx':
+        return os.path.join(POSE_EXPORT_DIR, f"{suffix}.onnx")
+    return os.path.join(POSE_EXPORT_DIR, f"{suffix}_openvino_model")
+
+
+def _letterbox_batch(frames, imgsz):
+    """按 ultralytics 的预处理方式（letterbox、BGR->RGB、归一化、NCHW）生成模型输入"""
+    from ultralytics.data.augment import LetterBox
+    letterbox = LetterBox(new_shape=(imgsz, imgsz), auto=False)
+    for frame in frames:
+        im = letterbox(image=frame)
+        im = im[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        yield np.ascontiguousarray(im)
+
+
+def _quantize_onnx(fp32_path, int8_path, imgsz, frames):
+    """用上传视频中的帧对 ONNX 模型做静态 INT8 量化，并保留 ultralytics 元数据"""
+    try:
+        import onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError as e:
+        raise ImportError("onnx-int8 后端需要安装 onnx 和 onnxruntime") from e
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.inputs = ({'images': im} for im in _letterbox_batch(frames, imgsz))
+
+        def get_next(self):
+            return next(self.inputs, None)
+
+    quantize_static(
+        fp32_path, int8_path, FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+    )
+    # ultralytics 依赖模型元数据中的 task/kpt_shape 等信息
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+
+
+def _calibration_yaml(frames, work_dir):
+    """把校准帧写成 ultralytics 可读取的仅图像数据集，供 OpenVINO INT8 导出使用"""
+    image_dir = os.path.join(work_dir, 'images', 'val')
+    os.makedirs(image_dir, exist_ok=True)
+    for i, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(image_dir, f'{i:05d}.jpg'), frame)
+    yaml_path = os.path.join(work_dir, 'calib.yaml')
+    with open(yaml_path, 'w') as f:
+        f.write(f"path: {os.path.abspath(work_dir)}\ntrain: images/val\nval: images/val\n"
+                "kpt_shape: [17, 3]\nnames:\n  0: person\n")
+    return yaml_path
+
+
+def export_pose_model(model_path, backend, imgsz, video_dir=CALIBRATION_VIDEO_DIR):
+    """
+    将 .pt 姿态模型导出为指定后端，导出结果按 (权重, 输入尺寸, 是否量化) 缓存在 POSE_EXPORT_DIR。
+    以动态输入导出：离线分析按 POSE_BATCH_SIZE 帧一批推理（PoseEstimator.infer_batch），
+    静态 batch=1 的 ONNX/OpenVINO 模型无法接收整批输入。
+
+    Returns:
+        str: 导出模型路径（.onnx 文件或 *_openvino_model 目录）。
+    """
+    target = _export_name(model_path, backend, imgsz)
+    if os.path.exists(target):
+        return target
+    os.makedirs(POSE_EXPORT_DIR, exist_ok=True)
+
+    from ultralytics import YOLO
+    fmt, _, quant = backend.partition('-')
+    int8 = quant == 'int8'
+    print(f"导出姿态模型: {model_path} -> {target}")
+    if fmt == 'onnx':
+        fp32_target = _export_name(model_path, 'onnx', imgsz)
+        if not os.path.exists(fp32_target):
+            exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+            shutil.move(exported, fp32_target)
+        if int8:
+            _quantize_onnx(fp32_target, target, imgsz, sample_frames(video_dir))
+    else:
+        work_dir = os.path.join(POSE_EXPORT_DIR, 'calibration')
+        kwargs = {'format': 'openvino', 'imgsz': imgsz, 'dynamic': True}
+        if int8:
+            kwargs.update(int8=True, data=_calibration_yaml(sample_frames(video_dir), work_dir))
+        try:
+            exported = YOLO(model_path).export(**kwargs)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.move(exported, target)
+    return target
+
+
+def resolve_backend_model(model_path, backend=None, imgsz=640):
+    """返回指定后端实际要加载的模型路径，torch 后端直接使用 .pt 权重"""
+    backend = (backend or DEFAULT_POSE_BACKEND).lower()
+    if backend not in POSE_BACKENDS:
+        raise ValueError(f"无效的姿态推理后端: {backend}，可选 {POSE_BACKENDS}")
+    if backend == 'torch':
+        return model_path
+    return export_pose_model(model_path, backend, imgsz)
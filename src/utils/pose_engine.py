@@ -0,0 +1,340 @@
+import numpy as np
+from model_registry import registry
+
+# COCO 姿态关键点数量
+NUM_KEYPOINTS = 17
+# 未检测到人体的帧在关键点轨迹中记为 NaN
+EMPTY_KEYPOINTS = np.full((NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+# 关键点置信度阈值，与 ultralytics 判定关键点可见的阈值一致（低于该值的点坐标会被置 0）
+KEYPOINT_CONF = 0.5
+
+
+def estimate_pose_angle(a, b, c):
+    """
+    计算以 b 为顶点、由 a-b-c 三个关键点构成的夹角（度）。
+    与 ultralytics Annotator.estimate_pose_angle 的计算方式保持一致。
+    """
+    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
+    angle = abs(radians * 180.0 / np.pi)
+    if angle > 180.0:
+        angle = 360 - angle
+    return float(angle)
+
+
+def joint_angles(keypoints, triplets, conf_thres=KEYPOINT_CONF):
+    """
+    一次计算整段关键点轨迹上所有三元组的关节角度（度），计算方式与 estimate_pose_angle 相同。
+
+    Args:
+        keypoints (ndarray): (T, 17, 3) 关键点 [x, y, conf]，未检测到人体的帧为 NaN。
+        triplets (list): K 个关键点三元组 [a, b, c]，以 b 为顶点。
+        conf_thres (float): 三个关键点中任意一个置信度低于该值（或坐标被置 0）时，该角度记为 NaN。
+
+    Returns:
+        ndarray: (T, K) float64 角度。
+    """
+    points = np.asarray(keypoints, dtype=np.float64)[:, np.asarray(triplets, dtype=int)]  # (T, K, 3, 3)
+    a, b, c = points[:, :, 0], points[:, :, 1], points[:, :, 2]
+    radians = (np.arctan2(c[..., 1] - b[..., 1], c[..., 0] - b[..., 0])
+               - np.arctan2(a[..., 1] - b[..., 1], a[..., 0] - b[..., 0]))
+    angles = np.abs(radians * 180.0 / np.pi)
+    angles = np.where(angles > 180.0, 360 - angles, angles)
+    # NaN 帧的置信度比较结果为 False，同样被屏蔽
+    visible = (points[..., 2] >= conf_thres) & ((points[..., 0] != 0) | (points[..., 1] != 0))
+    angles[~visible.all(axis=2)] = np.nan
+    return angles
+
+
+def fill_missing_angles(angles):
+    """
+    按列对 (T, K) 角度中的 NaN 做时间上的线性插值，首尾用最近的有效值填充；
+    整列都无效时填 0，交由 clean_angles 按原逻辑告警跳过。
+    """
+    angles = np.array(angles, dtype=np.float64)
+    frames = np.arange(len(angles))
+    for j in range(angles.shape[1]):
+        valid = ~np.isnan(angles[:, j])
+        if not valid.any():
+            angles[:, j] = 0
+        elif not valid.all():
+            angles[:, j] = np.interp(frames, frames[valid], angles[valid, j])
+    return angles
+
+
+def select_person(results):
+    """
+    从单帧推理结果中选出面积最大的人体，返回其 (17, 3) 关键点数组，未检测到时返回 None。
+    """
+    if results.boxes is None or results.keypoints is None or len(results.boxes) == 0:
+        return None
+    boxes = results.boxes.xyxy.cpu().numpy()
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return results.keypoints.data[int(np.argmax(areas))].cpu().numpy()
+
+
+def box_iou(a, b):
+    """两个 (x1, y1, x2, y2) 框的交并比"""
+    iw = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def keypoint_box(keypoints, pad=0.15, min_points=4):
+    """
+    由可见关键点的外接框估计人体框，四周按框尺寸的 pad 比例外扩（关键点不含头顶、脚尖等边缘）。
+    可见关键点少于 min_points 时返回 None。
+    """
+    if keypoints is None:
+        return None
+    visible = ((keypoints[:, 0] != 0) | (keypoints[:, 1] != 0)) & ~np.isnan(keypoints[:, 0])
+    if visible.sum() < min_points:
+        return None
+    x1, y1 = keypoints[visible, :2].min(axis=0)
+    x2, y2 = keypoints[visible, :2].max(axis=0)
+    px, py = (x2 - x1) * pad, (y2 - y1) * pad
+    return np.array([x1 - px, y1 - py, x2 + px, y2 + py], dtype=np.float64)
+
+
+def crop_box(bbox, width, height, margin):
+    """
+    在 ROI 框 (x1, y1, x2, y2) 四周扩展 margin 像素并裁剪到画面范围内，返回可直接用于切片的 (x1, y1, x2, y2)。
+    """
+    x1, y1, x2, y2 = (int(v) for v in bbox)
+    return (max(0, x1 - margin), max(0, y1 - margin),
+            min(width, x2 + margin + 1), min(height, y2 + margin + 1))
+
+
+def offset_keypoints(keypoints, offset):
+    """
+    将裁剪图上的关键点平移回原图坐标。
+    offset 为 (x, y)，或 (x, y, sx, sy) 表示裁剪图又被缩放了 sx/sy 倍（推理分辨率解码），先除以缩放再平移。
+    ultralytics 会把不可见关键点的坐标置 0，这些点保持为 0，与整帧推理的结果一致。
+    """
+    if keypoints is None or offset is None:
+        return keypoints
+    keypoints = keypoints.copy()
+    visible = (keypoints[:, 0] != 0) | (keypoints[:, 1] != 0)
+    if len(offset) == 4:
+        keypoints[visible, 0] /= offset[2]
+        keypoints[visible, 1] /= offset[3]
+    keypoints[visible, 0] += offset[0]
+    keypoints[visible, 1] += offset[1]
+    return keypoints
+
+
+class RoiTracker:
+    """
+    跟随运动员移动的 ROI：每隔 detect_every 帧在整帧上重新检测一次人体，
+    中间帧用上一帧关键点的外接框加匀速运动预测来传播 ROI，使裁剪区域始终贴着人体。
+
+    重新检测时选与当前 ROI 交并比最大的人体，避免跳到画面中其他更大的人身上；
+    连续 max_missed 帧在裁剪区域内没有检测到人体时，下一帧提前重新检测。
+    """
+
+    def __init__(self, bbox, width, height, margin, detect_every=30, max_missed=2, smooth=0.7):
+        """
+        Args:
+            bbox (tuple): 初始人体框 (x1, y1, x2, y2)。
+            width, height (int): 画面尺寸。
+            margin (int): 裁剪区域在人体框四周外扩的像素数。
+            detect_every (int): 整帧重新检测的间隔帧数。
+            max_missed (int): 连续丢失多少帧后提前重新检测。
+            smooth (float): 新观测框的权重，其余沿用预测框，抑制关键点抖动带来的框抖动。
+        """
+        self.box = np.asarray(bbox, dtype=np.float64)
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.detect_every = max(1, int(detect_every))
+        self.max_missed = max_missed
+        self.smooth = smooth
+        self.velocity = np.zeros(2)
+        self.last_idx = 0
+        self.last_detect = 0
+        self.missed = 0
+        # 每个处理过的帧实际使用的人体框，供渲染和统计裁剪面积
+        self.boxes = {}
+
+    def predict(self, frame_idx, min_size=16):
+        """按匀速运动外推 frame_idx 帧的人体框，并限制在画面内（至少保留 min_size 像素，避免裁剪为空）"""
+        shift = self.velocity * max(0, frame_idx - self.last_idx)
+        x1, y1, x2, y2 = self.box + np.concatenate([shift, shift])
+        x1 = min(max(x1, 0), self.width - min_size)
+        y1 = min(max(y1, 0), self.height - min_size)
+        x2 = min(max(x2, x1 + min_size), self.width)
+        y2 = min(max(y2, y1 + min_size), self.height)
+        return np.array([x1, y1, x2, y2])
+
+    def crop(self, frame_idx):
+        """frame_idx 帧用于推理的裁剪区域（可直接切片）"""
+        box = self.predict(frame_idx)
+        self.boxes[frame_idx] = tuple(int(round(v)) for v in box)
+        return crop_box(self.boxes[frame_idx], self.width, self.height, self.margin)
+
+    def needs_detection(self, frame_idx):
+        return frame_idx - self.last_detect >= self.detect_every or self.missed >= self.max_missed
+
+    def plan(self, frame_idx):
+        """
+        决定 frame_idx 帧的处理方式：需要整帧检测时记下检测帧并返回 None，否则返回裁剪区域。
+        供裁剪先于推理执行的流水线使用，避免检测结果返回前重复安排检测。
+        """
+        if self.needs_detection(frame_idx):
+            self.last_detect = frame_idx
+            self.missed = 0
+            return None
+        return self.crop(frame_idx)
+
+    def _move_to(self, frame_idx, box, weight):
+        predicted = self.predict(frame_idx)
+        box = weight * box + (1 - weight) * predicted
+        old_center = (self.box[:2] + self.box[2:]) / 2
+        new_center = (box[:2] + box[2:]) / 2
+        dt = max(1, frame_idx - self.last_idx)
+        self.velocity = 0.5 * self.velocity + 0.5 * (new_center - old_center) / dt
+        self.box = box
+        self.last_idx = frame_idx
+        self.boxes[frame_idx] = tuple(int(round(v)) for v in box)
+
+    def observe(self, frame_idx, keypoints):
+        """用裁剪区域内的推理结果更新人体框"""
+        box = keypoint_box(keypoints)
+        if box is None:
+            self.missed += 1
+            return
+        self.missed = 0
+        self._move_to(frame_idx, box, self.smooth)
+
+    def detect(self, frame_idx, boxes):
+        """
+        用整帧检测结果重新定位。
+
+        Returns:
+            int: 选中的人体序号，未检测到人体时返回 None（保持当前预测）。
+        """
+        self.last_detect = frame_idx
+        if len(boxes) == 0:
+            self.missed += 1
+            return None
+        predicted = self.predict(frame_idx)
+        ious = [box_iou(predicted, b) for b in boxes]
+        if max(ious) > 0:
+            chosen = int(np.argmax(ious))
+        else:
+            # 跟丢后退回到面积最大的人体
+            areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            chosen = int(np.argmax(areas))
+            self.velocity = np.zeros(2)
+        self.missed = 0
+        self._move_to(frame_idx, np.asarray(boxes[chosen], dtype=np.float64), 1.0)
+        return chosen
+
+    def track(self, pose, frame_idx, frame):
+        """逐帧处理：到期时整帧检测，否则只在预测的裁剪区域上推理。返回原图坐标的关键点或 None"""
+        if self.needs_detection(frame_idx):
+            boxes, keypoints = pose.detect(frame)
+            chosen = self.detect(frame_idx, boxes)
+            return None if chosen is None else keypoints[chosen]
+        cx1, cy1, cx2, cy2 = self.crop(frame_idx)
+        keypoints = pose.infer(np.ascontiguousarray(frame[cy1:cy2, cx1:cx2]), offset=(cx1, cy1))
+        self.observe(frame_idx, keypoints)
+        return keypoints
+
+
+def interpolate_boxes(boxes, total_frames):
+    """把 {帧号: 人体框} 线性插值为 (frames, 4) 的逐帧人体框"""
+    idx = np.array(sorted(boxes))
+    values = np.array([boxes[i] for i in idx], dtype=np.float64)
+    frames = np.arange(total_frames)
+    return np.stack([np.interp(frames, idx, values[:, j]) for j in range(4)], axis=1).round().astype(int)
+
+
+class PoseEstimator:
+    """
+    每帧只运行一次姿态模型，并从同一组关键点计算所有需要的关节角度。
+
+    替代对同一帧分别调用多个 solutions.AIGym.monitor 的做法：
+    AIGym 每组角度都要单独推理一次，而这里一次推理即可得到全部角度。
+    模型来自进程级注册表，多个实例共享同一份权重；推理不依赖跟踪器状态，
+    每帧取面积最大的人体作为分析对象。
+    """
+
+    def __init__(self, model_path, triplets, imgsz=None, verbose=False):
+        """
+        Args:
+            model_path (str): 姿态模型权重路径。
+            triplets (list): 关键点三元组列表，例如 [[6, 8, 10], [8, 6, 12]]。
+            imgsz (int): 推理输入尺寸，None 时使用模型默认值。
+            verbose (bool): 是否输出推理日志。
+        """
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.predict_args = {'imgsz': imgsz} if imgsz else {}
+        self.model = registry.get(model_path)
+        self.lock = registry.lock(model_path)
+        self.triplets = [[int(i) for i in t] for t in triplets]
+        self.verbose = verbose
+        # 与 AIGym 保持一致：未检测到人体时沿用上一帧的角度，初始为 0
+        self.angles = [0] * len(self.triplets)
+        self.keypoints = None
+
+    def infer(self, frame, offset=None):
+        """
+        对单帧运行一次姿态推理，返回 (17, 3) 的关键点数组 [x, y, conf]，未检测到人体时返回 None。
+        frame 为裁剪图时，offset 给出裁剪区域左上角，关键点会映射回原图坐标。
+        """
+        with self.lock:
+            results = self.model.predict(frame, verbose=self.verbose, **self.predict_args)[0]
+        return offset_keypoints(select_person(results), offset)
+
+    def infer_batch(self, frames, offsets=None):
+        """
+        对一批帧运行一次姿态推理，返回与 frames 等长的关键点列表（未检测到人体的帧为 None）。
+        离线分析时按批送入模型，摊薄逐帧调用的 Python 与预处理开销。
+        """
+        if not frames:
+            return []
+        offsets = offsets or [None] * len(frames)
+        with self.lock:
+            results = self.model.predict(list(frames), verbose=self.verbose, **self.predict_args)
+        return [offset_keypoints(select_person(r), o) for r, o in zip(results, offsets)]
+
+    def detect(self, frame):
+        """
+        整帧推理，返回所有人体的 (N, 4) 检测框与 (N, 17, 3) 关键点，供 RoiTracker 重新定位。
+        """
+        with self.lock:
+            results = self.model.predict(frame, verbose=self.verbose, **self.predict_args)[0]
+        if results.boxes is None or results.keypoints is None or len(results.boxes) == 0:
+            return np.zeros((0, 4)), np.zeros((0, NUM_KEYPOINTS, 3), dtype=np.float32)
+        return results.boxes.xyxy.cpu().numpy(), results.keypoints.data.cpu().numpy()
+
+    def angles_from_keypoints(self, keypoints):
+        """根据关键点数组计算每组三元组的角度"""
+        return [estimate_pose_angle(*(keypoints[i] for i in t)) for t in self.triplets]
+
+    def monitor(self, frame):
+        """
+        处理单帧：推理一次并更新所有角度。
+
+        Returns:
+            list: 与 triplets 顺序一致的角度列表。
+        """
+        return self.update(self.infer(frame))
+
+    def update(self, keypoints):
+        """
+        用一帧关键点（推理结果或缓存轨迹中的一行）更新角度。
+        keypoints 为 None 或全为 NaN 时表示该帧未检测到人体，沿用上一帧角度。
+        """
+        if keypoints is not None and not np.isnan(keypoints).all():
+            self.keypoints = keypoints
+            self.angles = self.angles_from_keypoints(keypoints)
+        return list(self.angles)
+
+    def reset(self):
+        """清空上一段视频/会话遗留的角度状态"""
+        self.angles = [0] * len(self.triplets)
+        self.keypoints = None
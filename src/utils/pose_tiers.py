@@ -0,0 +1,104 @@
+import gc
+import os
+import time
+import numpy as np
+from model_registry import load_model
+from pose_backends import resolve_backend_model, DEFAULT_POSE_BACKEND
+
+# 可选的姿态模型档位，从小到大
+POSE_TIERS = ['n', 's', 'm', 'l', 'x']
+POSE_MODEL_DIR = './public'
+# 未指定时的默认档位与输入尺寸，POSE_TIER=auto 时使用启动校准的结果
+DEFAULT_POSE_TIER = os.environ.get('POSE_TIER', 'x')
+DEFAULT_POSE_IMGSZ = int(os.environ.get('POSE_IMGSZ', 640))
+# 自动选择时需要达到的目标帧率
+POSE_TARGET_FPS = float(os.environ.get('POSE_TARGET_FPS', 10))
+
+# 启动校准结果：{'tier': ..., 'imgsz': ..., 'fps': {tier: fps}}
+_calibration = None
+
+
+def tier_model_path(tier):
+    """返回档位对应的权重路径，例如 x -> ./public/yolo11x-pose.pt"""
+    if tier not in POSE_TIERS:
+        raise ValueError(f"无效的姿态模型档位: {tier}，可选 {POSE_TIERS} 或 auto")
+    return os.path.join(POSE_MODEL_DIR, f'yolo11{tier}-pose.pt')
+
+
+def available_tiers():
+    """本地已有权重文件的档位；缺少的档位不参与校准，避免 ultralytics 在启动时联网下载"""
+    return [tier for tier in POSE_TIERS if os.path.exists(tier_model_path(tier))]
+
+
+def measure_fps(tier, imgsz=DEFAULT_POSE_IMGSZ, frames=10, frame_shape=(720, 400, 3), backend=None):
+    """
+    用固定尺寸的随机帧测量某档位在当前机器上的推理帧率（预热一次后计时）。
+    测速用的模型不放入进程级注册表，测完即释放，未选中的档位不会常驻内存。
+    """
+    model_path = resolve_backend_model(tier_model_path(tier), backend, imgsz)
+    model = load_model(os.path.abspath(model_path))
+    frame = np.random.randint(0, 255, frame_shape, dtype=np.uint8)
+    try:
+        model.predict(frame, imgsz=imgsz, verbose=False)
+        start_time = time.time()
+        for _ in range(frames):
+            model.predict(frame, imgsz=imgsz, verbose=False)
+        return frames / (time.time() - start_time)
+    finally:
+        del model
+        gc.collect()
+
+
+def calibrate(target_fps=POSE_TARGET_FPS, imgsz=DEFAULT_POSE_IMGSZ, frames=10, backend=None):
+    """
+    从本地已有权重的最大档位开始逐级测速，选出能达到 target_fps 的最大档位；都达不到时使用其中最小的档位。
+    结果保存在进程内，供 tier='auto' 的分析任务和实时会话使用；选中的档位在首次分析时才载入注册表。
+    """
+    global _calibration
+    measured = {}
+    tiers = available_tiers()
+    if not tiers:
+        print(f"{POSE_MODEL_DIR} 下没有姿态模型权重，跳过校准")
+    chosen = tiers[0] if tiers else POSE_TIERS[-1]
+    for tier in reversed(tiers):
+        try:
+            measured[tier] = round(measure_fps(tier, imgsz, frames, backend=backend), 2)
+        except Exception as e:
+            print(f"姿态模型档位 {tier} 校准失败: {e}")
+            continue
+        print(f"姿态模型档位 {tier} (imgsz={imgsz}): {measured[tier]} fps")
+        if measured[tier] >= target_fps:
+            chosen = tier
+            break
+    _calibration = {'tier': chosen, 'imgsz': imgsz, 'target_fps': target_fps, 'fps': measured}
+    print(f"自动选择姿态模型档位: {chosen}")
+    return _calibration
+
+
+def calibration_result():
+    return _calibration
+
+
+def resolve_pose_config(tier=None, imgsz=None, backend=None):
+    """
+    将请求中的档位/输入尺寸/推理后端解析为具体配置。
+
+    Args:
+        tier (str): n/s/m/l/x 或 auto，None 时使用 POSE_TIER。
+        imgsz (int): 推理输入尺寸，None 时使用 POSE_IMGSZ（auto 时使用校准时的尺寸）。
+        backend (str): torch/onnx/onnx-int8/openvino/openvino-int8，None 时使用 POSE_BACKEND。
+            非 torch 后端首次使用时会导出模型并缓存。
+
+    Returns:
+        dict: {'tier', 'imgsz', 'backend', 'model_path'}
+    """
+    tier = (tier or DEFAULT_POSE_TIER).lower()
+    if tier == 'auto':
+        if _calibration is None:
+            calibrate()
+        tier = _calibration['tier']
+        imgsz = imgsz or _calibration['imgsz']
+    imgsz = int(imgsz or DEFAULT_POSE_IMGSZ)
+    backend = (backend or DEFAULT_POSE_BACKEND).lower()
+    model_path = resolve_backend_model(tier_model_path(tier), backend, imgsz)
+    return {'tier': tier, 'imgsz': imgsz, 'backend': backend, 'model_path': model_path}
@@ -1,11 +1,11 @@
+import bisect
 import os
 import cv2
 from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
-from ultralytics import solutions, YOLO
 import datetime
-from scipy.signal import find_peaks
+from scipy.signal import find_peaks, peak_prominences
 import time
 import threading
 import queue
@@ -14,9 +14,48 @@ import asyncio
 import websockets
 import json
 import warnings
+from pose_engine import (PoseEstimator, RoiTracker, EMPTY_KEYPOINTS, NUM_KEYPOINTS, crop_box, interpolate_boxes,
+                         joint_angles, fill_missing_angles)
+from keypoint_store import keypoint_store
+from model_registry import registry
+from pipeline import Pipeline
+from video_writer import open_video_writer
+from video_index import load_index, read_frame, seek
+from video_reader import open_scaled_frames, resolve_decoder
 
 warnings.filterwarnings('ignore')
 model_path_data = './public/yolo11x-pose.pt'
+# 离线分析时每批送入姿态模型的帧数，1 表示逐帧推理
+POSE_BATCH_SIZE = int(os.environ.get('POSE_BATCH_SIZE', 8))
+# 姿态推理只在 ROI 框外扩该像素数的裁剪区域上进行
+ROI_MARGIN = int(os.environ.get('ROI_MARGIN', 32))
+# 稀疏推理的粗扫步长，0 表示逐帧推理整段视频
+POSE_SPARSE_STRIDE = int(os.environ.get('POSE_SPARSE_STRIDE', 0))
+# 跟随人体移动的 ROI：每隔该帧数整帧重新检测一次，0 表示沿用第60帧选出的固定 ROI
+ROI_TRACK_INTERVAL = int(os.environ.get('ROI_TRACK_INTERVAL', 0))
+# 分段时 find_peaks 的峰间最小距离与最小突出度
+PEAK_DISTANCE = 20
+PEAK_PROMINENCE = 10
+# 中间数据（角度、重采样角度、标准角度、对齐结果、ROI）的导出目录，每个任务一个子目录；空表示不导出，只在内存中传递
+ANALYSIS_ARTIFACT_DIR = os.environ.get('ANALYSIS_ARTIFACT_DIR', '')
+
+def keypoint_variant(imgsz=None, scaled=True):
+    """
+    关键点缓存中区分推理方式：裁剪方式、边距、输入尺寸和解码方式不同，得到的关键点也不同。
+
+    Args:
+        scaled (bool): 调用方在 ROI 固定时是否使用推理分辨率解码（open_scaled_frames）；
+            为 False 或开启 ROI 跟踪时总是整帧解码 + 裁剪（opencv）。
+    """
+    roi = f"roi-track{ROI_TRACK_INTERVAL}" if ROI_TRACK_INTERVAL > 0 else "roi"
+    decoder = resolve_decoder() if scaled and ROI_TRACK_INTERVAL <= 0 else 'opencv'
+    return f"{roi}-crop{ROI_MARGIN}-{imgsz or 'default'}-{decoder}"
+
+def roi_tracker(meta, margin=ROI_MARGIN, interval=ROI_TRACK_INTERVAL):
+    """按视频元数据创建移动 ROI 跟踪器，未开启跟踪时返回 None"""
+    if interval <= 0:
+        return None
+    return RoiTracker(meta['roi']['bbox'], meta['width'], meta['height'], margin, detect_every=interval)
 
 def plot_angles_with_peaks(angles, peaks):
     """
@@ -38,8 +77,9 @@ def plot_angles_with_peaks(angles, peaks):
 
 def select_roi_auto(frame, model_path):
     """自动选择最大人体检测框作为ROI区域"""
-    model = YOLO(model_path)
-    results = model.predict(frame, verbose=False)
+    model = registry.get(model_path)
+    with registry.lock(model_path):
+        results = model.predict(frame, verbose=False)
     
     # 提取人体检测框（类别0为人）
     boxes = results[0].boxes.xyxy.cpu().numpy()
@@ -69,94 +109,365 @@ def create_mask(frame, points):
     cv2.fillPoly(mask, [points_array], 255)
     return mask
 
-def process_video(video_path, point1, point2, output_csv, output_p, alingn_csv, std_csv, std, model_path_data):
+def open_video_roi(video_path, model_path, margin=ROI_MARGIN):
     """
-    处理单个视频，提取角度并根据极大值分割视频，同时记录角度数据。
+    打开视频并用第60帧自动选择ROI。
+
+    Returns:
+        tuple: (cap, meta)，cap 已回到第0帧；meta 包含 ROI、推理裁剪区域与视频元数据。
+        无法读取视频或未检测到人体时返回 None。
     """
     cap = cv2.VideoCapture(video_path)
     assert cap.isOpened(), "Error reading video file"
-    
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 59)
-    # 读取第60帧用于选择ROI
-    ret, first_frame = cap.read()
-    if not ret:
+    index = load_index(video_path)
+
+    # 读取第60帧用于选择ROI（不足60帧的视频取最后一帧），借助关键帧索引准确定位
+    first_frame = read_frame(cap, index, min(59, index.frames - 1))
+    if first_frame is None:
         print("无法读取视频第60帧")
-        return
+        cap.release()
+        return None
     cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
     
     try:
         # 使用自动选择ROI替换手动选择
-        roi_info = select_roi_auto(first_frame, model_path_data)
+        roi_info = select_roi_auto(first_frame, model_path)
         roi_points = roi_info["points"].tolist()  # 转换为列表格式
-        x1, y1, x2, y2 = roi_info["bbox"]
+        bbox = [int(v) for v in roi_info["bbox"]]
     except Exception as e:
         print(str(e))
-        return
-    
-    # 创建掩码
-    mask = create_mask(first_frame, roi_points)
+        cap.release()
+        return None
     
     w, h, fps = (int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS))
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
     
-    # 保存ROI信息到文件
-    roi_info = {
-        'points': roi_points,
+    # 裁剪到 ROI 框外扩 margin 的区域，代替整帧复制和掩码
+    meta = {
         'width': w,
-        'height': h
+        'height': h,
+        'fps': fps,
+        'frames': index.frames,
+        'rotation': index.rotation,
+        'roi': {'points': roi_points, 'bbox': bbox, 'crop': list(crop_box(bbox, w, h, margin))}
     }
-    with open('roi_info.json', 'w') as f:
-        json.dump(roi_info, f)
-    
-    gym1 = solutions.AIGym(
-        model=model_path_data,
-        show=False,
-        line_width=1,
-        up_angle=120.0,
-        down_angle=80.0,
-        kpts=point1,
-        verbose=False
-    )
-    gym2 = solutions.AIGym(
-        model=model_path_data,
-        show=False,
-        line_width=1,
-        up_angle=120.0,
-        down_angle=80.0,
-        kpts=point2,
-        verbose=False
-    )
+    return cap, meta
+
+def infer_video_frames(cap, pose, crop, want=None, batch_size=POSE_BATCH_SIZE, tracker=None, index=None):
+    """
+    从当前位置顺序解码视频，对需要的帧的裁剪区域分批推理关键点。
+
+    Args:
+        crop (tuple | callable): 固定裁剪区域，或 crop(frame_idx) 返回每帧的裁剪区域。
+        want (callable | set): want(frame_idx) 为 True 的帧（或集合中的帧号）才解码像素并推理，
+            其余帧用 grab() 跳过；None 表示全部帧。
+        tracker (RoiTracker): 给出时忽略 crop，裁剪区域由跟踪器逐帧预测，并按其间隔在整帧上重新检测。
+        index (VideoIndex): want 为帧号集合时，下一个需要的帧之前有关键帧则直接定位过去，
+            不再解码中间的帧；此时返回的总帧数取自索引。
+
+    Returns:
+        tuple: (视频总帧数, {帧号: 关键点或 None})
+    """
+    crop_for = crop if callable(crop) else (lambda frame_idx: crop)
+    wanted = None
+    if want is not None and not callable(want):
+        wanted = sorted(want)
+        want = set(wanted).__contains__
+    results = {}
+    batch = []
+    batch_idx = []
+    offsets = []
     
-    angles_group1 = []
-    angles_group2 = []
-    frames = []
+    def flush():
+        for idx, frame_keypoints in zip(batch_idx, pose.infer_batch(batch, offsets)):
+            results[idx] = frame_keypoints
+            if tracker is not None:
+                tracker.observe(idx, frame_keypoints)
+        batch.clear()
+        batch_idx.clear()
+        offsets.clear()
     
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
+    frame_idx = 0
+    while True:
+        if wanted is not None and index is not None:
+            pos = bisect.bisect_left(wanted, frame_idx)
+            if pos == len(wanted):
+                # 需要的帧都已解码，剩余部分不必再读
+                frame_idx = index.frames
+                break
+            if index.worth_seeking(frame_idx, wanted[pos]):
+                if not seek(cap, index, wanted[pos]):
+                    break
+                frame_idx = wanted[pos]
+            elif not cap.grab():
+                break
+        elif not cap.grab():
             break
-            
-        # 应用掩码
-        masked_frame = frame.copy()
-        masked_frame[mask == 0] = 0  # 将非ROI区域设为黑色
-        
-        gym1.monitor(masked_frame)
-        gym2.monitor(masked_frame)
-        angle1 = 0
-        angle2 = 0
-        if point1 == [6, 8, 10]:
-            angle1 = gym1.angle[0] if isinstance(gym1.angle, (list, tuple)) else 0
-            angle2 = gym2.angle[0] if isinstance(gym2.angle, (list, tuple)) else 0
-        elif point1 == [5, 7, 9]:
-            angle1 = gym1.angle[0] if isinstance(gym1.angle, (list, tuple)) else 0
-            angle2 = gym2.angle[0] if isinstance(gym2.angle, (list, tuple)) else 0
-        angles_group1.append(angle1)
-        angles_group2.append(angle2)
-        frames.append(frame)  # 保存原始帧
+        if want is None or want(frame_idx):
+            ret, frame = cap.retrieve()
+            if ret and tracker is not None and tracker.needs_detection(frame_idx):
+                # 整帧重新检测前先处理完已排队的帧，保证跟踪器状态按帧序更新
+                flush()
+                boxes, keypoints = pose.detect(frame)
+                chosen = tracker.detect(frame_idx, boxes)
+                results[frame_idx] = None if chosen is None else keypoints[chosen]
+            elif ret:
+                cx1, cy1, cx2, cy2 = tracker.crop(frame_idx) if tracker is not None else crop_for(frame_idx)
+                batch.append(np.ascontiguousarray(frame[cy1:cy2, cx1:cx2]))
+                batch_idx.append(frame_idx)
+                offsets.append((cx1, cy1))
+        # 凑满一批时整批推理
+        if len(batch) >= max(1, batch_size):
+            flush()
+        frame_idx += 1
+    if batch:
+        flush()
+    return frame_idx, results
+
+def _keypoint_track(total_frames, results):
+    """把 {帧号: 关键点} 整理为 (frames, 17, 3) 数组，未推理或未检测到人体的帧为 NaN"""
+    keypoints = np.full((total_frames, NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+    for idx, frame_keypoints in results.items():
+        if frame_keypoints is not None:
+            keypoints[idx] = frame_keypoints
+    return keypoints
+
+def pose_stages(pose, meta, tracker=None, batch_size=POSE_BATCH_SIZE, keep_frames=False, scaled=None):
+    """
+    构造流水线中的 ROI 与姿态两个阶段。
+
+    ROI 阶段输入 (帧号, 帧)，裁剪出推理区域（移动 ROI 到期时交出整帧重新检测）；
+    姿态阶段按 batch_size 攒批推理，每批输出 [(帧号, 关键点或 None, 帧或 None), ...]，
+    keep_frames 为 True 时带上原始帧供后续绘制。
+    scaled (ScaledFrameReader) 给出时输入帧已由 ffmpeg 裁剪并缩放到推理尺寸，ROI 阶段直接透传，
+    关键点按其偏移与缩放映射回原图（此时没有原始帧，不能与 keep_frames 同时使用）。
+
+    Returns:
+        tuple: (roi, infer, flush)，flush 作为姿态阶段的 flush 回调。
+    """
+    fixed_crop = tuple(meta['roi']['crop'])
+    
+    def roi(item, emit):
+        frame_idx, frame = item
+        if scaled is not None:
+            emit((frame_idx, frame, scaled.offset, None))
+            return
+        crop = fixed_crop if tracker is None else tracker.plan(frame_idx)
+        if crop is None:
+            # 移动 ROI 到期重新检测，整帧交给姿态阶段
+            emit((frame_idx, frame, None, frame))
+            return
+        cx1, cy1, cx2, cy2 = crop
+        emit((frame_idx, np.ascontiguousarray(frame[cy1:cy2, cx1:cx2]), (cx1, cy1), frame))
+    
+    batch = []
+    
+    def flush(emit):
+        if not batch:
+            return
+        results = pose.infer_batch([image for _, image, _, _ in batch], [offset for _, _, offset, _ in batch])
+        if tracker is not None:
+            for (frame_idx, _, _, _), frame_keypoints in zip(batch, results):
+                tracker.observe(frame_idx, frame_keypoints)
+        emit([(frame_idx, frame_keypoints, frame if keep_frames else None)
+              for (frame_idx, _, _, frame), frame_keypoints in zip(batch, results)])
+        batch.clear()
+    
+    def infer(item, emit):
+        frame_idx, image, offset, frame = item
+        if offset is None:
+            # 检测前先推理已攒的帧，保证跟踪器状态按帧序更新
+            flush(emit)
+            boxes, keypoints = pose.detect(image)
+            chosen = tracker.detect(frame_idx, boxes)
+            emit([(frame_idx, None if chosen is None else keypoints[chosen], frame if keep_frames else None)])
+            return
+        batch.append(item)
+        # 凑满一批时整批推理
+        if len(batch) >= max(1, batch_size):
+            flush(emit)
+    
+    return roi, infer, flush
+
+def decode_frames(cap):
+    """顺序解码视频，产生 (帧号, 帧)"""
+    frame_idx = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame_idx, frame
+        frame_idx += 1
+
+def analysis_pipeline(video_path, pose, batch_size=POSE_BATCH_SIZE, margin=ROI_MARGIN, track_interval=ROI_TRACK_INTERVAL):
+    """
+    以分阶段流水线运行离线分析：解码 → ROI → 姿态 → 角度 → 分段，每个阶段一个线程，阶段间为有界队列。
+    姿态阶段按 batch_size 攒批推理；track_interval > 0 时 ROI 跟随人体移动。
+    各阶段的吞吐与队列占用见 pipeline.pipeline_stats['analysis']。
+
+    Returns:
+        dict: {'keypoints', 'meta', 'angles', 'segments'}。keypoints 为 (frames, 17, 3) float32，
+        未检测到人体的帧为 NaN；angles 为补齐后的 (frames, 2) 角度；segments 为 find_segments 的返回值。
+        无法读取视频或未检测到人体时返回 None。
+    """
+    opened = open_video_roi(video_path, pose.model_path, margin)
+    if opened is None:
+        return None
+    cap, meta = opened
+    tracker = roi_tracker(meta, margin, track_interval)
+    # ROI 固定时由 ffmpeg 直接解码出推理分辨率的裁剪帧，不再解码整帧
+    scaled = open_scaled_frames(video_path, meta['roi']['crop'], pose.imgsz) if tracker is None else None
+    roi, infer, flush = pose_stages(pose, meta, tracker, batch_size, scaled=scaled)
+    
+    track = []
+    angle_chunks = []
+    
+    def angles(results, emit):
+        chunk = np.stack([EMPTY_KEYPOINTS if k is None else k for _, k, _ in results]).astype(np.float32)
+        track.append(chunk)
+        angle_chunks.append(joint_angles(chunk, pose.triplets))
+    
+    def angles_done(emit):
+        keypoints = np.concatenate(track) if track else np.empty((0, NUM_KEYPOINTS, 3), dtype=np.float32)
+        angle_values = np.concatenate(angle_chunks) if angle_chunks else np.empty((0, len(pose.triplets)))
+        emit((keypoints, angle_values))
+    
+    def segment(item, emit):
+        keypoints, angle_values = item
+        angle_values = fill_missing_angles(angle_values)
+        emit((keypoints, angle_values, find_segments(angle_values[:, 0].tolist(), len(keypoints))))
+    
+    pipe = Pipeline('analysis')
+    pipe.add('roi', roi).add('pose', infer, flush=flush).add('angles', angles, flush=angles_done).add('segment', segment)
+    try:
+        (keypoints, angle_values, segments), = pipe.run(scaled if scaled is not None else decode_frames(cap),
+                                                        source_name='decode')
+    finally:
+        cap.release()
+        if scaled is not None:
+            scaled.close()
+    pipe.report()
+    if tracker is not None and tracker.boxes:
+        # 逐帧人体框，渲染时 ROI 跟随人体移动
+        meta['roi']['boxes'] = interpolate_boxes(tracker.boxes, len(keypoints)).tolist()
+    return {'keypoints': keypoints, 'meta': meta, 'angles': angle_values, 'segments': segments}
+
+def extract_keypoints(video_path, pose, batch_size=POSE_BATCH_SIZE, margin=ROI_MARGIN, track_interval=ROI_TRACK_INTERVAL):
+    """
+    解码整段视频，用第60帧自动选择ROI，对每一帧的 ROI 裁剪区域推理关键点并映射回原图坐标。
+    帧按 batch_size 分块解码后整批送入模型。track_interval > 0 时 ROI 跟随人体移动，
+    逐帧人体框保存在 meta['roi']['boxes']。
+
+    Returns:
+        tuple: (keypoints, meta)。keypoints 为 (frames, 17, 3) float32 数组，未检测到人体的帧为 NaN；
+        meta 包含 ROI 与视频元数据。无法读取视频或未检测到人体时返回 None。
+    """
+    result = analysis_pipeline(video_path, pose, batch_size, margin, track_interval)
+    if result is None:
+        return None
+    return result['keypoints'], result['meta']
+
+def extract_keypoints_sparse(video_path, pose, stride=POSE_SPARSE_STRIDE, target_frames=62, window=None,
+                             batch_size=POSE_BATCH_SIZE, margin=ROI_MARGIN, track_interval=ROI_TRACK_INTERVAL):
+    """
+    面向评分的稀疏推理（由粗到细）：
+        1. 粗扫：每隔 stride 帧推理一次，插值得到整段角度，用与 process_video 相同的规则找到峰点和分段；
+        2. 精扫：只推理评分重采样会用到的帧以及分段边界附近 window 帧内的帧，
+           借助关键帧索引直接定位到这些帧附近，跳过的帧只 grab() 不转换像素。
+
+    Returns:
+        tuple: (keypoints, inferred, meta)。inferred 为布尔数组，标记实际推理过的帧；
+        未推理的帧在 keypoints 中为 NaN。无法读取视频或未检测到人体时返回 None。
+    """
+    window = stride * 2 if window is None else window
+    opened = open_video_roi(video_path, pose.model_path, margin)
+    if opened is None:
+        return None
+    cap, meta = opened
+    crop = meta['roi']['crop']
+    tracker = roi_tracker(meta, margin, track_interval)
+    
+    # 粗扫
+    total_frames, results = infer_video_frames(cap, pose, crop, want=lambda i: i % stride == 0,
+                                               batch_size=batch_size, tracker=tracker)
+    if tracker is not None and tracker.boxes:
+        # 精扫帧的裁剪区域取粗扫人体框的插值
+        boxes = interpolate_boxes(tracker.boxes, total_frames)
+        meta['roi']['boxes'] = boxes.tolist()
+        crop = lambda frame_idx: crop_box(boxes[frame_idx], meta['width'], meta['height'], margin)
+    inferred = np.zeros(total_frames, dtype=bool)
+    inferred[list(results)] = True
+    angles_group1, _ = keypoint_angles(pose, _keypoint_track(total_frames, results), inferred)
+    segment_ranges, _, _ = find_segments(angles_group1, total_frames)
+    
+    # 精扫：只补充评分需要而粗扫没有覆盖的帧
+    needed = scoring_frame_indices(segment_ranges, total_frames, target_frames, window) - set(results)
+    if needed:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        _, fine_results = infer_video_frames(cap, pose, crop, want=needed, batch_size=batch_size,
+                                             index=load_index(video_path))
+        results.update(fine_results)
+        inferred[list(fine_results)] = True
     cap.release()
-    cv2.destroyAllWindows()
+    return _keypoint_track(total_frames, results), inferred, meta
+
+def keypoint_angles(pose, keypoints, inferred=None):
+    """
+    由关键点轨迹一次性计算两组角度序列。
+
+    低置信度关节和未检测到人体的帧记为 NaN，再按时间线性插值补齐；
+    inferred 给出时，未推理的帧同样由相邻推理帧插值。
+    """
+    angles = joint_angles(keypoints, pose.triplets)
+    if inferred is not None:
+        angles[~inferred] = np.nan
+    angles = fill_missing_angles(angles)
+    return [angles[:, j].tolist() for j in range(angles.shape[1])]
+
+def resample_indices(length, target_frames):
+    """把长度为 length 的序列重采样为 target_frames 个点时取的下标（长于目标时下采样，短于目标时重复补齐）"""
+    if length > target_frames:  # 下采样
+        return np.linspace(0, length - 1, target_frames, dtype=int)
+    # 补充
+    return np.round(np.linspace(0, length - 1, target_frames)).astype(int)
+
+def segment_rows(segment_ranges):
+    """
+    每个分段实际包含的帧：相邻分段共用的峰点帧只归入前一个分段（与 process_video 生成数据集时的规则一致）。
+
+    Returns:
+        list: 每个分段的帧号数组。
+    """
+    rows = []
+    covered_until = -1
+    for start, end in segment_ranges:
+        rows.append(np.arange(max(start, covered_until + 1), end + 1))
+        covered_until = max(covered_until, end)
+    return rows
+
+def segment_features(angles_group1, angles_group2, frames, target_frames=62):
+    """一个分段的评分特征：两组角度分别按 process_video_data 的规则重采样后拼接"""
+    indices = resample_indices(len(frames), target_frames)
+    return np.concatenate([np.asarray(angles_group1)[frames][indices], np.asarray(angles_group2)[frames][indices]])
+
+def scoring_frame_indices(segment_ranges, total_frames, target_frames=62, window=8):
+    """返回评分实际会用到的帧：每个分段按 process_video_data 规则重采样的帧，加上分段边界附近 window 帧"""
+    needed = set()
+    for start, end in segment_ranges:
+        frames = np.arange(start, end + 1)
+        needed.update(int(f) for f in frames[resample_indices(len(frames), target_frames)])
+        for boundary in (start, end):
+            needed.update(range(max(0, boundary - window), min(total_frames, boundary + window + 1)))
+    return needed
+
+def find_segments(angles_group1, total_frames):
+    """
+    根据 group1 角度的极大值点切分动作片段。
+
+    Returns:
+        tuple: (segment_ranges, adjusted_peaks, last_peak_frame)
+    """
     # 查找极大值点并生成时间戳
-    peaks = find_peaks(angles_group1, distance=20, prominence=10)[0]
+    peaks = find_peaks(angles_group1, distance=PEAK_DISTANCE, prominence=PEAK_PROMINENCE)[0]
     
     # 如果第一个点满足条件（角度大于120或小于80），将其添加到峰值列表中
     if angles_group1[0] > 120:
@@ -179,7 +490,7 @@ def process_video(video_path, point1, point2, output_csv, output_p, alingn_csv,
         
         # 检查最后一段动作的帧数
         last_segment_start = adjusted_peaks[-1]
-        last_segment_end = len(frames) - 1
+        last_segment_end = total_frames - 1
         last_segment_frames = last_segment_end - last_segment_start + 1
         
         if last_segment_frames >= 25 and last_segment_frames <= 100:  # 如果最后一段动作帧数在25-100帧之间，则保留
@@ -199,7 +510,198 @@ def process_video(video_path, point1, point2, output_csv, output_p, alingn_csv,
             last_peak_frame = last_segment_start
     else:
         segment_ranges = []
-        last_peak_frame = len(frames) - 1
+        last_peak_frame = total_frames - 1
+
+    return segment_ranges, adjusted_peaks, last_peak_frame
+
+class OnlineSegmenter:
+    """
+    边解码边分段：每收到 every 帧角度，就在已有的角度前缀上重新运行 find_segments，
+    并只提交结束峰点早于 stable_until() 的分段——这些分段不会再被后续帧改变，与整段分析的结果一致。
+    视频结束时再用整段角度运行一次 find_segments，补齐最后的分段（尾段规则依赖总帧数）。
+    """
+
+    def __init__(self, groups=2, every=5, target_frames=62):
+        self.values = np.empty((1024, groups))
+        self.length = 0
+        self.every = every
+        self.target_frames = target_frames
+        self.committed = []
+        self.adjusted_peaks = []
+        self.last_peak_frame = None
+        self._pending = 0
+
+    def extend(self, angle_rows):
+        """
+        追加一批 (n, groups) 角度（低置信度为 NaN）。
+
+        Returns:
+            list: 新确定的分段 [(start, end, features), ...]，features 为评分特征。
+        """
+        angle_rows = np.asarray(angle_rows, dtype=np.float64)
+        while self.length + len(angle_rows) > len(self.values):
+            self.values = np.concatenate([self.values, np.empty_like(self.values)])
+        self.values[self.length:self.length + len(angle_rows)] = angle_rows
+        self.length += len(angle_rows)
+        self._pending += len(angle_rows)
+        if self._pending < self.every:
+            return []
+        self._pending = 0
+        return self._update(final=False)
+
+    def finish(self):
+        """视频结束：按整段角度补齐剩余分段"""
+        return self._update(final=True)
+
+    @property
+    def settled_until(self):
+        """
+        该帧之前（不含）的分段归属已经确定。
+        最后一个已确定分段的结束帧同时是下一分段的起始帧，下一分段确定前不算已确定。
+        """
+        return self.committed[-1][1] if self.committed else 0
+
+    def angles(self):
+        """补齐 NaN 后的全部角度 (frames, groups)"""
+        return fill_missing_angles(self.values[:self.length])
+
+    def stable_until(self, angles_group1):
+        """
+        返回一个帧号，之前的 find_peaks 结果不会再随后续帧变化。
+
+        后续帧只能通过两种方式改变已有峰点：
+            1. distance 筛选：更高的新峰会去掉 PEAK_DISTANCE 内较低的峰，并可能连锁影响更早的峰，
+               连锁只沿着间隔小于 PEAK_DISTANCE、高度依次升高的局部极大值传递；
+            2. prominence 判定：右侧还没有更高点的局部极大值，突出度会随后续帧增大，
+               当前不足 PEAK_PROMINENCE 的将来可能成为峰。
+        """
+        valid = np.flatnonzero(~np.isnan(self.values[:self.length, 0]))
+        if len(valid) == 0:
+            return 0
+        # 末尾缺失的角度会在后续帧到来后重新插值
+        horizon = int(valid[-1])
+        values = np.asarray(angles_group1[:horizon + 1])
+        local_max = find_peaks(values)[0]
+        stable = horizon
+        reach = [(horizon, np.inf)]
+        for m in local_max[::-1]:
+            reach = [(r, h) for r, h in reach if r - m < PEAK_DISTANCE]
+            if not reach:
+                break
+            if any(h >= values[m] for _, h in reach):
+                reach.append((m, values[m]))
+                stable = int(m)
+        # 右侧没有更高点、突出度暂时不足的局部极大值
+        if len(local_max):
+            right_max = np.maximum.accumulate(values[::-1])[::-1]
+            later_max = np.append(right_max[1:], -np.inf)
+            open_peaks = local_max[later_max[local_max] <= values[local_max]]
+            if len(open_peaks):
+                prominences = peak_prominences(values, open_peaks)[0]
+                weak = open_peaks[prominences < PEAK_PROMINENCE]
+                if len(weak):
+                    stable = min(stable, int(weak[0]))
+        return stable
+
+    def _update(self, final):
+        if self.length == 0:
+            return []
+        angles = self.angles()
+        segment_ranges, adjusted_peaks, last_peak_frame = find_segments(angles[:, 0].tolist(), self.length)
+        if final:
+            candidates = segment_ranges
+            self.adjusted_peaks = adjusted_peaks
+            self.last_peak_frame = last_peak_frame
+        else:
+            stable = self.stable_until(angles[:, 0])
+            candidates = [(a, b) for a, b in zip(adjusted_peaks[:-1], adjusted_peaks[1:]) if b < stable]
+        last_end = self.committed[-1][1] if self.committed else None
+        new_segments = []
+        for start, end in candidates:
+            start, end = int(start), int(end)
+            if last_end is not None and start < last_end:
+                if final and end > last_end:
+                    print(f"⚠️ 整段分段与已提交分段不一致，跳过 ({start}, {end})")
+                continue
+            new_segments.append((start, end))
+            last_end = end
+        if not new_segments:
+            return []
+        rows = segment_rows(self.committed + new_segments)[len(self.committed):]
+        self.committed.extend(new_segments)
+        return [(start, end, segment_features(angles[:, 0], angles[:, 1], frames, self.target_frames))
+                for (start, end), frames in zip(new_segments, rows)]
+
+def save_artifacts(video_path, artifact_dir=ANALYSIS_ARTIFACT_DIR, **artifacts):
+    """
+    把一次任务的中间数据导出到 artifact_dir/<视频名>-<时间>-<进程号>/ 下，用于排查问题。
+    DataFrame 保存为 pickle（保留列类型与索引），其余对象保存为 JSON。
+
+    Returns:
+        str: 导出目录；artifact_dir 为空时不导出，返回 None。
+    """
+    if not artifact_dir:
+        return None
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    job_dir = os.path.join(artifact_dir, f"{name}-{stamp}-{os.getpid()}")
+    os.makedirs(job_dir, exist_ok=True)
+    for key, value in artifacts.items():
+        if isinstance(value, pd.DataFrame):
+            value.to_pickle(os.path.join(job_dir, f"{key}.pkl"))
+        else:
+            with open(os.path.join(job_dir, f"{key}.json"), 'w') as f:
+                json.dump(value, f)
+    print(f"中间数据已导出: {job_dir}")
+    return job_dir
+
+def process_video(video_path, point1, point2, std, model_path_data, imgsz=None, sparse_stride=POSE_SPARSE_STRIDE):
+    """
+    处理单个视频，提取角度并根据极大值分割视频，同时记录角度数据。
+    中间数据只在内存中传递，不再写入工作目录，同时运行的多个任务互不覆盖；
+    设置 ANALYSIS_ARTIFACT_DIR 时另外导出一份（见 save_artifacts）。
+
+    Returns:
+        tuple: (first_peak, last_peak_frame, aligned_df, processed_data, standard_angles)
+    """
+    # 每帧只推理一次，同时得到两组角度
+    pose = PoseEstimator(model_path_data, [point1, point2], imgsz=imgsz)
+    
+    # 关键点轨迹：命中缓存时跳过解码和推理；开启稀疏模式时只推理评分用到的帧
+    cached = keypoint_store.load(video_path, model_path_data, keypoint_variant(imgsz))
+    inferred = None
+    analysis = None
+    if cached is None and sparse_stride and sparse_stride > 1:
+        result = extract_keypoints_sparse(video_path, pose, stride=sparse_stride)
+        if result is None:
+            return
+        keypoints, inferred, meta = result
+        print(f"稀疏推理: {int(inferred.sum())}/{len(inferred)} 帧")
+    elif cached is None:
+        # 流水线同时给出角度与分段
+        analysis = analysis_pipeline(video_path, pose)
+        if analysis is None:
+            return
+        keypoints, meta = analysis['keypoints'], analysis['meta']
+        keypoint_store.save(video_path, model_path_data, keypoints, meta, variant=keypoint_variant(imgsz))
+    else:
+        keypoints, meta = cached
+    roi_points = meta['roi']['points']
+    w, h, fps = meta['width'], meta['height'], meta['fps']
+    
+    roi_info = {
+        'points': roi_points,
+        'width': w,
+        'height': h
+    }
+    
+    total_frames = len(keypoints)
+    if analysis is not None:
+        angles_group1, angles_group2 = (analysis['angles'][:, j].tolist() for j in range(2))
+        segment_ranges, adjusted_peaks, last_peak_frame = analysis['segments']
+    else:
+        angles_group1, angles_group2 = keypoint_angles(pose, keypoints, inferred)
+        segment_ranges, adjusted_peaks, last_peak_frame = find_segments(angles_group1, total_frames)
 
     # 生成时间戳和总帧数
     timestamps = []
@@ -213,7 +715,7 @@ def process_video(video_path, point1, point2, output_csv, output_p, alingn_csv,
     # 生成 segment_labels 和 segment_total_frames
     segment_labels = []
     segment_total_frames = []
-    for frame_num in range(len(frames)):
+    for frame_num in range(total_frames):
         current_segment = None
         for seg_idx, (start, end) in enumerate(segment_ranges):
             if start <= frame_num <= end:
@@ -258,7 +760,6 @@ def process_video(video_path, point1, point2, output_csv, output_p, alingn_csv,
         columns=["segment_label", "frame_number", "angle_group", "angle_value", "categories", "segment_total_frames"]
     )
 
-    df.to_csv(output_csv, index=False)
 
     """
     max_frames = df.groupby(['video_name', 'angle_group'])['frame_number'].max()
@@ -270,23 +771,22 @@ def process_video(video_path, point1, point2, output_csv, output_p, alingn_csv,
     processed_data = (
         df.groupby(['segment_label', 'angle_group'], group_keys=False)
         .apply(lambda group: process_video_data(group, 62))
+        # 与原先写出 CSV 再读回的结果一致：按行号索引
+        .reset_index(drop=True)
     )
-    processed_data.to_csv(output_p, index=False)
 
-    std_df = get_std(std, std_csv)
-    aligned_df = align_standard_data(std_df,processed_data,alingn_csv)
+    std_df = get_std(std)
+    aligned_df = align_standard_data(std_df,processed_data)
+    save_artifacts(video_path, angles=df, angles_p=processed_data, std=std_df, alingn=aligned_df, roi_info=roi_info)
 
-    return first_peak, last_peak_frame, aligned_df
+    return first_peak, last_peak_frame, aligned_df, processed_data, std_df
 
 def process_video_data(df, target_frames):
     frame_numbers = df['frame_number'].values
     angle_values = df['angle_value'].values
     segment_total_frames = df['segment_total_frames'].iloc[0]  # 获取该片段的总帧数
 
-    if len(frame_numbers) > target_frames:  # 下采样
-        indices = np.linspace(0, len(frame_numbers) - 1, target_frames, dtype=int)
-    else:  # 补充
-        indices = np.round(np.linspace(0, len(frame_numbers) - 1, target_frames)).astype(int)
+    indices = resample_indices(len(frame_numbers), target_frames)
 
     frame_numbers_resampled = np.arange(1, target_frames + 1)
     angle_values_resampled = angle_values[indices]
@@ -375,7 +875,21 @@ def clean_angles(df):
     
     return result
 
-def get_std(data_path, std_csv):
+# 标准角度，按数据文件的修改时间缓存
+_std_cache = {}
+
+def get_std(data_path):
+    """
+    由数据集中 case0 的样本计算每帧的标准平均角度（列为 frame_number、group1、group2）。
+    结果按数据文件的修改时间缓存，常驻分析进程中只在数据文件更新后重新计算；调用方不应修改返回的 DataFrame。
+    """
+    key = (os.path.abspath(data_path), os.path.getmtime(data_path))
+    if key not in _std_cache:
+        _std_cache.clear()
+        _std_cache[key] = _compute_std(data_path)
+    return _std_cache[key]
+
+def _compute_std(data_path):
     data = pd.read_csv(data_path)
     case0_data = data[data['categories'] == 'case0']
     # 按照视频名称、角度组和帧数进行分组
@@ -384,10 +898,11 @@ def get_std(data_path, std_csv):
     final_result = grouped.groupby(['angle_group', 'frame_number'])['angle_value'].mean().reset_index()
     # 获取标准平均角度
     standard_angles = final_result.pivot(index='frame_number', columns='angle_group', values='angle_value').reset_index()
-    standard_angles.to_csv(std_csv, index=False)
+    # 与原先写出 CSV 再读回的结果一致：列索引不带名称
+    standard_angles.columns.name = None
     return standard_angles
 
-def align_standard_data(std_df, video_df, dir):
+def align_standard_data(std_df, video_df):
 
     # 存储对齐后的数据
     aligned_data = []
@@ -418,22 +933,20 @@ def align_standard_data(std_df, video_df, dir):
 
     # 合并所有片段的对齐数据
     aligned_df = pd.concat(aligned_data, ignore_index=True)
-    aligned_df.to_csv(dir, index=False)
 
     return aligned_df
 
-def data_run_program(video_path_data, file_path_data, model_path_data, point1, point2):
+def data_run_program(video_path_data, file_path_data, model_path_data, point1, point2, imgsz=None):
     """
     视频处理入口
     """
     video_path = video_path_data
-    output_csv = "angles.csv"
-    output_p = "angles_p.csv"
-    alingn_csv = "alingn.csv"
-    std_csv = "std.csv"
     std = file_path_data
-    first_peak_frame, last_peak_frame, aligned_df = process_video(video_path, point1, point2, output_csv, output_p, alingn_csv, std_csv, std, model_path_data)
-    return first_peak_frame, last_peak_frame, aligned_df, std_csv, output_p
+    result = process_video(video_path, point1, point2, std, model_path_data, imgsz)
+    if result is None:
+        raise ValueError("无法读取视频或未检测到人体")
+    first_peak_frame, last_peak_frame, aligned_df, processed_data, standard_angles = result
+    return first_peak_frame, last_peak_frame, aligned_df, standard_angles, processed_data
 
 def draw_angle_info(frame, angle1, angle2, countdown=None, show_ui=True):
     """在画面上绘制角度信息和倒计时"""
@@ -544,30 +1057,13 @@ def draw_angle_info(frame, angle1, angle2, countdown=None, show_ui=True):
 
     return frame
 
-def process_realtime_pose(model_path_data, point1, point2):
+def process_realtime_pose(model_path_data, point1, point2, imgsz=None):
     """
     处理实时摄像头画面，提取角度数据进行分析，并保存原始视频，同时实时显示处理后的结果。
     采用多线程分离录制和处理，确保视频录制速度正常，而实时显示只使用最新帧降低延迟。
     """
-    # ---------------------- 初始化 AIGym 实例 ----------------------
-    gym1 = solutions.AIGym(
-        model=model_path_data,
-        show=False,
-        line_width=1,
-        up_angle=120.0,
-        down_angle=80.0,
-        kpts=point1,
-        verbose=False
-    )
-    gym2 = solutions.AIGym(
-        model=model_path_data,
-        show=False,
-        line_width=1,
-        up_angle=120.0,
-        down_angle=80.0,
-        kpts=point2,
-        verbose=False
-    )
+    # ---------------------- 初始化姿态推理 ----------------------
+    pose = PoseEstimator(model_path_data, [point1, point2], imgsz=imgsz)
 
     # ---------------------- 初始化视频捕获 ----------------------
     cap = cv2.VideoCapture(0)
@@ -616,8 +1112,7 @@ def process_realtime_pose(model_path_data, point1, point2):
     output_filename = 'output.mp4'  # 定义文件名变量
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_filename, fourcc, 30, (width, height))
+    out = open_video_writer(output_filename, 30, (width, height))
 
     # ---------------------- 初始化队列和停止标志 ----------------------
     # 用于处理的队列只保留最新帧，降低延迟
@@ -654,11 +1149,8 @@ def process_realtime_pose(model_path_data, point1, point2):
             except queue.Empty:
                 continue
 
-            # 调用 gym 实例处理当前帧（注意 gym2 使用帧副本）
-            gym1.monitor(frame)
-            gym2.monitor(frame)
-            angle1 = gym1.angle[0] if isinstance(gym1.angle, (list, tuple)) else 0
-            angle2 = gym2.angle[0] if isinstance(gym2.angle, (list, tuple)) else 0
+            # 单次推理得到两组角度
+            angle1, angle2 = pose.monitor(frame)
             # 生成处理后的显示帧
             processed_frame = draw_angle_info(frame.copy(), angle1, angle2, show_ui=True)
 
@@ -1,10 +1,15 @@
 import tkinter as tk
 from tkinter import filedialog
 import threading
-from count_display import run_display_program
+from count_display import run_display_program, run_fused_program
 from process_data import data_run_program
 from train_model import run
 from classify import run_classify
+from pose_tiers import resolve_pose_config
+from pipeline import flat_stats, pipeline_stats
+from overlay_timeline import analysis_output_name
+from result_cache import analysis_key
+import argparse
 import json
 import sys
 import os
@@ -12,8 +17,9 @@ import numpy as np
 import warnings
 
 warnings.filterwarnings('ignore')
-model_path = os.path.abspath('./public/yolo11x-pose.pt')
 file_path = os.path.abspath('./public/data.csv')
+# 1 使用单次解码的分析+渲染融合引擎，0 使用原来的 分析 → 渲染 → 截取片段 三次遍历
+FUSED_ENGINE = os.environ.get('FUSED_ENGINE', '1') == '1'
 
 def numpy_to_list(obj):
     if isinstance(obj, np.ndarray):
@@ -22,61 +28,132 @@ def numpy_to_list(obj):
         return [numpy_to_list(item) for item in obj]
     return obj
 
-def run_program(video_path, hand_choice, load_saved_models=True):
+# 回归与分类评分模型，按检查点文件的修改时间缓存，常驻分析进程中只在检查点更新后重新加载
+SCORING_CHECKPOINTS = ('best_regress_model.pth', 'best_classify_model.pth')
+_scoring_models = {}
+
+def load_scoring_models(load_saved_models=True):
+    """
+    加载回归与分类评分模型。
+
+    Returns:
+        tuple: (回归模型, device, 分类模型, label_encoder)
+    """
+    if not load_saved_models:
+        model1, device = run(file_path, load_saved_model=False)
+        model2, label_encoder = run_classify(file_path, load_saved_model=False)
+        return model1, device, model2, label_encoder
+    key = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in SCORING_CHECKPOINTS)
+    if key not in _scoring_models:
+        model1, device = run(file_path, load_saved_model=True)
+        model2, label_encoder = run_classify(file_path, load_saved_model=True)
+        # 找不到检查点时 run/run_classify 会重新训练并写出检查点，按写出后的修改时间缓存
+        key = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in SCORING_CHECKPOINTS)
+        _scoring_models.clear()
+        _scoring_models[key] = (model1, device, model2, label_encoder)
+    return _scoring_models[key]
+
+def run_program(video_path, hand_choice, load_saved_models=True, pose_tier=None, imgsz=None, pose_backend=None, progress=None,
+                output_name=None):
     # 确保视频路径是绝对路径
     video_path = os.path.abspath(video_path)
+    # 解析姿态模型档位（n/s/m/l/x/auto）、输入尺寸与推理后端
+    pose_config = resolve_pose_config(pose_tier, imgsz, pose_backend)
+    model_path = os.path.abspath(pose_config['model_path'])
+    imgsz = pose_config['imgsz']
+    # 时间轴与输出视频按 (视频, 手臂, 模型与评分配置) 命名，服务进程已算好时直接使用
+    if output_name is None:
+        output_name = analysis_output_name(video_path, hand_choice, analysis_key(video_path, hand_choice, pose_config))
     print(f"处理视频: {video_path}")
     print(f"选择手臂: {hand_choice}")
-    print(f"模型路径: {model_path}")
+    print(f"模型路径: {model_path} (档位: {pose_config['tier']}, imgsz: {imgsz}, 后端: {pose_config['backend']})")
     print(f"数据文件路径: {file_path}")
+    print(f"输出名: {output_name}")
+    # 只保留本次任务的阶段统计
+    pipeline_stats.clear()
 
-    point1 = []
     if hand_choice == "left":
         point1 = [5, 7, 9]
         point2 = [7, 5, 11]
-        first_peak_frame, last_peak_frame, aligned_df, std_csv, output_p = data_run_program(video_path, file_path, model_path, point1, point2)
     else:
         point1 = [6, 8, 10]
         point2 = [8, 6, 12]
-        first_peak_frame, last_peak_frame, aligned_df, std_csv, output_p = data_run_program(video_path, file_path, model_path, point1, point2)
-    
-    print(f"数据处理完成: first_peak_frame={first_peak_frame}, last_peak_frame={last_peak_frame}")
-    
-    model1, device = run(file_path, load_saved_model=load_saved_models)
-    model2, label_encoder = run_classify(file_path, load_saved_model=load_saved_models)
-    
-    print("开始运行显示程序")
-    case_arr, score_arr, output_arr = run_display_program(model1, model2, device, first_peak_frame, last_peak_frame, model_path, video_path, point1, aligned_df, std_csv, output_p, label_encoder)
+
+    if FUSED_ENGINE:
+        model1, device, model2, label_encoder = load_scoring_models(load_saved_models)
+        print("开始运行融合引擎")
+        case_arr, score_arr, output_arr, timeline = run_fused_program(model1, model2, device, label_encoder, model_path, video_path, point1, point2, imgsz, progress, output_name)
+    else:
+        first_peak_frame, last_peak_frame, aligned_df, standard_angles, processed_data = data_run_program(video_path, file_path, model_path, point1, point2, imgsz)
+        print(f"数据处理完成: first_peak_frame={first_peak_frame}, last_peak_frame={last_peak_frame}")
+        
+        model1, device, model2, label_encoder = load_scoring_models(load_saved_models)
+        
+        print("开始运行显示程序")
+        timeline = None
+        case_arr, score_arr, output_arr = run_display_program(model1, model2, device, first_peak_frame, last_peak_frame, model_path, video_path, point1, aligned_df, standard_angles, processed_data, label_encoder, imgsz, output_name)
     
     # 转换 NumPy 数组为 Python 列表
     case_arr = numpy_to_list(case_arr)
     score_arr = numpy_to_list(score_arr)
     output_arr = numpy_to_list(output_arr)
     
-    return case_arr, score_arr, output_arr
+    return case_arr, score_arr, output_arr, timeline, output_name
+
+def analysis_result(video_path, hand_choice, pose_tier=None, imgsz=None, pose_backend=None, progress=None, output_name=None):
+    """
+    运行一次完整分析，返回 /analyze 接口的结果字典（命令行入口与常驻分析进程共用）。
+    progress(已处理帧数, 总帧数, 已评分的动作数) 用于上报进度，只有融合引擎会调用。
+    """
+    case_arr, score_arr, output_arr, timeline, output_name = run_program(
+        video_path, hand_choice, pose_tier=pose_tier, imgsz=imgsz, pose_backend=pose_backend, progress=progress,
+        output_name=output_name)
+    return {
+        "case_arr": case_arr,
+        "score_arr": score_arr,
+        "output_arr": output_arr,
+        # 逐帧叠加时间轴（关键点、角度、分段评分），供前端在原视频上绘制
+        "timeline": timeline,
+        # 本次分析的输出名：时间轴、标注视频与片段都以它命名
+        "output_name": output_name,
+        # 各流水线阶段的吞吐与队列占用，用于定位每个任务的瓶颈
+        "pipeline": flat_stats()
+    }
+
+def write_result(path, data):
+    """结果先写临时文件再改名，读取方不会读到写了一半的 JSON"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print(json.dumps({"error": "Usage: python process_video.py <video_path> <hand_choice>"}))
-        sys.exit(1)
-    
-    video_path = sys.argv[1]
-    hand_choice = sys.argv[2]
+    parser = argparse.ArgumentParser(description='分析视频，输出评分结果（JSON）')
+    parser.add_argument('video_path')
+    parser.add_argument('hand_choice')
+    parser.add_argument('pose_tier', nargs='?')
+    parser.add_argument('imgsz', nargs='?', type=int)
+    parser.add_argument('pose_backend', nargs='?')
+    parser.add_argument('--result-file', default=None,
+                        help='结果（或错误信息）写入该文件，标准输出只用于日志；不指定时结果打印为标准输出的最后一行')
+    parser.add_argument('--output-name', default=None,
+                        help='时间轴与输出视频的文件名前缀；不指定时按视频、手臂与模型/评分配置计算')
+    args = parser.parse_args()
     
     try:
-        case_arr, score_arr, output_arr = run_program(video_path, hand_choice)
-        result = {
-            "case_arr": case_arr,
-            "score_arr": score_arr,
-            "output_arr": output_arr
-        }
-        print(json.dumps(result))
+        result = analysis_result(args.video_path, args.hand_choice, pose_tier=args.pose_tier, imgsz=args.imgsz, pose_backend=args.pose_backend,
+                                 output_name=args.output_name)
     except Exception as e:
         import traceback
         error_msg = {
             "error": str(e),
             "traceback": traceback.format_exc()
         }
+        if args.result_file:
+            write_result(args.result_file, error_msg)
         print(json.dumps(error_msg), file=sys.stderr)
         sys.exit(1)
-    
\ No newline at end of file
+    if args.result_file:
+        write_result(args.result_file, result)
+    else:
+        print(json.dumps(result))
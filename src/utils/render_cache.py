@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import threading
+from keypoint_store import file_sha256
+from overlay_timeline import timeline_path
+
+# 1 时分析任务不渲染标注视频与低分片段，返回 ./render/... 地址，首次请求时再按时间轴渲染
+LAZY_RENDER = os.environ.get('LAZY_RENDER', '1') == '1'
+# 按需渲染结果的缓存目录与磁盘预算
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', './runs/rendered')
+RENDER_CACHE_BUDGET_MB = float(os.environ.get('RENDER_CACHE_BUDGET_MB', 4096))
+
+# <输出名>.mp4 为完整标注视频，<输出名>_segment_<start>_<end>.mp4 为片段（输出名见 overlay_timeline.analysis_output_name）
+RENDER_NAME_RE = re.compile(r'^(?P<video>[\w-]+?)(?:_segment_(?P<start>\d+)_(?P<end>\d+))?\.mp4$')
+
+
+def render_url(name):
+    """按需渲染地址，前端会把开头的 ./ 换成 /，由 nginx 转发到处理服务的 /render"""
+    return f"./render/{name}"
+
+
+def parse_render_name(name):
+    """
+    解析按需渲染的文件名。
+
+    Returns:
+        tuple: (输出名, start, end)，完整视频的 start/end 为 None；文件名无效时抛出 ValueError。
+    """
+    m = RENDER_NAME_RE.match(name)
+    if m is None:
+        raise ValueError(f"无效的渲染文件名: {name}")
+    if m.group('start') is None:
+        return m.group('video'), None, None
+    start, end = int(m.group('start')), int(m.group('end'))
+    if end < start:
+        raise ValueError(f"无效的片段范围: {start}-{end}")
+    return m.group('video'), start, end
+
+
+class RenderJob:
+    """一次正在进行的渲染：tmp_path 为正在写入的临时文件，完成后改名为 path；done 在成功或失败后置位"""
+
+    def __init__(self, path, tmp_path):
+        self.path = path
+        self.tmp_path = tmp_path
+        self.done = threading.Event()
+        self.error = None
+
+
+class RenderCache:
+    """
+    按需渲染的标注视频/片段缓存。
+
+    条目以 (时间轴内容哈希, 文件名) 为键，重新分析同一视频后时间轴变化，旧条目自然失效。
+    未命中时在后台线程中渲染，同一条目同时只渲染一次；输出为分片 MP4 时，请求方可以边渲染边读取临时文件。
+    总占用超过磁盘预算时按最近访问时间淘汰。
+    """
+
+    def __init__(self, root=RENDER_CACHE_DIR, budget_mb=RENDER_CACHE_BUDGET_MB, runs_dir='./runs'):
+        self.root = root
+        self.runs_dir = runs_dir
+        self.budget_bytes = int(budget_mb * 1024 ** 2)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, name):
+        """
+        查找缓存，未命中时启动（或加入已在进行的）后台渲染。
+
+        Returns:
+            tuple: (path, job)。命中时 job 为 None，path 可直接读取；否则 job 为 RenderJob，完成后 path 可用。
+
+        Raises:
+            ValueError: 文件名无效。
+            FileNotFoundError: 没有对应的时间轴或原视频。
+        """
+        video_name, start, end = parse_render_name(name)
+        timeline_file = timeline_path(video_name, self.runs_dir)
+        if not os.path.exists(timeline_file):
+            raise FileNotFoundError(f"没有 {video_name} 的叠加时间轴，请先分析该视频")
+        path = os.path.join(self.root, f"{file_sha256(timeline_file)[:16]}_{name}")
+
+        with self._lock:
+            if os.path.exists(path):
+                self.hits += 1
+                # 更新访问时间，供 LRU 淘汰使用
+                os.utime(path, None)
+                return path, None
+            job = self._jobs.get(path)
+            if job is not None:
+                return path, job
+            with open(timeline_file) as f:
+                timeline = json.load(f)
+            source = timeline.get('source')
+            if not source or not os.path.exists(source):
+                raise FileNotFoundError(f"原视频不存在: {source}")
+            self.misses += 1
+            job = RenderJob(path, f"{path}.tmp-{os.getpid()}-{threading.get_ident()}.mp4")
+            self._jobs[path] = job
+        threading.Thread(target=self._render, args=(job, source, timeline, start, end), daemon=True).start()
+        return path, job
+
+    def _render(self, job, source, timeline, start, end):
+        try:
+            # 绘制依赖 torch/ultralytics，只在真正需要渲染时导入
+            from count_display import render_timeline
+            os.makedirs(self.root, exist_ok=True)
+            render_timeline(source, timeline, job.tmp_path, start, end)
+            os.replace(job.tmp_path, job.path)
+        except Exception as e:
+            job.error = e
+            print(f"渲染失败 ({job.path}): {e}")
+        finally:
+            if os.path.exists(job.tmp_path):
+                os.remove(job.tmp_path)
+            with self._lock:
+                self._jobs.pop(job.path, None)
+            job.done.set()
+        self.evict()
+
+    def get(self, name):
+        """
+        返回渲染好的文件路径，未命中时等待渲染完成（阻塞，应在线程池中调用）。
+
+        Raises:
+            ValueError: 文件名无效。
+            FileNotFoundError: 没有对应的时间轴或原视频。
+        """
+        path, job = self.start(name)
+        if job is not None:
+            job.done.wait()
+            if job.error is not None:
+                raise job.error
+        return path
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if '.tmp-' in name or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def disk_usage(self):
+        """返回当前缓存占用的字节数"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """超过磁盘预算时，按最近访问时间从旧到新删除条目"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.budget_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                print(f"渲染缓存超出预算，已淘汰: {path}")
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries()), 'rendering': len(self._jobs),
+                'disk_mb': round(self.disk_usage() / 1024 ** 2, 2),
+                'budget_mb': round(self.budget_bytes / 1024 ** 2, 2)}
+
+
+# 进程级默认实例
+render_cache = RenderCache()
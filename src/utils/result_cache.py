@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import threading
+from keypoint_store import file_sha256, model_sha256
+from video_reader import resolve_decoder
+
+# 分析结果缓存目录与磁盘预算，可通过环境变量覆盖；RESULT_CACHE=0 关闭缓存
+RESULT_CACHE = os.environ.get('RESULT_CACHE', '1') == '1'
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', './cache/results')
+RESULT_CACHE_BUDGET_MB = float(os.environ.get('RESULT_CACHE_BUDGET_MB', 64))
+
+# 评分用的回归/分类模型检查点（与 process_video.SCORING_CHECKPOINTS 相同）与标准模板数据集，
+# 任一文件内容变化后旧条目自然失效
+SCORING_FILES = ('best_regress_model.pth', 'best_classify_model.pth')
+STANDARD_TEMPLATE = './public/data.csv'
+# 改变分析结果（分段、评分、output_arr 形式）的配置项；推理输入的解码方式改变关键点，另外按实际解码方式区分
+RESULT_ENV = ('FUSED_ENGINE', 'RENDER_OVERLAY', 'LAZY_RENDER', 'POSE_SPARSE_STRIDE', 'ROI_MARGIN',
+              'ROI_TRACK_INTERVAL', 'INFER_DECODER')
+# 结果格式变化时递增，旧条目全部失效（2: score_arr 每项为评分本身，不再是单元素列表；
+# 3: 输出文件按分析键命名，之前的条目引用的是各手臂/配置共用的文件）
+RESULT_CACHE_VERSION = 3
+
+
+def analysis_key(video_path, hand, pose_config):
+    """
+    一次分析的键：相同的键得到相同的结果（需要读取并哈希视频，应在线程池中调用）。
+    同时用作分析结果缓存的条目键和输出文件名（overlay_timeline.analysis_output_name）。
+
+    Returns:
+        str: 视频、姿态模型、评分模型或标准模板不存在时返回 None
+        （缺少检查点时分析过程会重新训练并写出，键在分析前后不一致）。
+    """
+    try:
+        parts = {
+            'version': RESULT_CACHE_VERSION,
+            'video': file_sha256(video_path),
+            'hand': hand,
+            'pose': [model_sha256(pose_config['model_path']), pose_config['imgsz'], pose_config['backend']],
+            'scoring': [file_sha256(path) for path in SCORING_FILES],
+            'standard': file_sha256(STANDARD_TEMPLATE),
+            'env': [os.environ.get(name) for name in RESULT_ENV],
+            # auto 随 CPU 核数与 ffmpeg 是否可用而定，与关键点缓存的 keypoint_variant 使用同一判断
+            'decoder': resolve_decoder(),
+        }
+    except OSError:
+        return None
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def file_fingerprint(path):
+    """(大小, 修改时间)，用于判断结果引用的文件在缓存后是否被删除或覆盖"""
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def result_files(video_path, result):
+    """
+    缓存结果引用的本地文件：原视频、叠加时间轴与已渲染的视频/片段（./render/ 地址按时间轴渲染，不单独记录）。
+    除原视频外都以本条目的输出名命名，只属于这一个条目。
+    """
+    paths = [video_path]
+    if result.get('timeline'):
+        paths.append(result['timeline'])
+    for path in result.get('output_arr') or []:
+        if isinstance(path, str) and not path.startswith('./render/'):
+            paths.append(path)
+    return paths
+
+
+class ResultCache:
+    """
+    按 (视频内容哈希, 手臂, 姿态模型哈希与推理配置, 评分模型检查点哈希, 标准模板哈希) 缓存完整的分析结果。
+
+    每个条目是一个 JSON 文件，同时记录输出名以及结果引用的原视频、时间轴与输出视频的 (大小, 修改时间)。
+    时间轴与输出视频以条目键对应的输出名命名（见 overlay_timeline.analysis_output_name），
+    同一视频的不同手臂/配置各有一组文件，交替分析时互不作废；这些文件被删除或被改写时条目作废。
+    命中时直接返回 case_arr/score_arr/output_arr 等，不再提交给分析进程；
+    总占用超过磁盘预算时按最近访问时间淘汰。
+    """
+
+    def __init__(self, root=RESULT_CACHE_DIR, budget_mb=RESULT_CACHE_BUDGET_MB, enabled=RESULT_CACHE):
+        self.root = root
+        self.budget_bytes = int(budget_mb * 1024 ** 2)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key):
+        """
+        读取缓存的分析结果。
+
+        Returns:
+            dict: 分析结果；未命中、条目损坏或引用的文件已变化时返回 None。
+        """
+        if key is None or not self.enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            valid = all(file_fingerprint(p) == fingerprint for p, fingerprint in entry['files'].items())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            # 条目损坏或引用的文件已删除
+            print(f"分析结果缓存失效，忽略: {path} ({e})")
+            valid = False
+        if not valid:
+            self.misses += 1
+            self._remove(path)
+            return None
+        self.hits += 1
+        # 更新访问时间，供 LRU 淘汰使用
+        os.utime(path, None)
+        return entry['result']
+
+    def put(self, key, video_path, result):
+        """写入分析结果（先写临时文件再原子替换），并按磁盘预算淘汰旧条目"""
+        if key is None or not self.enabled:
+            return
+        try:
+            files = {p: file_fingerprint(p) for p in result_files(video_path, result)}
+        except OSError:
+            # 输出文件已不存在（例如被同时进行的另一次分析覆盖后删除），不缓存
+            return
+        path = self._entry_path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(self.root, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump({'output_name': result.get('output_name'), 'files': files, 'result': result}, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if '.tmp-' in name or not name.endswith('.json') or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def disk_usage(self):
+        """返回当前缓存占用的字节数"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """超过磁盘预算时，按最近访问时间从旧到新删除条目"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.budget_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                print(f"分析结果缓存超出预算，已淘汰: {path}")
+
+    def stats(self):
+        return {'enabled': self.enabled, 'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries()),
+                'disk_mb': round(self.disk_usage() / 1024 ** 2, 2),
+                'budget_mb': round(self.budget_bytes / 1024 ** 2, 2)}
+
+
+# 进程级默认实例
+result_cache = ResultCache()
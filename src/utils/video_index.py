@@ -0,0 +1,267 @@
+import bisect
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import cv2
+from keypoint_store import file_sha256
+
+# 上传视频目录，预览接口只读取其中的文件
+UPLOAD_VIDEO_DIR = os.path.join('public', 'uploads', 'videos')
+UPLOAD_NAME_RE = re.compile(r'^[\w.-]+\.(?:mp4|webm)$')
+# 视频索引（元数据 + 关键帧位置）的缓存目录，按视频内容哈希存放，每个上传只构建一次
+VIDEO_INDEX_DIR = os.environ.get('VIDEO_INDEX_DIR', './cache/video_index')
+FFPROBE_BIN = os.environ.get('FFPROBE_BIN', 'ffprobe')
+VIDEO_INDEX_VERSION = 1
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def _rate(text):
+    """ffprobe 的帧率字符串（如 30000/1001）转为浮点数"""
+    num, _, den = str(text).partition('/')
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _probe_ffprobe(video_path):
+    """
+    用 ffprobe 读取视频流信息和所有数据包的 PTS/关键帧标记（只解析容器，不解码）。
+
+    Returns:
+        dict: 索引字段；没有 ffprobe 或解析失败时返回 None。
+    """
+    ffprobe = shutil.which(FFPROBE_BIN)
+    if ffprobe is None:
+        return None
+    cmd = [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate,time_base,start_time'
+           ':stream_tags=rotate:stream_side_data=rotation:packet=pts,dts,flags',
+           '-of', 'json', video_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        data = json.loads(result.stdout)
+        stream = data['streams'][0]
+    except (OSError, subprocess.TimeoutExpired, ValueError, KeyError, IndexError) as e:
+        print(f"ffprobe 读取视频索引失败: {e}")
+        return None
+
+    time_base = _rate(stream.get('time_base', '1/1'))
+    packets = []
+    for packet in data.get('packets', []):
+        ts = packet.get('pts', packet.get('dts'))
+        if ts is not None:
+            packets.append((int(ts), 'K' in packet.get('flags', '')))
+    if not packets:
+        return None
+    # 数据包按解码顺序排列，按 PTS 排序即为显示顺序（帧号）
+    order = sorted(range(len(packets)), key=lambda i: packets[i][0])
+    first_pts = packets[order[0]][0]
+    pts = [round((packets[i][0] - first_pts) * time_base, 6) for i in order]
+    keyframes = [frame_idx for frame_idx, i in enumerate(order) if packets[i][1]]
+
+    rotation = 0
+    if 'rotate' in stream.get('tags', {}):
+        rotation = int(float(stream['tags']['rotate']))
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            # 显示矩阵的旋转方向与 rotate 标签相反
+            rotation = -int(float(side_data['rotation']))
+    fps = _rate(stream.get('avg_frame_rate')) or _rate(stream.get('r_frame_rate'))
+    return {'fps': fps, 'frames': len(pts), 'width': int(stream['width']), 'height': int(stream['height']),
+            'rotation': rotation % 360, 'pts': pts, 'keyframes': keyframes, 'source': 'ffprobe'}
+
+
+def _probe_opencv(video_path):
+    """没有 ffprobe 时的退路：grab() 全部帧得到准确帧数与 PTS，关键帧位置未知"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频: {video_path}")
+    pts = []
+    while cap.grab():
+        pts.append(round(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, 6))
+    rotation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META)) if hasattr(cv2, 'CAP_PROP_ORIENTATION_META') else 0
+    info = {'fps': cap.get(cv2.CAP_PROP_FPS), 'frames': len(pts),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'rotation': rotation % 360, 'pts': pts, 'keyframes': None, 'source': 'opencv'}
+    cap.release()
+    return info
+
+
+class VideoIndex:
+    """
+    单个视频的元数据与关键帧索引。
+
+    frames/pts 按显示顺序，与 cv2.VideoCapture 顺序读取的帧号一致；keyframes 为关键帧的帧号
+    （没有 ffprobe 构建时为 None，此时定位退化为从头顺序 grab）。
+    width/height 为编码尺寸，OpenCV 读取时会按 rotation 自动旋转。
+    """
+
+    def __init__(self, fps, frames, width, height, rotation, pts, keyframes, source, **extra):
+        self.fps = fps
+        self.frames = frames
+        self.width = width
+        self.height = height
+        self.rotation = rotation
+        self.pts = pts
+        self.keyframes = keyframes
+        self.source = source
+
+    def keyframe_before(self, frame_idx):
+        """frame_idx 及之前最近的关键帧；关键帧未知时返回 0"""
+        if not self.keyframes:
+            return 0
+        return self.keyframes[max(0, bisect.bisect_right(self.keyframes, frame_idx) - 1)]
+
+    def worth_seeking(self, current, target):
+        """从 current 顺序读到 target 的途中有关键帧时，直接定位可以跳过中间帧的解码"""
+        return bool(self.keyframes) and self.keyframe_before(target) > current
+
+    def frame_at(self, seconds):
+        """时间（秒）对应的帧号"""
+        return max(0, min(self.frames - 1, bisect.bisect_right(self.pts, seconds + 1e-6) - 1))
+
+    def to_dict(self):
+        return {'version': VIDEO_INDEX_VERSION, 'fps': self.fps, 'frames': self.frames, 'width': self.width,
+                'height': self.height, 'rotation': self.rotation, 'pts': self.pts, 'keyframes': self.keyframes,
+                'source': self.source}
+
+    def summary(self):
+        """不含逐帧数据的摘要"""
+        return {'fps': round(self.fps, 3), 'frames': self.frames, 'width': self.width, 'height': self.height,
+                'rotation': self.rotation, 'duration': self.pts[-1] if self.pts else 0,
+                'keyframes': len(self.keyframes) if self.keyframes is not None else None, 'source': self.source}
+
+
+def build_index(video_path, fallback=True):
+    """
+    读取视频元数据与关键帧位置，优先使用 ffprobe。
+
+    Args:
+        fallback (bool): 没有 ffprobe 时是否退回 OpenCV 全量 grab；为 False 时返回 None
+            （用于处理中途生成的临时视频，不值得为定位先完整解码一遍）。
+    """
+    info = _probe_ffprobe(video_path)
+    if info is None:
+        if not fallback:
+            return None
+        info = _probe_opencv(video_path)
+    return VideoIndex(**info)
+
+
+def load_index(video_path, build=True):
+    """
+    获取视频索引：进程内缓存 → 磁盘缓存 → 构建并写入磁盘。
+
+    Returns:
+        VideoIndex: build=False 且尚未构建时返回 None。
+    """
+    key = file_sha256(video_path)[:32]
+    with _index_lock:
+        if key in _indexes:
+            return _indexes[key]
+    path = os.path.join(VIDEO_INDEX_DIR, f"{key}.json")
+    index = None
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == VIDEO_INDEX_VERSION:
+                index = VideoIndex(**data)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"视频索引损坏，重新构建: {path} ({e})")
+    if index is None:
+        if not build:
+            return None
+        index = build_index(video_path)
+        os.makedirs(VIDEO_INDEX_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(index.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    with _index_lock:
+        _indexes[key] = index
+    return index
+
+
+def seek(cap, index, frame_idx):
+    """
+    定位并 grab 到第 frame_idx 帧：之后 cap.retrieve() 得到该帧，cap.read() 得到下一帧。
+
+    先定位到之前最近的关键帧，用索引中的 PTS 核对落点，再顺序 grab 到目标帧；
+    关键帧未知或落点不符（如可变帧率视频）时从头顺序 grab，保证帧号准确。
+
+    Returns:
+        bool: 是否成功到达该帧。
+    """
+    start = index.keyframe_before(frame_idx) if index is not None else 0
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    if not cap.grab():
+        return False
+    if start > 0:
+        expected = index.pts[start] if start < len(index.pts) else None
+        actual = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if expected is None or abs(actual - expected) > 0.5 / max(index.fps, 1):
+            start = 0
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            if not cap.grab():
+                return False
+    for _ in range(frame_idx - start):
+        if not cap.grab():
+            return False
+    return True
+
+
+def read_frame(cap, index, frame_idx):
+    """随机读取单帧"""
+    if not seek(cap, index, frame_idx):
+        return None
+    ret, frame = cap.retrieve()
+    return frame if ret else None
+
+
+def upload_path(name):
+    """上传视频文件名对应的路径；文件名无效时抛出 ValueError，文件不存在时抛出 FileNotFoundError"""
+    if not UPLOAD_NAME_RE.match(name):
+        raise ValueError(f"无效的视频文件名: {name}")
+    path = os.path.join(UPLOAD_VIDEO_DIR, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"视频不存在: {name}")
+    return path
+
+
+def preview_jpeg(video_path, frame_idx=None, seconds=None, width=None, quality=85):
+    """
+    随机读取一帧并编码为 JPEG，用于进度条预览。
+
+    Args:
+        frame_idx (int): 帧号；未给出时按 seconds（秒）换算。
+        width (int): 按宽度等比缩放，None 保持原尺寸。
+
+    Returns:
+        tuple: (JPEG 字节, 实际帧号)
+    """
+    index = load_index(video_path)
+    if frame_idx is None:
+        frame_idx = index.frame_at(seconds or 0)
+    if not 0 <= frame_idx < index.frames:
+        raise ValueError(f"帧号超出范围: {frame_idx}（共 {index.frames} 帧）")
+    cap = cv2.VideoCapture(video_path)
+    try:
+        frame = read_frame(cap, index, frame_idx)
+    finally:
+        cap.release()
+    if frame is None:
+        raise ValueError(f"无法读取第 {frame_idx} 帧")
+    if width and width < frame.shape[1]:
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"第 {frame_idx} 帧编码失败")
+    return buf.tobytes(), frame_idx
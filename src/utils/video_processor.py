@@ -12,10 +12,22 @@ import queue
 from datetime import datetime
 from aiohttp import web
 import subprocess
+import tempfile
+import contextlib
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from src.utils.process_data import draw_angle_info, solutions, process_realtime_pose 
+from src.utils.process_data import draw_angle_info, process_realtime_pose 
+from pose_engine import PoseEstimator
+from model_registry import registry
+from pose_tiers import resolve_pose_config, calibrate, calibration_result, DEFAULT_POSE_TIER
+from video_writer import open_video_writer, probe_encoders, progressive_output
+from render_cache import render_cache
+from video_index import load_index, preview_jpeg, upload_path
+from analysis_pool import analysis_pool, LogTail
+from analysis_jobs import analysis_jobs
+from result_cache import result_cache, analysis_key
+from overlay_timeline import analysis_output_name
 
 
 class VideoProcessor:
@@ -29,8 +41,9 @@ class VideoProcessor:
         self.display_queue = queue.Queue(maxsize=1)
         self.stop_event = threading.Event()
         
-        # 配置模型和路径
-        self.model_path = './public/yolo11x-pose.pt'
+        # 配置模型和路径（姿态模型档位可在每次会话开始时指定）
+        self.pose_config = resolve_pose_config()
+        self.model_path = self.pose_config['model_path']
         self.video_dir = os.path.join('public', 'uploads', 'videos')
         
         # 定义关键点组
@@ -50,15 +63,14 @@ class VideoProcessor:
         self.cap = None
         self.out = None
         
-        # 初始化模型变量
-        self.gym1 = None
-        self.gym2 = None
-        self.gym3 = None
-        self.gym4 = None
+        # 初始化模型变量（每只手一个姿态推理实例，单次推理得到肘部和肩部两组角度）
+        self.pose_left = None
+        self.pose_right = None
         
         # 初始化目录和模型
         self._ensure_video_dir()
         self._preload_models()
+        self._warmup_models()
 
     def _ensure_video_dir(self):
         """确保视频目录存在"""
@@ -95,62 +107,26 @@ class VideoProcessor:
         print("开始预加载AI模型...")
         try:
             # 预加载左手模型
-            if self.gym1 is None:
-                print("预加载左手模型1...")
+            if self.pose_left is None:
+                print("预加载左手模型...")
                 start_time = time.time()
-                self.gym1 = solutions.AIGym(
-                    model=self.model_path,
-                    show=False,
-                    line_width=1,
-                    up_angle=140.0,
-                    down_angle=60.0,
-                    kpts=self.left_hand_points['point1'],
-                    verbose=False,
+                self.pose_left = PoseEstimator(
+                    self.model_path,
+                    [self.left_hand_points['point1'], self.left_hand_points['point2']],
+                    imgsz=self.pose_config['imgsz']
                 )
-                print(f"左手模型1预加载完成，耗时: {time.time() - start_time:.2f}秒")
-
-            if self.gym2 is None:
-                print("预加载左手模型2...")
-                start_time = time.time()
-                self.gym2 = solutions.AIGym(
-                    model=self.model_path,
-                    show=False,
-                    line_width=1,
-                    up_angle=140.0,
-                    down_angle=60.0,
-                    kpts=self.left_hand_points['point2'],
-                    verbose=False,
-                )
-                print(f"左手模型2预加载完成，耗时: {time.time() - start_time:.2f}秒")
+                print(f"左手模型预加载完成，耗时: {time.time() - start_time:.2f}秒")
 
             # 预加载右手模型
-            if self.gym3 is None:
-                print("预加载右手模型1...")
-                start_time = time.time()
-                self.gym3 = solutions.AIGym(
-                    model=self.model_path,
-                    show=False,
-                    line_width=1,
-                    up_angle=140.0,
-                    down_angle=60.0,
-                    kpts=self.right_hand_points['point1'],
-                    verbose=False,
-                )
-                print(f"右手模型1预加载完成，耗时: {time.time() - start_time:.2f}秒")
-
-            if self.gym4 is None:
-                print("预加载右手模型2...")
+            if self.pose_right is None:
+                print("预加载右手模型...")
                 start_time = time.time()
-                self.gym4 = solutions.AIGym(
-                    model=self.model_path,
-                    show=False,
-                    line_width=1,
-                    up_angle=140.0,
-                    down_angle=60.0,
-                    kpts=self.right_hand_points['point2'],
-                    verbose=False,
+                self.pose_right = PoseEstimator(
+                    self.model_path,
+                    [self.right_hand_points['point1'], self.right_hand_points['point2']],
+                    imgsz=self.pose_config['imgsz']
                 )
-                print(f"右手模型2预加载完成，耗时: {time.time() - start_time:.2f}秒")
+                print(f"右手模型预加载完成，耗时: {time.time() - start_time:.2f}秒")
 
         except Exception as e:
             print(f"模型预加载失败: {e}")
@@ -158,6 +134,15 @@ class VideoProcessor:
                 import traceback
                 traceback.print_tb(e.__traceback__)
 
+    def _warmup_models(self):
+        """用空白帧推理一次，避免第一次会话承担模型初始化开销"""
+        try:
+            start_time = time.time()
+            registry.warmup(self.model_path, self.pose_config['imgsz'])
+            print(f"模型预热完成，耗时: {time.time() - start_time:.2f}秒")
+        except Exception as e:
+            print(f"模型预热失败: {e}")
+
     def reset_state(self):
         """重置所有状态和资源"""
         print("重置处理器状态")
@@ -184,10 +169,10 @@ class VideoProcessor:
             except Exception as e:
                 print(f"释放视频捕获时出错: {e}")
             self.cap = None
-        self.gym1 = None
-        self.gym2 = None
-        self.gym3 = None
-        self.gym4 = None
+        # 模型由进程级注册表持有，这里只清空角度状态，不丢弃实例
+        for pose in (self.pose_left, self.pose_right):
+            if pose is not None:
+                pose.reset()
         # 清理视频写入器
         if self.out is not None:
             try:
@@ -200,7 +185,17 @@ class VideoProcessor:
         self.stop_event.clear()
         print("状态重置完成")
 
-    async def handle_start(self, websocket, hand=None):
+    def _set_pose_config(self, pose_tier=None, imgsz=None, pose_backend=None):
+        """切换实时会话使用的姿态模型档位/后端，配置变化时重建推理实例"""
+        pose_config = resolve_pose_config(pose_tier, imgsz, pose_backend)
+        if pose_config != self.pose_config:
+            print(f"切换姿态模型: {pose_config['tier']} (imgsz={pose_config['imgsz']}, 后端={pose_config['backend']})")
+            self.pose_config = pose_config
+            self.model_path = pose_config['model_path']
+            self.pose_left = None
+            self.pose_right = None
+
+    async def handle_start(self, websocket, hand=None, pose_tier=None, imgsz=None, pose_backend=None):
         """处理开始录制请求"""
         print(f"尝试启动摄像头，当前状态: {self.get_status()}")
         
@@ -227,7 +222,11 @@ class VideoProcessor:
         # 重置状态
         self.reset_state()
         
-         # 重新预加载模型，确保使用全新的实例
+        # 确保模型已加载（注册表中已有时直接复用）
+        try:
+            self._set_pose_config(pose_tier, imgsz, pose_backend)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
         self._preload_models()
         
         # 添加连接
@@ -326,7 +325,7 @@ class VideoProcessor:
                     })
                     
                     if data['type'] == 'start':
-                        await self.handle_start(websocket, data['hand'])
+                        await self.handle_start(websocket, data['hand'], data.get('pose_tier'), data.get('imgsz'), data.get('pose_backend'))
                     elif data['type'] == 'stop':
                         await self.handle_stop(websocket)
                     
@@ -389,35 +388,21 @@ class VideoProcessor:
             # 确保视频目录存在
             os.makedirs(self.video_dir, exist_ok=True)
             
-            # 尝试不同的编码器
-            codecs = ['avc1', 'mp4v', 'XVID', 'MJPG']
-            self.out = None
-            
-            for codec in codecs:
-                try:
-                    fourcc = cv2.VideoWriter_fourcc(*codec)
-                    self.out = cv2.VideoWriter(self.current_video_path, fourcc, 30, (width, height))
-                    if self.out.isOpened():
-                        print(f"使用编码器: {codec}")
-                        break
-                    else:
-                        self.out.release()
-                        self.out = None
-                except Exception as e:
-                    print(f"编码器 {codec} 初始化失败: {e}")
-                    if self.out:
-                        self.out.release()
-                        self.out = None
-            
+            # 按启动时探测的编码能力打开写入器（ffmpeg H264 优先）
+            self.out = open_video_writer(self.current_video_path, 30, (width, height))
+            if not self.out.isOpened():
+                self.out.release()
+                self.out = None
+
             if not self.out:
                 raise Exception("无法初始化任何视频编码器")
 
             print("检查AI模型状态")
-            if self.gym1 is None or self.gym2 is None or self.gym3 is None or self.gym4 is None:
+            if self.pose_left is None or self.pose_right is None:
                 print("重新加载AI模型")
                 self._preload_models()
             
-            if self.gym1 is None or self.gym2 is None or self.gym3 is None or self.gym4 is None:
+            if self.pose_left is None or self.pose_right is None:
                 raise Exception("AI模型未正确加载")
 
             print("所有资源初始化完成，开始处理视频")
@@ -494,17 +479,9 @@ class VideoProcessor:
                     print("错误：未设置当前分析的手")
                     continue
 
-                # 根据选择的手调用对应的模型
-                if self.current_hand == 'left':
-                    self.gym1.monitor(frame)
-                    self.gym2.monitor(frame.copy())
-                    angle1 = self.gym1.angle[0] if isinstance(self.gym1.angle, (list, tuple)) else 0
-                    angle2 = self.gym2.angle[0] if isinstance(self.gym2.angle, (list, tuple)) else 0
-                else:  # right
-                    self.gym3.monitor(frame)
-                    self.gym4.monitor(frame.copy())
-                    angle1 = self.gym3.angle[0] if isinstance(self.gym3.angle, (list, tuple)) else 0
-                    angle2 = self.gym4.angle[0] if isinstance(self.gym4.angle, (list, tuple)) else 0
+                # 根据选择的手调用对应的模型，单次推理得到两组角度
+                pose = self.pose_left if self.current_hand == 'left' else self.pose_right
+                angle1, angle2 = pose.monitor(frame)
                 
                 # 生成处理后的显示帧
                 processed_frame = draw_angle_info(frame.copy(), angle1, angle2, show_ui=True)
@@ -566,63 +543,163 @@ class VideoProcessor:
         """异步发送帧给客户端"""
         await websocket.send(message)
 
-async def analyze_video(request):
-    """处理视频分析请求"""
+async def analyze_in_subprocess(video_path, hand, pose_config, output_name=None):
+    """
+    每个请求启动一次 process_video.py 子进程进行分析（ANALYSIS_WORKERS=0 时使用）。
+    结果由子进程写入单独的结果文件；子进程的日志输出边读边丢，只保留最后 ANALYSIS_LOG_LINES 行用于错误信息。
+    """
+    fd, result_file = tempfile.mkstemp(prefix='analysis_', suffix='.json')
+    os.close(fd)
     try:
-        data = await request.json()
-        video_path = data.get('video_path')
-        hand = data.get('hand')
-        
-        if not video_path or not hand:
-            return web.json_response({
-                'error': '缺少必要参数'
-            }, status=400)
-            
-        # 调用 process_video.py 进行分析
         process = await asyncio.create_subprocess_exec(
             'python', 'src/utils/process_video.py', video_path, hand,
+            pose_config['tier'], str(pose_config['imgsz']), pose_config['backend'],
+            '--result-file', result_file,
+            *(['--output-name', output_name] if output_name else []),
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.STDOUT
         )
         
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            return web.json_response({
-                'error': f'分析失败: {stderr.decode()}'
-            }, status=500)
-            
-        # 解析输出结果
-        output = stdout.decode()
-        import re
-        json_match = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', output)
-        if not json_match:
-            return web.json_response({
-                'error': '未找到有效的分析结果'
-            }, status=500)
-            
-        result = json.loads(json_match[-1])
+        log = LogTail()
+        while True:
+            chunk = await process.stdout.read(1 << 16)
+            if not chunk:
+                break
+            log.feed(chunk)
+        await process.wait()
         
+        try:
+            with open(result_file) as f:
+                result = json.load(f)
+        except ValueError:
+            # 子进程在写出结果前异常退出，结果文件仍为空
+            result = None
+        if result is not None and 'error' in result:
+            raise RuntimeError(result.get('traceback') or result['error'])
+        if result is None or process.returncode != 0:
+            raise RuntimeError(log.text() or f'分析进程退出码 {process.returncode}')
+        return result
+    finally:
+        os.remove(result_file)
+
+async def analyze(video_path, hand, pose_config, job=None, output_name=None):
+    """在常驻分析进程中执行分析，未启用进程池时调用 process_video.py 子进程"""
+    try:
+        if analysis_pool.enabled:
+            return await analysis_pool.run(video_path, hand, pose_config, job.id if job is not None else None,
+                                           output_name)
+        if job is not None:
+            job.mark_running()
+        return await analyze_in_subprocess(video_path, hand, pose_config, output_name)
+    except Exception as e:
+        raise RuntimeError(f'分析失败: {str(e)}')
+
+# 输出名 -> [asyncio.Lock, 使用该锁的请求数]
+_output_locks = {}
+
+@contextlib.asynccontextmanager
+async def output_lock(name):
+    """同一输出名的分析依次执行，不会同时写同一组时间轴、标注视频与片段"""
+    entry = _output_locks.setdefault(name, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _output_locks[name]
+
+async def run_analysis(video_path, hand, pose_config, job=None):
+    """
+    分析视频并生成运动建议，返回 /analyze 的结果字典；失败时抛出异常。
+    同一视频、手臂与配置（同一输出名）的请求依次执行，排在后面的通常直接命中前一个写入的结果缓存。
+
+    Args:
+        job (AnalysisJob): 异步任务，给出时上报任务状态与进度。
+    """
+    # 同一视频、手臂、模型与标准模板已分析过时直接返回缓存的结果；输出文件也按同一个键命名
+    loop = asyncio.get_event_loop()
+    cache_key = await loop.run_in_executor(None, analysis_key, video_path, hand, pose_config)
+    output_name = analysis_output_name(video_path, hand, cache_key)
+    async with output_lock(output_name):
+        return await cached_analysis(video_path, hand, pose_config, job, cache_key, output_name)
+
+async def cached_analysis(video_path, hand, pose_config, job, cache_key, output_name):
+    """查找结果缓存，未命中时分析并写入缓存（调用方持有 output_name 的锁）"""
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(None, result_cache.get, cache_key)
+    if result is not None:
+        print(f"分析结果缓存命中: {video_path} ({hand})")
+        result['cached'] = True
+        # 缓存时运动建议生成失败的，重新生成
+        if result.get('suggestions'):
+            return result
+    else:
+        result = await analyze(video_path, hand, pose_config, job, output_name)
         # 计算平均分数
-        flat_scores = [score for sublist in result['score_arr'] for score in sublist]
-        result['average_score'] = sum(flat_scores) / len(flat_scores)
-        
-        # 生成运动建议
-        llm_process = await asyncio.create_subprocess_exec(
-            'python', 'src/utils/llm_response.py',
-            '--scores', json.dumps(result['score_arr']),
-            '--cases', json.dumps(result['case_arr']),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        llm_stdout, llm_stderr = await llm_process.communicate()
-        
-        if llm_process.returncode == 0:
-            result['suggestions'] = llm_stdout.decode().strip()
-        else:
-            result['suggestions'] = ''
-            
+        # score_arr 为每个动作一个评分；此前的结果中每项为单元素列表
+        flat_scores = [score[0] if isinstance(score, list) else score for score in result['score_arr']]
+        result['average_score'] = sum(flat_scores) / len(flat_scores) if flat_scores else 0
+        result['cached'] = False
+    
+    # 生成运动建议
+    if job is not None:
+        job.mark_running('suggestions')
+    llm_process = await asyncio.create_subprocess_exec(
+        'python', 'src/utils/llm_response.py',
+        '--scores', json.dumps(result['score_arr']),
+        '--cases', json.dumps(result['case_arr']),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    
+    llm_stdout, llm_stderr = await llm_process.communicate()
+    
+    if llm_process.returncode == 0:
+        result['suggestions'] = llm_stdout.decode().strip()
+    else:
+        result['suggestions'] = ''
+    
+    await loop.run_in_executor(None, result_cache.put, cache_key, video_path, result)
+    return result
+
+async def analysis_request(request):
+    """
+    解析分析请求参数。
+
+    Returns:
+        tuple: (video_path, hand, pose_config, 错误响应)，参数有误时前三项为 None。
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        return None, None, None, web.json_response({'error': '请求体不是有效的 JSON'}, status=400)
+    video_path = data.get('video_path')
+    hand = data.get('hand')
+    
+    if not video_path or not hand:
+        return None, None, None, web.json_response({
+            'error': '缺少必要参数'
+        }, status=400)
+    
+    # 解析姿态模型档位，auto 使用启动时的校准结果
+    try:
+        pose_config = resolve_pose_config(data.get('pose_tier'), data.get('imgsz'), data.get('pose_backend'))
+    except ValueError as e:
+        return None, None, None, web.json_response({'error': str(e)}, status=400)
+    return video_path, hand, pose_config, None
+
+async def analyze_video(request):
+    """处理视频分析请求（同步：分析完成后才返回结果，长视频请使用 POST /jobs）"""
+    try:
+        video_path, hand, pose_config, error = await analysis_request(request)
+        if error is not None:
+            return error
+        try:
+            result = await run_analysis(video_path, hand, pose_config)
+        except RuntimeError as e:
+            return web.json_response({'error': str(e)}, status=500)
         return web.json_response(result)
         
     except Exception as e:
@@ -630,14 +707,186 @@ async def analyze_video(request):
             'error': f'处理请求失败: {str(e)}'
         }, status=500)
 
+async def create_job(request):
+    """提交异步分析任务，立即返回任务 ID；之后通过 GET /jobs/<id> 查询结果，GET /jobs/<id>/events 订阅进度"""
+    video_path, hand, pose_config, error = await analysis_request(request)
+    if error is not None:
+        return error
+    job = analysis_jobs.submit(video_path, hand,
+                               lambda job: run_analysis(video_path, hand, pose_config, job))
+    return web.json_response(job.to_dict(), status=202)
+
+async def get_job(request):
+    """查询异步分析任务的状态、进度与结果"""
+    job = analysis_jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({'error': '任务不存在或已过期'}, status=404)
+    return web.json_response(job.to_dict())
+
+async def job_events(request, keepalive=15):
+    """
+    以 Server-Sent Events 推送任务状态：每次进度更新发送一个 progress 事件，结束时发送 done 或 failed 事件（含结果）后关闭。
+    """
+    job = analysis_jobs.get(request.match_info['job_id'])
+    if job is None:
+        return web.json_response({'error': '任务不存在或已过期'}, status=404)
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+    queue = job.subscribe()
+    try:
+        snapshot = job.to_dict()
+        while True:
+            event = snapshot['status'] if snapshot['status'] in ('done', 'failed') else 'progress'
+            await response.write(f"event: {event}\ndata: {json.dumps(snapshot)}\n\n".encode())
+            if event != 'progress':
+                break
+            try:
+                snapshot = await asyncio.wait_for(queue.get(), keepalive)
+                # 积压的快照只发送最新的一个
+                while not queue.empty():
+                    snapshot = queue.get_nowait()
+            except asyncio.TimeoutError:
+                # 注释行保持连接，避免被代理断开
+                await response.write(b": keepalive\n\n")
+                snapshot = job.to_dict()
+    except ConnectionResetError:
+        return response
+    finally:
+        job.unsubscribe(queue)
+    await response.write_eof()
+    return response
+
+async def stream_rendering(request, job, chunk_size=1 << 18, poll=0.2):
+    """
+    边渲染边返回正在写入的分片 MP4（分块传输，无 Content-Length），浏览器收到第一个分片即可开始播放。
+    渲染在开始写出前就已结束时返回 None，由调用方直接返回成品文件。
+    """
+    f = None
+    while f is None:
+        try:
+            f = open(job.tmp_path, 'rb')
+        except FileNotFoundError:
+            # 临时文件尚未创建，或渲染已结束并改名
+            if job.done.is_set():
+                return None
+            await asyncio.sleep(poll)
+    response = web.StreamResponse(headers={'Content-Type': 'video/mp4', 'Cache-Control': 'no-store'})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    with f:
+        while True:
+            # 先判断是否完成再读，保证完成后读到的是完整文件（改名不影响已打开的文件）
+            finished = job.done.is_set()
+            chunk = f.read(chunk_size)
+            if chunk:
+                await response.write(chunk)
+            elif finished:
+                break
+            else:
+                await asyncio.sleep(poll)
+    if job.error is not None:
+        # 响应头已发出，只能提前结束；客户端重新请求时会重新渲染
+        print(f"边渲染边传输中断: {job.error}")
+    await response.write_eof()
+    return response
+
+async def render_video(request):
+    """
+    按需渲染标注视频或低分片段：/render/<输出名>.mp4 或 /render/<输出名>_segment_<start>_<end>.mp4。
+    首次请求时按叠加时间轴渲染并缓存，输出为分片 MP4 时边渲染边返回；之后直接返回缓存文件（支持 Range 请求）。
+    """
+    name = request.match_info['name']
+    loop = asyncio.get_event_loop()
+    try:
+        path, job = await loop.run_in_executor(None, render_cache.start, name)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    except FileNotFoundError as e:
+        return web.json_response({'error': str(e)}, status=404)
+    except Exception as e:
+        return web.json_response({'error': f'渲染失败: {str(e)}'}, status=500)
+    if job is not None and progressive_output():
+        response = await stream_rendering(request, job)
+        if response is not None:
+            return response
+    if job is not None:
+        await loop.run_in_executor(None, job.done.wait)
+        if job.error is not None:
+            return web.json_response({'error': f'渲染失败: {str(job.error)}'}, status=500)
+    return web.FileResponse(path, headers={'Content-Type': 'video/mp4'})
+
+async def index_video(request):
+    """上传完成后由后端调用：构建视频元数据与关键帧索引，之后的分析、截取与预览直接复用"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.json_response({'error': '请求体不是有效的 JSON'}, status=400)
+    video_path = data.get('video_path')
+    if not video_path:
+        return web.json_response({'error': '缺少必要参数'}, status=400)
+    if not os.path.exists(video_path):
+        return web.json_response({'error': f'视频不存在: {video_path}'}, status=404)
+    loop = asyncio.get_event_loop()
+    try:
+        index = await loop.run_in_executor(None, load_index, video_path)
+    except Exception as e:
+        return web.json_response({'error': f'构建视频索引失败: {str(e)}'}, status=500)
+    return web.json_response(index.summary())
+
+async def preview_frame(request):
+    """
+    随机读取上传视频的一帧：/preview/<文件名>?frame=<帧号> 或 ?t=<秒>，可选 &width=<宽度>。
+    借助关键帧索引从最近的关键帧开始解码，不必从头读取。
+    """
+    try:
+        path = upload_path(request.match_info['name'])
+        frame_idx = int(request.query['frame']) if 'frame' in request.query else None
+        seconds = float(request.query.get('t', 0))
+        width = int(request.query['width']) if 'width' in request.query else None
+    except FileNotFoundError as e:
+        return web.json_response({'error': str(e)}, status=404)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    loop = asyncio.get_event_loop()
+    try:
+        jpeg, frame_idx = await loop.run_in_executor(None, preview_jpeg, path, frame_idx, seconds, width)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    except Exception as e:
+        return web.json_response({'error': f'预览失败: {str(e)}'}, status=500)
+    return web.Response(body=jpeg, content_type='image/jpeg',
+                        headers={'X-Frame-Index': str(frame_idx), 'Cache-Control': 'public, max-age=3600'})
+
+async def model_status(request):
+    """返回进程内已加载模型的内存占用与冷/热状态"""
+    return web.json_response({'models': registry.stats(), 'calibration': calibration_result(),
+                              'encoders': probe_encoders(), 'render_cache': render_cache.stats(),
+                              'analysis_pool': analysis_pool.stats(), 'jobs': analysis_jobs.stats(),
+                              'result_cache': result_cache.stats()})
+
 async def main():
+    # POSE_TIER=auto 时在启动阶段测速，选出满足目标帧率的最大档位
+    if DEFAULT_POSE_TIER == 'auto':
+        calibrate()
+    # 编码能力只在启动时探测一次
+    probe_encoders()
     processor = VideoProcessor()
+    # 分析进程在后台预加载模型，与实时会话的模型互不影响；进度转交给异步任务表
+    analysis_pool.on_progress = analysis_jobs.report_progress
+    analysis_pool.start(processor.pose_config)
     # 保存主事件循环的引用
     processor.main_loop = asyncio.get_event_loop()
     
     # 创建 Web 应用
     app = web.Application()
     app.router.add_post('/analyze', analyze_video)
+    app.router.add_post('/jobs', create_job)
+    app.router.add_get('/jobs/{job_id}', get_job)
+    app.router.add_get('/jobs/{job_id}/events', job_events)
+    app.router.add_get('/models', model_status)
+    app.router.add_get('/render/{name}', render_video)
+    app.router.add_post('/index', index_video)
+    app.router.add_get('/preview/{name}', preview_frame)
     
     # 启动 WebSocket 服务器
     ws_server = await websockets.serve(processor.handle_client, "0.0.0.0", 8765)
@@ -0,0 +1,131 @@
+import os
+import shutil
+import subprocess
+import cv2
+import numpy as np
+from video_writer import FFMPEG_BIN
+from video_index import load_index, seek
+
+# 推理输入的解码方式：ffmpeg 时由独立的 ffmpeg 进程在解码时裁剪 ROI 并缩放到模型输入尺寸，直接输出推理分辨率的 BGR 帧；
+# opencv 时解码整帧后在 Python 中裁剪，由 ultralytics 再缩放；
+# auto 时多核机器使用 ffmpeg（解码与缩放在另一个进程中和推理并行），单核时 ffmpeg 进程与推理争抢同一个核，沿用 opencv
+INFER_DECODER = os.environ.get('INFER_DECODER', 'auto')
+# 未指定 imgsz 时 ultralytics 姿态模型的默认输入尺寸
+DEFAULT_IMGSZ = 640
+
+
+def inference_size(crop, imgsz=None):
+    """
+    裁剪区域按 letterbox 规则缩放后的尺寸：长边等于 imgsz，短边等比例取整。
+    输入已是该尺寸时 ultralytics 的 letterbox 只补边，不再缩放。
+
+    Returns:
+        tuple: (width, height)
+    """
+    x1, y1, x2, y2 = crop
+    w, h = x2 - x1, y2 - y1
+    r = (imgsz or DEFAULT_IMGSZ) / max(w, h)
+    return max(1, int(round(w * r))), max(1, int(round(h * r)))
+
+
+class ScaledFrameReader:
+    """
+    从 ffmpeg 管道读取已裁剪并缩放到推理尺寸的帧，迭代产生 (帧号, 帧)，与 decode_frames 的接口相同。
+
+    裁剪和缩放在 ffmpeg 中与像素格式转换一起完成，不再把整帧转换为 BGR、切片复制后再缩放。
+    offset 为 (x, y, sx, sy)，交给 PoseEstimator 把关键点映射回原图坐标。
+    ffmpeg 中途失败或输出帧数少于索引记录的帧数时，剩余的帧改用 OpenCV 解码并做同样的裁剪缩放。
+    """
+
+    def __init__(self, video_path, crop, imgsz=None, ffmpeg=None):
+        self.video_path = video_path
+        self.crop = tuple(int(v) for v in crop)
+        self.size = inference_size(self.crop, imgsz)
+        x1, y1, x2, y2 = self.crop
+        self.offset = (x1, y1, self.size[0] / (x2 - x1), self.size[1] / (y2 - y1))
+        self.ffmpeg = ffmpeg or shutil.which(FFMPEG_BIN)
+        self.proc = None
+
+    def _ffmpeg_frames(self):
+        x1, y1, x2, y2 = self.crop
+        w, h = self.size
+        cmd = [self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-i', self.video_path, '-map', '0:v:0',
+               '-vf', f'crop={x2 - x1}:{y2 - y1}:{x1}:{y1}:exact=1,scale={w}:{h}:flags=bilinear',
+               '-fps_mode', 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        try:
+            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=w * h * 3)
+        except OSError as e:
+            print(f"启动 ffmpeg 解码失败: {e}")
+            return
+        frame_bytes = w * h * 3
+        while True:
+            data = self.proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)
+        _, stderr = self.proc.communicate()
+        if self.proc.returncode != 0:
+            print(f"ffmpeg 解码失败 ({self.video_path}): {stderr.decode(errors='ignore').strip()}")
+
+    def _opencv_frames(self, start):
+        cap = cv2.VideoCapture(self.video_path)
+        x1, y1, x2, y2 = self.crop
+        try:
+            ret = seek(cap, load_index(self.video_path), start)
+            ret, frame = cap.retrieve() if ret else (False, None)
+            while ret:
+                yield cv2.resize(frame[y1:y2, x1:x2], self.size, interpolation=cv2.INTER_LINEAR)
+                ret, frame = cap.read()
+        finally:
+            cap.release()
+
+    def __iter__(self):
+        frame_idx = 0
+        if self.ffmpeg is not None:
+            for frame in self._ffmpeg_frames():
+                yield frame_idx, frame
+                frame_idx += 1
+        expected = load_index(self.video_path).frames
+        if frame_idx < expected:
+            if self.ffmpeg is not None:
+                print(f"ffmpeg 只输出了 {frame_idx}/{expected} 帧，剩余帧改用 OpenCV 解码")
+            for frame in self._opencv_frames(frame_idx):
+                yield frame_idx, frame
+                frame_idx += 1
+
+    def close(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.communicate()
+        self.proc = None
+
+
+def resolve_decoder(decoder=None):
+    """
+    实际使用的推理输入解码方式。
+
+    Args:
+        decoder (str): auto/ffmpeg/opencv，None 时使用 INFER_DECODER。
+
+    Returns:
+        str: ffmpeg 或 opencv。没有 ffmpeg、指定 opencv 或 auto 且只有一个 CPU 核时为 opencv。
+    """
+    decoder = decoder or INFER_DECODER
+    if decoder == 'opencv' or (decoder == 'auto' and (os.cpu_count() or 1) < 2):
+        return 'opencv'
+    return 'ffmpeg' if shutil.which(FFMPEG_BIN) is not None else 'opencv'
+
+
+def open_scaled_frames(video_path, crop, imgsz=None, decoder=None):
+    """
+    打开推理分辨率的解码器。
+
+    Args:
+        decoder (str): auto/ffmpeg/opencv，None 时使用 INFER_DECODER。
+
+    Returns:
+        ScaledFrameReader: resolve_decoder 为 opencv 时返回 None，调用方沿用整帧解码 + 裁剪。
+    """
+    if resolve_decoder(decoder) != 'ffmpeg':
+        return None
+    return ScaledFrameReader(video_path, crop, imgsz, shutil.which(FFMPEG_BIN))
@@ -0,0 +1,158 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import cv2
+import numpy as np
+
+# 视频编码配置：VIDEO_ENCODER=auto 时优先用 ffmpeg 管道编码 H264，不可用时退回 cv2.VideoWriter
+VIDEO_ENCODER = os.environ.get('VIDEO_ENCODER', 'auto')
+FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+VIDEO_PRESET = os.environ.get('VIDEO_PRESET', 'veryfast')
+VIDEO_CRF = int(os.environ.get('VIDEO_CRF', 23))
+# ffmpeg 编码线程数，0 表示由 ffmpeg 按 CPU 核数决定
+VIDEO_THREADS = int(os.environ.get('VIDEO_THREADS', 0))
+# 1 时 ffmpeg 输出分片 MP4（fragmented MP4）：文件边写边可播放，关闭时也不需要再整体搬移 moov；0 时输出普通 MP4 + faststart
+VIDEO_FRAGMENTED = os.environ.get('VIDEO_FRAGMENTED', '1') == '1'
+# 分片时长（秒）：每个分片从关键帧开始，关键帧间隔按此设置
+VIDEO_FRAGMENT_SECONDS = float(os.environ.get('VIDEO_FRAGMENT_SECONDS', 2))
+
+# 按优先级排列：浏览器可直接播放的 H264 编码器在前
+FFMPEG_CODECS = ['libx264', 'libopenh264', 'h264_nvenc', 'h264_qsv', 'mpeg4']
+OPENCV_FOURCCS = ['avc1', 'mp4v', 'XVID', 'MJPG']
+
+# 启动时探测一次的编码能力：{'ffmpeg': 可执行文件, 'ffmpeg_codec': ..., 'opencv_fourcc': ...}
+_capabilities = None
+_probe_lock = threading.Lock()
+
+
+def _ffmpeg_encodes(ffmpeg, codec):
+    """用几帧小图实际编码一次，确认编码器可用（只看 -encoders 列表不能保证硬件编码器可用）"""
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+           '-s', '64x64', '-r', '30', '-i', '-', '-c:v', codec, '-pix_fmt', 'yuv420p', '-f', 'null', '-']
+    try:
+        result = subprocess.run(cmd, input=bytes(64 * 64 * 3 * 2), capture_output=True, timeout=20)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def _opencv_fourcc():
+    """返回 cv2.VideoWriter 能打开的第一个编码器"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'probe.mp4')
+        for codec in OPENCV_FOURCCS:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), 30, (64, 64))
+            opened = writer.isOpened()
+            writer.release()
+            if opened:
+                return codec
+    return None
+
+
+def probe_encoders(refresh=False):
+    """
+    探测可用的编码方式，结果缓存在进程内，每个进程只探测一次。
+
+    Returns:
+        dict: {'ffmpeg': ffmpeg 路径或 None, 'ffmpeg_codec': 可用的 ffmpeg 编码器或 None,
+               'opencv_fourcc': cv2.VideoWriter 可用的编码器或 None}
+    """
+    global _capabilities
+    with _probe_lock:
+        if _capabilities is not None and not refresh:
+            return _capabilities
+        ffmpeg = shutil.which(FFMPEG_BIN)
+        ffmpeg_codec = None
+        if ffmpeg is not None and VIDEO_ENCODER != 'opencv':
+            ffmpeg_codec = next((c for c in FFMPEG_CODECS if _ffmpeg_encodes(ffmpeg, c)), None)
+        _capabilities = {'ffmpeg': ffmpeg, 'ffmpeg_codec': ffmpeg_codec, 'opencv_fourcc': _opencv_fourcc()}
+        print(f"视频编码能力: ffmpeg={ffmpeg_codec or '不可用'}, opencv={_capabilities['opencv_fourcc']}")
+        return _capabilities
+
+
+class FfmpegWriter:
+    """
+    把 BGR 原始帧通过管道送入 ffmpeg 子进程编码，接口与 cv2.VideoWriter 相同（write/isOpened/release）。
+
+    编码在独立进程中多线程执行，写管道时释放 GIL；输出 yuv420p。
+    fragmented 为 True 时输出分片 MP4：moov 写在开头且不含样本表，之后每个关键帧开始一个 moof+mdat 分片，
+    写入过程中已写出的部分即可播放；否则输出 faststart 的普通 MP4（关闭时需要把整个文件重写一遍）。
+    """
+
+    def __init__(self, output_path, fps, size, codec='libx264', preset=VIDEO_PRESET, crf=VIDEO_CRF,
+                 threads=VIDEO_THREADS, faststart=True, ffmpeg=None, fragmented=VIDEO_FRAGMENTED):
+        self.output_path = output_path
+        self.fragmented = fragmented
+        self.size = (int(size[0]), int(size[1]))
+        cmd = [ffmpeg or FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{self.size[0]}x{self.size[1]}',
+               '-r', str(fps or 30), '-i', '-', '-an', '-c:v', codec, '-pix_fmt', 'yuv420p']
+        if codec in ('libx264', 'libopenh264', 'h264_nvenc', 'h264_qsv'):
+            # yuv420p 要求宽高为偶数
+            cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        if codec == 'libx264':
+            cmd += ['-preset', preset, '-crf', str(crf)]
+        elif codec == 'mpeg4':
+            cmd += ['-q:v', '4']
+        cmd += ['-threads', str(threads)]
+        if fragmented:
+            cmd += ['-g', str(max(1, round((fps or 30) * VIDEO_FRAGMENT_SECONDS))),
+                    '-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+        elif faststart:
+            cmd += ['-movflags', '+faststart']
+        cmd.append(output_path)
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            print(f"启动 ffmpeg 失败: {e}")
+            self.proc = None
+        self.frames = 0
+
+    def isOpened(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def write(self, frame):
+        if self.proc is None:
+            return
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+            self.frames += 1
+        except (BrokenPipeError, ValueError):
+            # ffmpeg 已退出，错误信息在 release 时输出
+            pass
+
+    def release(self):
+        if self.proc is None:
+            return
+        _, stderr = self.proc.communicate()
+        if self.proc.returncode != 0:
+            print(f"ffmpeg 编码失败 ({self.output_path}): {stderr.decode(errors='ignore').strip()}")
+        self.proc = None
+
+
+def open_video_writer(output_path, fps, size, encoder=None):
+    """
+    按启动时探测的编码能力打开写入器：优先 ffmpeg 管道编码，否则使用 cv2.VideoWriter。
+
+    Args:
+        encoder (str): auto/ffmpeg/opencv，None 时使用 VIDEO_ENCODER。
+    """
+    encoder = encoder or VIDEO_ENCODER
+    caps = probe_encoders()
+    if encoder != 'opencv' and caps['ffmpeg_codec'] is not None:
+        writer = FfmpegWriter(output_path, fps, size, codec=caps['ffmpeg_codec'], ffmpeg=caps['ffmpeg'])
+        if writer.isOpened():
+            return writer
+        print(f"ffmpeg 写入器打开失败，退回 cv2.VideoWriter: {output_path}")
+    fourcc = caps['opencv_fourcc'] or 'mp4v'
+    return cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+
+
+def progressive_output(encoder=None):
+    """open_video_writer 写出的文件是否为分片 MP4，即写入过程中就可以边读边播放"""
+    encoder = encoder or VIDEO_ENCODER
+    return VIDEO_FRAGMENTED and encoder != 'opencv' and probe_encoders()['ffmpeg_codec'] is not None
@@ -0,0 +1,48 @@
+"""
+predict_segment 评分截断的回归测试：超出 [0, 100] 的评分截断后仍为 float，
+融合引擎的时间轴、score_arr 与画面文本都能直接使用。
+
+用法（在项目根目录执行）:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'utils'))
+
+import count_display
+from overlay_timeline import OverlayTimeline
+
+
+class _LabelEncoder:
+    def inverse_transform(self, labels):
+        return [f"case{label}" for label in labels]
+
+
+@pytest.fixture
+def scoring_models(monkeypatch):
+    """用输出固定评分的假模型代替回归模型与分类模型"""
+    def use(raw_score):
+        monkeypatch.setattr(count_display, 'model', lambda features: torch.tensor([[raw_score]]))
+        monkeypatch.setattr(count_display, 'model2', torch.nn.Linear(124, 3))
+        monkeypatch.setattr(count_display, 'label_encoder', _LabelEncoder())
+        monkeypatch.setattr(count_display, 'device', 'cpu')
+    return use
+
+
+@pytest.mark.parametrize('raw_score, expected', [(135.0, 100.0), (-20.0, 0.0), (72.5, 72.5)])
+def test_score_is_clamped_float(scoring_models, raw_score, expected):
+    scoring_models(raw_score)
+    score, label = count_display.predict_segment(np.random.rand(124).astype(np.float32))
+    assert isinstance(score, float)
+    assert score == expected
+    assert label.startswith('category:')
+    # 融合引擎中评分的各个去处
+    timeline = OverlayTimeline({'fps': 30, 'width': 64, 'height': 64, 'frames': 10, 'roi': {'points': []}}, [])
+    timeline.add_segment(0, 9, score, label, None)
+    assert count_display.score_text(score).startswith('score: [')